@@ -19,7 +19,7 @@ from jwt.exceptions import (
 )
 
 from ecommerce_common.auth.abstract import BaseGetProfileMixin
-from ecommerce_common.auth.keystore import create_keystore_helper
+from ecommerce_common.auth.keystore import get_shared_keystore
 from ecommerce_common.auth.jwt import JWT
 from ecommerce_common.models.constants import ROLE_ID_SUPERUSER, ROLE_ID_STAFF
 from ecommerce_common.cors.middleware import conf as cors_conf
@@ -83,8 +83,8 @@ class RefreshJWTauthentication(DjangoGetProfileMixin):
         account = None
         result = None
         payld_verified = None
-        if encoded_rfr_tok:  # TODO, move keystore to global shared context
-            _keystore = create_keystore_helper(
+        if encoded_rfr_tok:
+            _keystore = get_shared_keystore(
                 cfg=django_settings.AUTH_KEYSTORE, import_fn=import_module_string
             )
             try:
@@ -164,8 +164,8 @@ class AccessJWTauthentication(DjangoGetProfileMixin):
     def authenticate_credentials(self, encoded_acs_tok, audience):
         account = None
         result = None
-        payld_verified = None  # TODO, move keystore to global shared context
-        _keystore = create_keystore_helper(
+        payld_verified = None
+        _keystore = get_shared_keystore(
             cfg=django_settings.AUTH_KEYSTORE, import_fn=import_module_string
         )
         try:
@@ -17,8 +17,8 @@ def base_authentication(token: str, audience, keystore, error_obj=None):
     from fastapi import HTTPException, status as HTTPstatus
 
     try:
-        jwt = JWT(encoded=token)
-        payld = jwt.verify(keystore=keystore, audience=audience)
+        jwt = JWT()
+        payld = jwt.verify(unverified=token, keystore=keystore, audience=audience)
         if not payld:
             raise DecodeError("payload of jwt token is null, authentication failure")
         return payld
@@ -1,10 +1,17 @@
+from collections import OrderedDict
+import copy
 from datetime import datetime, timedelta, timezone
 from functools import partial
+import hashlib
+import heapq
+import itertools
 import math
 import logging
 import json
+import threading
+import time
 import jwt
-from jwt import PyJWKClient
+from jwt import PyJWKClient, PyJWT
 from jwt.api_jwk import PyJWK
 from jwt.utils import to_base64url_uint
 from jwt.exceptions import InvalidKeyError, PyJWKClientConnectionError, PyJWKSetError
@@ -13,23 +20,123 @@ from ecommerce_common.util import ExtendedDict
 from ecommerce_common.auth.keystore import (
     AbstractKeystorePersistReadMixin,
     RSAKeygenHandler,
+    add_keystore_change_callback,
 )
 from ecommerce_common.models.constants import ROLE_ID_SUPERUSER, ROLE_ID_STAFF
 
 _logger = logging.getLogger(__name__)
 
 
+class VerifiedTokenCache:
+    """
+    Bounded cache of successfully verified tokens, each entry is keyed by digest
+    of the raw token, the key ID which signed it, and the audience it was verified
+    against, then remembered until the `exp` claim of the token. When the cache
+    is full, expired entries are evicted first, then the least recently used ones.
+
+    The shared cache of `JWT` is cleared whenever the keystore is invalidated or
+    rotated, see `add_keystore_change_callback()`.
+    """
+
+    DEFAULT_MAX_ENTRIES = 2048
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expiry timestamp, cached value)
+        # (expiry timestamp, sequence number, key), may contain stale items
+        self._expiry_heap = []
+        self._seq = itertools.count()
+
+    @property
+    def max_entries(self):
+        return self._max_entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def gen_key(encoded, audience, kid=None):
+        if isinstance(encoded, str):
+            encoded = encoded.encode("utf-8")
+        if audience is not None and not isinstance(audience, str):
+            audience = tuple(sorted(audience))
+        return (hashlib.sha256(encoded).digest(), kid, audience)
+
+    def get(self, key, now=None):
+        now = now or time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key, value, expiry, now=None):
+        now = now or time.time()
+        if self._max_entries <= 0 or expiry <= now:
+            return
+        with self._lock:
+            self._entries[key] = (expiry, value)
+            self._entries.move_to_end(key)
+            heapq.heappush(self._expiry_heap, (expiry, next(self._seq), key))
+            if len(self._entries) > self._max_entries or len(self._expiry_heap) > (
+                self._max_entries << 1
+            ):
+                self._evict(now=now)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _evict(self, now):
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            expiry, _, key = heapq.heappop(heap)
+            entry = self._entries.get(key)
+            if entry and entry[0] == expiry:
+                del self._entries[key]
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+        if len(heap) > (self._max_entries << 1):
+            # discard the items whose entries were already evicted
+            self._expiry_heap = [
+                (v[0], next(self._seq), k) for k, v in self._entries.items()
+            ]
+            heapq.heapify(self._expiry_heap)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._expiry_heap.clear()
+
+
+## end of class VerifiedTokenCache
+
+
 class JWT:
     """
     internal wrapper class for detecting JWT write, verify, and generate encoded token,
     in this wrapper, `acc_id` claim is required in payload
     """
 
+    # shared among all instances in the process, set `None` to disable the cache
+    verified_cache = VerifiedTokenCache()
+    _decoder = PyJWT()
+
     def __init__(self, encoded=None):
         self.encoded = encoded
         self._destroy = False
         self._valid = None
 
+    @classmethod
+    def clear_verified_cache(cls):
+        if cls.verified_cache is not None:
+            cls.verified_cache.clear()
+
     @property
     def encoded(self):
         return self._encoded
@@ -38,8 +145,11 @@ class JWT:
     def encoded(self, value):
         self._encoded = value
         if value:
-            header = jwt.get_unverified_header(value)
-            payld = jwt.decode(value, options={"verify_signature": False})
+            decoded = self._decoder.decode_complete(
+                value, options={"verify_signature": False}
+            )
+            header = decoded["header"]
+            payld = decoded["payload"]
         else:
             header = {}
             payld = {}
@@ -73,16 +183,36 @@ class JWT:
 
     def verify(self, keystore, audience, unverified=None, raise_if_failed=False):
         self._valid = False
+        header_loaded = not unverified
         if unverified:
-            self.encoded = unverified
+            # only the header is required before verification, the payload will
+            # be loaded from verified result, so the token is decoded only once
+            self._encoded = unverified
+            self._header = ExtendedDict()
+            self._payld = ExtendedDict()
+        if not header_loaded:
+            self._header = ExtendedDict(jwt.get_unverified_header(self.encoded))
         alg = self.header.get("alg", "")
         unverified_kid = self.header.get("kid", "")
+        cache = self.verified_cache if self.encoded else None
+        cache_key, cached = None, None
+        if cache is not None:
+            cache_key = cache.gen_key(self.encoded, audience, kid=unverified_kid)
+            cached = cache.get(cache_key)
+        if cached is not None and self._signing_key_exists(keystore, unverified_kid):
+            header, verified = cached
+            self._header = ExtendedDict(header)
+            self._payld = ExtendedDict(copy.deepcopy(verified))
+            self._valid = True
+            return copy.deepcopy(verified)
+        elif cached is not None:
+            cache.discard(cache_key)
         log_args = ["unverified_kid", unverified_kid, "alg", alg]
         try:
             keyitem = keystore.choose_pubkey(kid=unverified_kid)
             pubkey = keyitem if isinstance(keyitem, PyJWK) else PyJWK(jwk_data=keyitem)
-        except AssertionError as e:
-            log_args.extend(["err_msg", ", ".join(e.args)])
+        except (AssertionError, KeyError) as e:
+            log_args.extend(["err_msg", ", ".join(map(str, e.args))])
             pubkey = None
         if not pubkey:
             log_args.extend(["msg", "public key not found on verification"])
@@ -96,15 +226,15 @@ class JWT:
                 "verify_exp": True,
                 "verify_aud": True,
             }
-            verified = jwt.decode(
+            decoded = self._decoder.decode_complete(
                 self.encoded,
                 pubkey.key,
                 algorithms=alg,
                 options=options,
                 audience=audience,
             )
-            errmsg = "data inconsistency, self.payload = %s , verified = %s"
-            assert self.payload == verified, errmsg % (self.payload, verified)
+            verified = decoded["payload"]
+            self._payld = ExtendedDict(copy.deepcopy(verified))
             self._valid = True
         except Exception as e:
             log_args.extend(
@@ -122,8 +252,26 @@ class JWT:
                 raise
             else:
                 verified = None
+        if (
+            verified
+            and cache is not None
+            and isinstance(verified.get("exp"), (int, float))
+        ):
+            cache.set(
+                cache_key, value=(decoded["header"], verified), expiry=verified["exp"]
+            )
+            verified = copy.deepcopy(verified)
         return verified
 
+    @staticmethod
+    def _signing_key_exists(keystore, kid):
+        # the key which signed a cached token may be revoked after the token was
+        # verified, in such case the token has to be verified again
+        try:
+            return bool(keystore.choose_pubkey(kid=kid))
+        except (AssertionError, KeyError):
+            return False
+
     def encode(self, keystore):
         if self.modified:
             log_args = []
@@ -168,6 +316,9 @@ class JWT:
         self.payload.update(payld_kwargs, overwrite=False)
 
 
+add_keystore_change_callback(JWT.clear_verified_cache)
+
+
 class JwkRsaKeygenHandler(RSAKeygenHandler):
     @property
     def algorithm(self):
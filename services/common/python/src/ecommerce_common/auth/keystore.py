@@ -1,8 +1,10 @@
 from datetime import timedelta, datetime, date, UTC
 from types import GeneratorType
+from bisect import bisect_left
 import os
 import random
 import logging
+import threading
 import uuid
 import json
 
@@ -267,6 +269,9 @@ class JWKSFilePersistHandler(AbstractCryptoKeyPersistHandler):
 
         self._ijson = ijson
         self._file = open(filepath, mode="rb")
+        # the read operations below share the same file position, serialize them
+        # when the handler is shared among threads (e.g. by SharedKeystoreRegistry)
+        self._lock = threading.RLock()
 
     def __del__(self):
         if hasattr(self, "_file") and self._file and not self._file.closed:
@@ -275,6 +280,10 @@ class JWKSFilePersistHandler(AbstractCryptoKeyPersistHandler):
     def flush(self):
         if not self._uncommitted_add and not self._uncommitted_delete:
             return
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
         tmp_wr_file_name = "%s.new" % self._file.name
         pos_add = 0
         prev_wr_rawline = ""
@@ -326,7 +335,7 @@ class JWKSFilePersistHandler(AbstractCryptoKeyPersistHandler):
         self._uncommitted_delete.clear()
         self._uncommitted_add.clear()
 
-    ## end of flush()
+    ## end of _flush()
 
     def _adjust_comma_on_flush_deletion(
         self, wr_file, prev_wr_file_pos, prev_wr_rawline
@@ -401,14 +410,28 @@ class JWKSFilePersistHandler(AbstractCryptoKeyPersistHandler):
         list(map(os.remove, delete_files))
 
     def iterate_key_ids(self):
-        self._file.seek(0)
-        parse_evts = self._ijson.parse(self._file)
-        for prefix, evt_label, value in parse_evts:
-            if prefix == "" and evt_label == "map_key":
-                yield value
+        # collect under the lock then release it before yielding, callers
+        # which stop early (e.g. `random_choose()`) must not keep it held
+        with self._lock:
+            self._file.seek(0)
+            parse_evts = self._ijson.parse(self._file)
+            key_ids = [
+                value
+                for prefix, evt_label, value in parse_evts
+                if prefix == "" and evt_label == "map_key"
+            ]
+        yield from key_ids
         # update key ID list for any difference
 
     def items(self, present_fields=None):
+        with self._lock:
+            items = [
+                (key_id, dict(item))
+                for key_id, item in self._items(present_fields=present_fields)
+            ]
+        yield from items
+
+    def _items(self, present_fields=None):
         self._file.seek(0)
         present_fields = present_fields or []
         parse_evts = self._ijson.parse(self._file)
@@ -434,21 +457,143 @@ class JWKSFilePersistHandler(AbstractCryptoKeyPersistHandler):
     def __getitem__(self, key_id):
         # currently this function limits to fetch those items which are already committed & stored
         item = None
+        with self._lock:
+            self._file.seek(0)
+            generator = self._ijson.items(self._file, key_id)
+            try:
+                item = next(generator)
+            except StopIteration:
+                raise KeyError("invalid key ID : %s" % key_id)
+            try:
+                dup_kid_item = next(generator)
+                raise ValueError("duplicate key ID : %s" % key_id)
+            except StopIteration:
+                pass  # the item with unique key ID should go here
+        return item.copy()
+
+
+# end of class JWKSFilePersistHandler
+
+
+class IndexedJWKSFilePersistHandler(JWKSFilePersistHandler):
+    """
+    Variant of `JWKSFilePersistHandler` which parses the JWKS file once into
+    in-memory index, so that key lookup by ID takes constant time, random key
+    selection and expired-key eviction no longer scan the whole file.
+
+    The index is reloaded lazily when the file is replaced or modified on disk,
+    e.g. after the key rotation in another process, while flushing uncommitted
+    changes (including the backup of old versions) works the same as the parent
+    class.
+    """
+
+    def __init__(self, filepath, **kwargs):
+        super().__init__(filepath=filepath, **kwargs)
+        self._fingerprint = None
+        # the index is a tuple of the items below, always replaced as a whole
+        # * dict which maps each key ID to the key item
+        # * tuple of key IDs, for random selection
+        # * list of `(expiry date, key ID)` pairs in ascending order
+        # * set of duplicate key IDs found in the file
+        self._index = ({}, (), [], set())
+        self._refresh_index()
+
+    def _file_fingerprint(self):
+        st = os.stat(self._file.name)
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _refresh_index(self):
+        try:
+            fingerprint = self._file_fingerprint()
+        except FileNotFoundError:
+            # another process may be switching the files on flush, keep using
+            # current index until the new version is in place
+            return self._index
+        if fingerprint == self._fingerprint:
+            return self._index
+        with self._lock:
+            fingerprint = self._file_fingerprint()
+            if fingerprint == self._fingerprint:
+                return self._index
+            if os.fstat(self._file.fileno()).st_ino != fingerprint[0]:
+                # the file was replaced by another process, always flush
+                # subsequent changes to current version
+                self._file.close()
+                self._file = open(self._file.name, mode="rb")
+            self._index = self._load_index()
+            self._fingerprint = fingerprint
+        return self._index
+
+    def _load_index(self):
+        keyitems = {}
+        duplicates = set()
         self._file.seek(0)
-        generator = self._ijson.items(self._file, key_id)
+        for key_id, item in self._ijson.kvitems(self._file, prefix=""):
+            if key_id in keyitems:
+                duplicates.add(key_id)
+            keyitems[key_id] = item
+        expiry_order = sorted(
+            (date.fromisoformat(v["exp"]), k) for k, v in keyitems.items()
+        )
+        return (keyitems, tuple(keyitems.keys()), expiry_order, duplicates)
+
+    def _switch_files_on_flush(self, wr_file_path):
+        super()._switch_files_on_flush(wr_file_path=wr_file_path)
+        self._file.close()
+        self._file = open(self._file.name, mode="rb")
+        self._refresh_index()
+
+    def __len__(self):
+        return len(self._refresh_index()[0])
+
+    def __setitem__(self, key_id, item: dict):
+        self._set_item_error_check(key_id=key_id, item=item)
+        if key_id in self._refresh_index()[0]:
+            self._remove(key_ids=[key_id])
+        self._uncommitted_add[key_id] = item
+        self._flush_if_full()
+
+    def iterate_key_ids(self):
+        return iter(self._refresh_index()[1])
+
+    def items(self, present_fields=None):
+        present_fields = present_fields or []
+        keyitems = self._refresh_index()[0]
+        for key_id, item in keyitems.items():
+            yield key_id, {k: item[k] for k in present_fields if k in item}
+
+    def __getitem__(self, key_id):
+        keyitems, _, _, duplicates = self._refresh_index()
+        if key_id in duplicates:
+            raise ValueError("duplicate key ID : %s" % key_id)
         try:
-            item = next(generator)
-        except StopIteration:
+            item = keyitems[key_id]
+        except KeyError:
             raise KeyError("invalid key ID : %s" % key_id)
-        try:
-            dup_kid_item = next(generator)
-            raise ValueError("duplicate key ID : %s" % key_id)
-        except StopIteration:
-            pass  # the item with unique key ID should go here
         return item.copy()
 
+    def random_choose(self):
+        key_ids = self._refresh_index()[1]
+        key_id = random.choice(key_ids) if key_ids else None
+        item = self[key_id]
+        item["kid"] = key_id
+        return item
+
+    def evict_expired_keys(self, date_limit=None):
+        date_limit = date_limit or date.today()
+        keyitems, _, expiry_order, _ = self._refresh_index()
+        # all the keys before this position expired earlier than the date limit
+        pos = bisect_left(expiry_order, (date_limit,))
+        evict = [kid for _, kid in expiry_order[:pos]]
+        result = [
+            {"persist_handler": self.name, "kid": kid, "exp": keyitems[kid]["exp"]}
+            for kid in evict
+        ]
+        self.remove(key_ids=evict)
+        return result
 
-# end of class JWKSFilePersistHandler
+
+# end of class IndexedJWKSFilePersistHandler
 
 
 class AbstractKeygenHandler:
@@ -636,6 +781,8 @@ class BaseAuthKeyStore:
         self._persistence["secret"].flush()
         if keygen_handler.asymmetric and self._persistence["pubkey"] is not None:
             self._persistence["pubkey"].flush()
+        if result["evict"]:
+            _notify_keystore_changed()
         return result
 
     def _choose(self, persist_handler, kid, randonly):
@@ -683,3 +830,116 @@ def create_keystore_helper(cfg, import_fn):
             **persist_handler_kwargs
         )
     return keystore_cls(**ks_kwargs)
+
+
+_keystore_change_callbacks = []
+
+
+def add_keystore_change_callback(fn):
+    """
+    register a callable without argument, which is invoked whenever keys may be
+    revoked from the keystore, that is, on key rotation, explicit invalidation,
+    or rebuilding a shared keystore due to modified JWKS file
+    """
+    if fn not in _keystore_change_callbacks:
+        _keystore_change_callbacks.append(fn)
+
+
+def _notify_keystore_changed():
+    for fn in list(_keystore_change_callbacks):
+        fn()
+
+
+class SharedKeystoreRegistry:
+    """
+    Process-wide cache of keystores created by `create_keystore_helper()`.
+
+    Each distinct keystore configuration is built only once per process, then
+    reused by all threads. A cached keystore is rebuilt when :
+        * any JWKS file referenced in the configuration (the `filepath` argument
+          of a persist handler) changes its inode or modification time, which
+          happens after key rotation flushes new key set to the file.
+        * application callers explicitly invalidate it, e.g. on receiving a
+          rotation signal.
+    The cache is dropped in child process after `fork()` , so the workers of
+    pre-forking server (e.g. gunicorn) never share open file handles.
+    """
+
+    HANDLER_LABELS = ("persist_secret_handler", "persist_pubkey_handler")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._pid = os.getpid()
+
+    def _reset_after_fork(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._pid = os.getpid()
+
+    @staticmethod
+    def _cache_key(cfg):
+        return json.dumps(cfg, sort_keys=True, default=str)
+
+    def _file_fingerprints(self, cfg):
+        out = []
+        for label in self.HANDLER_LABELS:
+            filepath = (cfg.get(label) or {}).get("init_kwargs", {}).get("filepath")
+            if not filepath:
+                continue
+            try:
+                st = os.stat(filepath)
+                out.append((st.st_ino, st.st_mtime_ns, st.st_size))
+            except OSError:
+                out.append(None)
+        return tuple(out)
+
+    def get(self, cfg, import_fn):
+        if self._pid != os.getpid():
+            # fallback for platforms without `os.register_at_fork()`
+            self._reset_after_fork()
+        key = self._cache_key(cfg)
+        fingerprints = self._file_fingerprints(cfg)
+        entry = self._entries.get(key)
+        if entry and entry[0] == fingerprints:
+            return entry[1]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == fingerprints:
+                return entry[1]
+            keystore = create_keystore_helper(cfg=cfg, import_fn=import_fn)
+            self._entries[key] = (fingerprints, keystore)
+            log_args = ["action", "keystore-built", "pid", str(self._pid)]
+            _logger.debug(None, *log_args)
+        if entry:  # key file modified, probably rotated by other process
+            _notify_keystore_changed()
+        return keystore
+
+    def invalidate(self, cfg=None):
+        """
+        drop the cached keystore of given configuration, or all of them if
+        `cfg` is omitted, next call to `get()` will rebuild the keystore.
+        """
+        with self._lock:
+            if cfg is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(self._cache_key(cfg), None)
+        _notify_keystore_changed()
+
+
+## end of class SharedKeystoreRegistry
+
+_shared_keystore_registry = SharedKeystoreRegistry()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_shared_keystore_registry._reset_after_fork)
+
+
+def get_shared_keystore(cfg, import_fn):
+    return _shared_keystore_registry.get(cfg=cfg, import_fn=import_fn)
+
+
+def invalidate_shared_keystore(cfg=None):
+    """application callers invoke this function on rotation signal"""
+    _shared_keystore_registry.invalidate(cfg=cfg)
@@ -165,8 +165,9 @@ def filter_closure_nodes_recovery(records_in, app_label, model_name):
         check_failed
     ):  # recovery failure, the deleted closure table paths in this changeset must be discarded
         exclude_path_ids = [a.pk for a in del_asc] + [d.pk for d in del_desc]
+        record_cls = records_in.model
         records_out = records_in.exclude(
-            content_type=path_ct.pk, object_id__in=exclude_path_ids
+            content_type=path_ct.pk, **record_cls.obj_ids_lookup(exclude_path_ids)
         )
     else:
         log_msg.extend(["check_failed", check_failed])
@@ -1,8 +1,9 @@
-from time import sleep
+from time import sleep, perf_counter
 from pathlib import Path
 from typing import Optional, Tuple
 import functools
 import logging
+import threading
 
 from ecommerce_common.util import (
     import_module_string,
@@ -48,6 +49,29 @@ def db_conn_retry_wrapper(func):
     return inner  #### end of db_conn_retry_wrapper()
 
 
+# options of connection pool accepted by `create_engine()` in SQLAlchemy
+SQLALCHEMY_POOL_OPTIONS = (
+    "pool_size",
+    "max_overflow",
+    "pool_recycle",
+    "pool_pre_ping",
+    "pool_timeout",
+)
+
+
+def sqlalchemy_pool_kwargs(pool_options: Optional[dict] = None) -> dict:
+    """
+    validate the pool options from settings, note `pool_recycle` should be
+    less than `wait_timeout` of MySQL / MariaDB server, so the connections
+    idle in the pool are never closed at server side.
+    """
+    pool_options = pool_options or {}
+    invalid = set(pool_options.keys()) - set(SQLALCHEMY_POOL_OPTIONS)
+    if invalid:
+        raise ValueError("unknown pool options: %s" % ", ".join(sorted(invalid)))
+    return dict(pool_options)
+
+
 def sqlalchemy_init_engine(
     secrets_file_path,
     secret_map: Tuple[str, str],
@@ -55,6 +79,7 @@ def sqlalchemy_init_engine(
     driver_label: str,
     db_name: str = "",
     conn_args: Optional[dict] = None,
+    pool_options: Optional[dict] = None,
 ):
     from sqlalchemy.ext.asyncio import create_async_engine
 
@@ -68,8 +93,130 @@ def sqlalchemy_init_engine(
     if db_name:
         chosen_db_credential["NAME"] = db_name
     url = format_sqlalchemy_url(driver=driver_label, db_credential=chosen_db_credential)
+    pool_kwargs = sqlalchemy_pool_kwargs(pool_options)
     # reminder: use engine.dispose() to free up all connections in its pool
-    return create_async_engine(url, connect_args=conn_args)
+    return create_async_engine(url, connect_args=conn_args, **pool_kwargs)
+
+
+class SqlAlchemyPoolMetrics:
+    """
+    usage statistics of connection pool in a SQLAlchemy engine (either sync
+    or async), collected only from public events :
+    - `connect`, time spent on establishing new database connection, from
+      dialect event `do_connect` to pool event `connect`, which is part of
+      the wait at checkout when the pool has no idle connection
+    - `hold`, time each connection is checked out, from pool event `checkout`
+      to `checkin`, long hold time makes other callers wait for the pool
+    - `num_drained`, number of checkouts which leave no idle connection in the
+      pool, the next caller has to open overflow connection or wait
+    """
+
+    _CONNECT_T0_KEY = "_metrics_connect_t0"
+    _CHECKOUT_T0_KEY = "_metrics_checkout_t0"
+
+    def __init__(self, engine):
+        from sqlalchemy import event as sa_event
+
+        self._engine = getattr(engine, "sync_engine", engine)
+        self._lock = threading.Lock()
+        self.reset()
+        # pool event listeners on the engine are carried over to new pool
+        # created by `engine.dispose()`
+        sa_event.listen(self._engine, "do_connect", self._on_do_connect)
+        sa_event.listen(self._engine, "connect", self._on_connect)
+        sa_event.listen(self._engine, "checkout", self._on_checkout)
+        sa_event.listen(self._engine, "checkin", self._on_checkin)
+        sa_event.listen(self._engine, "invalidate", self._on_invalidate)
+
+    @property
+    def _pool(self):
+        return self._engine.pool
+
+    def reset(self):
+        with self._lock:
+            self._reset_at = perf_counter()
+            self._counters = {
+                "num_connects": 0,
+                "num_checkouts": 0,
+                "num_checkins": 0,
+                "num_invalidated": 0,
+                "num_drained": 0,
+                "max_checked_out": 0,
+            }
+            self._timings = {
+                "connect": {"count": 0, "total_secs": 0.0, "max_secs": 0.0},
+                "hold": {"count": 0, "total_secs": 0.0, "max_secs": 0.0},
+            }
+
+    def _add_timing(self, name: str, t0: Optional[float]):
+        # skip the events which started before the metrics was reset
+        if t0 is None or t0 < self._reset_at:
+            return
+        elapsed = perf_counter() - t0
+        timing = self._timings[name]
+        timing["count"] += 1
+        timing["total_secs"] += elapsed
+        timing["max_secs"] = max(timing["max_secs"], elapsed)
+
+    def _on_do_connect(self, dialect, conn_record, cargs, cparams):
+        conn_record.info[self._CONNECT_T0_KEY] = perf_counter()
+        # let the dialect establish the connection as usual
+
+    def _on_connect(self, dbapi_conn, conn_record):
+        t0 = conn_record.info.pop(self._CONNECT_T0_KEY, None)
+        with self._lock:
+            self._counters["num_connects"] += 1
+            self._add_timing("connect", t0)
+
+    def _on_checkout(self, dbapi_conn, conn_record, conn_proxy):
+        conn_record.info[self._CHECKOUT_T0_KEY] = perf_counter()
+        checked_out = self._pool_stat("checkedout")
+        checked_in = self._pool_stat("checkedin")
+        with self._lock:
+            self._counters["num_checkouts"] += 1
+            if checked_in == 0:
+                self._counters["num_drained"] += 1
+            if checked_out and checked_out > self._counters["max_checked_out"]:
+                self._counters["max_checked_out"] = checked_out
+
+    def _on_checkin(self, dbapi_conn, conn_record):
+        t0 = conn_record.info.pop(self._CHECKOUT_T0_KEY, None)
+        with self._lock:
+            self._counters["num_checkins"] += 1
+            self._add_timing("hold", t0)
+
+    def _on_invalidate(self, dbapi_conn, conn_record, exception):
+        with self._lock:
+            self._counters["num_invalidated"] += 1
+
+    def _pool_stat(self, name: str) -> Optional[int]:
+        # only queue-based pools report the number of connections
+        fn = getattr(self._pool, name, None)
+        return fn() if callable(fn) else None
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            out = dict(self._counters)
+            timings = {k: dict(v) for k, v in self._timings.items()}
+        for timing in timings.values():
+            num = timing["count"]
+            timing["avg_secs"] = (timing["total_secs"] / num) if num else 0
+        # negative overflow means the connections not created yet in the pool
+        overflow = self._pool_stat("overflow")
+        out.update(
+            {
+                "pool_class": type(self._pool).__name__,
+                "size": self._pool_stat("size"),
+                "checked_in": self._pool_stat("checkedin"),
+                "checked_out": self._pool_stat("checkedout"),
+                "overflow": None if overflow is None else max(overflow, 0),
+                **timings,
+            }
+        )
+        return out
+
+
+## end of class SqlAlchemyPoolMetrics
 
 
 def sqlalchemy_db_conn(engine, enable_orm=False):
@@ -156,33 +303,79 @@ def get_db_error_response(e, headers: dict, raise_if_not_handled=True):
     return status
 
 
-def get_sql_table_pk_gap_ranges(db_table: str, pk_db_column: str, max_value: int):
-    raw_sql_subquery = "SELECT m1.{pk_db_column} as lowerbound, MIN(m2.{pk_db_column}) as upperbound \
-            FROM {your_table} m1 INNER JOIN {your_table} AS m2 ON m1.{pk_db_column} < m2.{pk_db_column} \
-            GROUP BY m1.{pk_db_column} ORDER BY m1.{pk_db_column} ASC".format(
-        your_table=db_table, pk_db_column=pk_db_column
-    )
+def get_sql_table_pk_gap_ranges(
+    db_table: str, pk_db_column: str, max_value: int, max_num_gaps: int = 8
+):
+    """
+    return 3 raw SQL queries which find out the ranges of unused primary key
+    values, in the format (`gap_from`, `gap_to`) :
+    - the gap before the smallest primary key
+    - the first `max_num_gaps` gaps between 2 adjacent primary keys, the query
+      relies on window function `LEAD()` (supported since MySQL 8.0,
+      MariaDB 10.2, SQLite 3.25) , which scans the primary-key index only once
+      instead of self-joining the table
+    - the gap after the largest primary key, up to `max_value`
+
+    Each query returns no row if there is no such gap, the caller should treat
+    the result as empty table if none of the queries returns any row.
+    """
+    fmt_kwargs = {
+        "your_table": db_table,
+        "pk_db_column": pk_db_column,
+        "max_value": max_value,
+        "max_num_gaps": max_num_gaps,
+    }
     raw_sql_queries = []
     raw_sql_queries.append(
-        "SELECT 1 AS gap_from, {pk_db_column} - 1 AS gap_to FROM {your_table} WHERE {pk_db_column} \
-            > 1 ORDER BY {pk_db_column} ASC LIMIT 1".format(
-            your_table=db_table, pk_db_column=pk_db_column
-        )
+        "SELECT 1 AS gap_from, MIN({pk_db_column}) - 1 AS gap_to FROM {your_table} \
+            HAVING MIN({pk_db_column}) > 1".format(**fmt_kwargs)
     )
     raw_sql_queries.append(
-        "SELECT m3.lowerbound + 1 AS gap_from, m3.upperbound - 1 AS gap_to FROM (%s) m3 WHERE \
-             m3.lowerbound < m3.upperbound - 1 LIMIT 8"
-        % raw_sql_subquery
+        "SELECT m3.curr_pk + 1 AS gap_from, m3.next_pk - 1 AS gap_to FROM (SELECT \
+            {pk_db_column} AS curr_pk, LEAD({pk_db_column}) OVER (ORDER BY {pk_db_column} \
+            ASC) AS next_pk FROM {your_table}) m3 WHERE m3.next_pk > m3.curr_pk + 1 \
+            ORDER BY m3.curr_pk ASC LIMIT {max_num_gaps}".format(**fmt_kwargs)
     )
     raw_sql_queries.append(
-        "SELECT {pk_db_column} + 1 AS gap_from, {max_value} AS gap_to FROM {your_table} \
-            ORDER BY {pk_db_column} DESC LIMIT 1".format(
-            your_table=db_table, pk_db_column=pk_db_column, max_value=max_value
-        )
+        "SELECT MAX({pk_db_column}) + 1 AS gap_from, {max_value} AS gap_to FROM \
+            {your_table} HAVING MAX({pk_db_column}) < {max_value}".format(**fmt_kwargs)
     )
     return raw_sql_queries
 
 
+def get_sql_table_pk_gap_ranges_cte(
+    db_table: str, pk_db_column: str, max_value: int, max_num_gaps: int = 8
+) -> str:
+    """
+    single raw SQL query which returns the same gap ranges as the 3 queries
+    from `get_sql_table_pk_gap_ranges()` , ordered by `gap_from` , so the
+    caller finds out all the gaps in one round trip to database server.
+    Common table expression is supported since MySQL 8.0, MariaDB 10.2 ,
+    and SQLite 3.8.3
+    """
+    return """WITH pk_bounds AS (
+        SELECT MIN({pk}) AS min_pk, MAX({pk}) AS max_pk FROM {tbl}
+    ), pk_pairs AS (
+        SELECT {pk} AS curr_pk, LEAD({pk}) OVER (ORDER BY {pk} ASC) AS next_pk
+        FROM {tbl}
+    )
+    SELECT 1 AS gap_from, min_pk - 1 AS gap_to FROM pk_bounds WHERE min_pk > 1
+    UNION ALL
+    SELECT gap_from, gap_to FROM (
+        SELECT curr_pk + 1 AS gap_from, next_pk - 1 AS gap_to FROM pk_pairs
+        WHERE next_pk > curr_pk + 1 ORDER BY curr_pk ASC LIMIT {max_num_gaps}
+    ) AS pk_mid
+    UNION ALL
+    SELECT max_pk + 1 AS gap_from, {max_value} AS gap_to FROM pk_bounds
+    WHERE max_pk < {max_value}
+    ORDER BY gap_from ASC""".format(
+        tbl=db_table,
+        pk=pk_db_column,
+        max_value=max_value,
+        max_num_gaps=max_num_gaps,
+    )
+
+
 class ServiceModelRouter:
     # commonly used apps for all services
     _common_app_labels = [
@@ -1,6 +1,13 @@
 import random
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import List
 
-from ecommerce_common.models.db import get_sql_table_pk_gap_ranges
+from ecommerce_common.models.db import (
+    get_sql_table_pk_gap_ranges,
+    get_sql_table_pk_gap_ranges_cte,
+)
 
 
 class MinimumInfoMixin:
@@ -18,8 +25,132 @@ class MinimumInfoMixin:
         return {fname: getattr(self, fname) for fname in field_names}
 
 
+class IdBlockAllocator:
+    """
+    hand out distinct ID numbers from free ranges (gap ranges) of a database table.
+    Each time the allocator runs out of reserved IDs, it reserves another block
+    of consecutive IDs from randomly chosen slice of a gap range, the reserved
+    IDs are never handed out again in the same process, and different
+    processes hardly contend for the same block.
+    """
+
+    def __init__(self, block_size: int = 64):
+        self._block_size = block_size
+        self._lock = threading.Lock()
+        self._gap_ranges = []
+        self._reserved = deque()
+
+    @property
+    def num_available(self) -> int:
+        with self._lock:
+            num = sum(map(lambda r: r[1] - r[0] + 1, self._gap_ranges))
+            return num + len(self._reserved)
+
+    def refill(self, gap_ranges):
+        """
+        discard all IDs reserved previously and start reserving from given
+        gap ranges, each of which has the format (`lowerbound`, `upperbound`)
+        """
+        with self._lock:
+            self._gap_ranges = [
+                (lower, upper) for lower, upper in gap_ranges if lower <= upper
+            ]
+            self._reserved.clear()
+
+    def reserve(self, num: int) -> List[int]:
+        """
+        return list of at most `num` distinct IDs, return less than `num` IDs
+        only if all the gap ranges are used up
+        """
+        with self._lock:
+            while len(self._reserved) < num and self._reserve_block():
+                pass
+            num = min(num, len(self._reserved))
+            return [self._reserved.popleft() for _ in range(num)]
+
+    def _reserve_block(self) -> bool:
+        if not self._gap_ranges:
+            return False
+        sizes = [upper - lower + 1 for lower, upper in self._gap_ranges]
+        idx = random.choices(range(len(sizes)), weights=sizes)[0]
+        lower, upper = self._gap_ranges[idx]
+        num = min(self._block_size, sizes[idx])
+        start = random.randrange(lower, upper - num + 2)
+        end = start + num - 1
+        self._reserved.extend(range(start, end + 1))
+        remains = []
+        if lower < start:
+            remains.append((lower, start - 1))
+        if end < upper:
+            remains.append((end + 1, upper))
+        self._gap_ranges[idx : idx + 1] = remains
+        return True
+
+
+## end of class IdBlockAllocator
+
+
+class ExpiringIdSet:
+    """
+    bounded set of ID numbers, each of which is forgotten `ttl_secs` seconds
+    after it is added, or earlier when the set is full, in which case the
+    oldest one is evicted first.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_secs: float = 300.0):
+        self._max_entries = max_entries
+        self._ttl_secs = ttl_secs
+        self._lock = threading.Lock()
+        # ID -> expiry time, the insertion order is also the expiry order
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, value):
+        return self.contains(value)
+
+    def contains(self, value, now=None) -> bool:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._evict(now)
+            return value in self._entries
+
+    def add(self, value, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._entries.pop(value, None)
+            self._entries[value] = now + self._ttl_secs
+            self._evict(now)
+
+    def _evict(self, now):
+        entries = self._entries
+        while entries:
+            _, expiry = next(iter(entries.items()))
+            if len(entries) <= self._max_entries and now < expiry:
+                break
+            entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+## end of class ExpiringIdSet
+
+
 class IdGapNumberFinder:
     MAX_GAP_VALUE = pow(2, 32) - 1
+    ID_BLOCK_SIZE = 64
+    # the cached gap ranges are considered outdated after the given number of
+    # seconds, or after the given number of instances are saved
+    GAP_RANGES_TTL_SECS = 60
+    GAP_RANGES_MAX_INSERTS = 500
+    INVALID_ID_MAX_ENTRIES = 1024
+    INVALID_ID_TTL_SECS = 300
+    # find out all gap ranges by one CTE query, or 3 separate queries for
+    # the database servers which do not support CTE
+    GAP_RANGES_SINGLE_QUERY = True
     _finder_orm_map = {}
 
     def __new__(cls, orm_model_class, *args, **kwargs):
@@ -28,7 +159,14 @@ class IdGapNumberFinder:
         if not instance:
             instance = super().__new__(cls, *args, **kwargs)
             instance.orm_model_class = orm_model_class
-            instance._recent_invalid_ids = []
+            instance._recent_invalid_ids = ExpiringIdSet(
+                max_entries=cls.INVALID_ID_MAX_ENTRIES,
+                ttl_secs=cls.INVALID_ID_TTL_SECS,
+            )
+            instance._id_allocator = IdBlockAllocator(block_size=cls.ID_BLOCK_SIZE)
+            instance._gap_ranges_loaded_at = None
+            instance._num_saved_since_loaded = 0
+            instance._stats = {"gap_cache_hit": 0, "gap_cache_miss": 0, "collision": 0}
             cls._finder_orm_map[pkg_path] = instance
         return instance
 
@@ -48,29 +186,56 @@ class IdGapNumberFinder:
         except self.expected_db_errors() as e:
             if self.is_db_err_recoverable(error=e):
                 gap_ranges = self.get_gap_ranges(max_value=self.MAX_GAP_VALUE)
-                assert any(gap_ranges), "no gap ranges found"
-                error = e
-                while (
-                    True
-                ):  # may try different ID number in case race condition happens
-                    # find out the objects which have duplicate id, then give each of them distinct ID number
-                    dup_id = self.extract_dup_id_from_error(error)
-                    try:  # current id is duplicate, change to another one
-                        self._rand_gap_id(objs, gap_ranges, dup_id=dup_id)
-                        result = save_instance_fn()
-                    except self.expected_db_errors() as e2:
-                        # concurrent client requests happens to contend for the same ID number,
-                        # however only one request succeed to gain the number as its new ID,
-                        # and rest of the requests will have to try other different ID numbers
-                        # in next iteration.
-                        if self.is_db_err_recoverable(error=e2):
-                            error = e2  # then try again
-                        else:
-                            raise
-                    else:  # succeed to get the ID number
-                        break
+                result = self._save_with_gap_id(save_instance_fn, objs, gap_ranges, e)
+            else:
+                raise
+        self._count_saved(objs)
+        return result
+
+    def save_with_reserved_ids(self, save_instance_fn, objs):
+        """
+        assign IDs reserved in advance to the instances without ID, the IDs
+        come from gap ranges fetched from database, so the save function
+        rarely encounters duplicate-key error, which would happen only when
+        other processes insert the same ID numbers concurrently.
+        """
+        self._assert_any_dup_id(objs)
+        num_required = self._num_ids_required(objs)
+        if self._id_allocator.num_available < num_required:
+            gap_ranges = self._refresh_gap_ranges(max_value=self.MAX_GAP_VALUE)
+            self._refill_id_allocator(gap_ranges)
+        self._set_reserved_id(objs)
+        try:
+            result = save_instance_fn()
+        except self.expected_db_errors() as e:
+            if self.is_db_err_recoverable(error=e):
+                gap_ranges = self._refresh_gap_ranges(max_value=self.MAX_GAP_VALUE)
+                self._refill_id_allocator(gap_ranges)
+                result = self._save_with_gap_id(save_instance_fn, objs, gap_ranges, e)
             else:
                 raise
+        self._count_saved(objs)
+        return result
+
+    def _save_with_gap_id(self, save_instance_fn, objs, gap_ranges, error):
+        assert any(gap_ranges), "no gap ranges found"
+        while True:  # may try different ID number in case race condition happens
+            # find out the objects which have duplicate id, then give each of them distinct ID number
+            dup_id = self.extract_dup_id_from_error(error)
+            try:  # current id is duplicate, change to another one
+                self._rand_gap_id(objs, gap_ranges, dup_id=dup_id)
+                result = save_instance_fn()
+            except self.expected_db_errors() as e2:
+                # concurrent client requests happens to contend for the same ID number,
+                # however only one request succeed to gain the number as its new ID,
+                # and rest of the requests will have to try other different ID numbers
+                # in next iteration.
+                if self.is_db_err_recoverable(error=e2):
+                    error = e2  # then try again
+                else:
+                    raise
+            else:  # succeed to get the ID number
+                break
         return result
 
     # TODO, refactor with decorator
@@ -84,24 +249,84 @@ class IdGapNumberFinder:
                 gap_ranges = await self.async_get_gap_ranges(
                     max_value=self.MAX_GAP_VALUE
                 )
-                assert any(gap_ranges), "no gap ranges found"
-                error = e
-                while True:
-                    dup_id = self.extract_dup_id_from_error(error)
-                    try:
-                        self._rand_gap_id(objs, gap_ranges, dup_id=dup_id)
-                        result = await save_instance_fn()
-                    except self.expected_db_errors() as e2:
-                        if self.is_db_err_recoverable(error=e2):
-                            error = e2  # try again
-                        else:
-                            raise
-                    else:  # succeed to get the ID number
-                        break
+                result = await self._async_save_with_gap_id(
+                    save_instance_fn, objs, gap_ranges, e
+                )
             else:
                 raise
+        self._count_saved(objs)
         return result
 
+    async def async_save_with_reserved_ids(self, save_instance_fn, objs):
+        self._assert_any_dup_id(objs)
+        num_required = self._num_ids_required(objs)
+        if self._id_allocator.num_available < num_required:
+            gap_ranges = await self._async_refresh_gap_ranges(
+                max_value=self.MAX_GAP_VALUE
+            )
+            self._refill_id_allocator(gap_ranges)
+        self._set_reserved_id(objs)
+        try:
+            result = await save_instance_fn()
+        except self.expected_db_errors() as e:
+            if self.is_db_err_recoverable(error=e):
+                gap_ranges = await self._async_refresh_gap_ranges(
+                    max_value=self.MAX_GAP_VALUE
+                )
+                self._refill_id_allocator(gap_ranges)
+                result = await self._async_save_with_gap_id(
+                    save_instance_fn, objs, gap_ranges, e
+                )
+            else:
+                raise
+        self._count_saved(objs)
+        return result
+
+    async def _async_save_with_gap_id(self, save_instance_fn, objs, gap_ranges, error):
+        assert any(gap_ranges), "no gap ranges found"
+        while True:
+            dup_id = self.extract_dup_id_from_error(error)
+            try:
+                self._rand_gap_id(objs, gap_ranges, dup_id=dup_id)
+                result = await save_instance_fn()
+            except self.expected_db_errors() as e2:
+                if self.is_db_err_recoverable(error=e2):
+                    error = e2  # try again
+                else:
+                    raise
+            else:  # succeed to get the ID number
+                break
+        return result
+
+    def _num_ids_required(self, instances, id_field_name="id") -> int:
+        objs_pk_null = filter(
+            lambda instance: getattr(instance, id_field_name, None) is None, instances
+        )
+        return len(tuple(objs_pk_null))
+
+    def _refill_id_allocator(self, gap_ranges):
+        if not any(gap_ranges):
+            # none of the gap-range queries returns any row, which means the
+            # table is still empty
+            gap_ranges = [(1, self.MAX_GAP_VALUE)]
+        self._id_allocator.refill(gap_ranges)
+
+    def _set_reserved_id(self, instances, id_field_name="id"):
+        objs_pk_null = [
+            instance
+            for instance in instances
+            if getattr(instance, id_field_name, None) is None
+        ]
+        reserved_ids = self._id_allocator.reserve(len(objs_pk_null))
+        for instance, reserved_id in zip(objs_pk_null, reserved_ids):
+            setattr(instance, id_field_name, reserved_id)
+        # the gap-range queries return limited number of gaps, in case the
+        # reserved IDs are not sufficient, the rest of the instances fall back
+        # to random IDs, which might collide with existing IDs
+        self._set_random_id(
+            objs_pk_null[len(reserved_ids) :], self.MAX_GAP_VALUE, id_field_name
+        )
+
     def _set_random_id(self, instances, max_value, id_field_name="id"):
         objs_pk_null = filter(
             lambda instance: getattr(instance, id_field_name, None) is None, instances
@@ -110,42 +335,84 @@ class IdGapNumberFinder:
             rand_value = random.randrange(max_value)
             setattr(instance, id_field_name, rand_value)
 
-    # TODO: rename to `refresh-gap-ranges`
+    @property
+    def stats(self) -> dict:
+        """
+        counters for tuning the finder under production insert rates :
+        - `gap_cache_hit` / `gap_cache_miss`, number of times the cached gap
+          ranges are reused / reloaded from database
+        - `collision`, number of duplicate IDs reported by database
+        """
+        return dict(self._stats)
+
+    def reset_stats(self):
+        for k in self._stats.keys():
+            self._stats[k] = 0
+
+    def _count_saved(self, objs):
+        self._num_saved_since_loaded += len(objs)
+
+    def _gap_ranges_outdated(self) -> bool:
+        if self._gap_ranges_loaded_at is None:
+            return True
+        elapsed = time.monotonic() - self._gap_ranges_loaded_at
+        return (elapsed >= self.GAP_RANGES_TTL_SECS) or (
+            self._num_saved_since_loaded >= self.GAP_RANGES_MAX_INSERTS
+        )
+
+    def _set_gap_ranges(self, gap_ranges):
+        self._gap_ranges = gap_ranges
+        self._gap_ranges_loaded_at = time.monotonic()
+        self._num_saved_since_loaded = 0
+
+    def _gap_ranges_queries(self, max_value) -> list:
+        model_cls = self.orm_model_class
+        db_table = self.get_db_table_name(model_cls)
+        # TODO, figure out how to support multi-column primary key
+        pk_db_column = self.get_pk_db_column(model_cls)
+        kwargs = {
+            "db_table": db_table,
+            "pk_db_column": pk_db_column,
+            "max_value": max_value,
+        }
+        if self.GAP_RANGES_SINGLE_QUERY:
+            return [get_sql_table_pk_gap_ranges_cte(**kwargs)]
+        return get_sql_table_pk_gap_ranges(**kwargs)
+
     def get_gap_ranges(self, max_value):
         """
         return pairs of range value available for assigning numeric ID to new instance
         of ORM model class , each of which has the format (`lowerbound`, `upperbound`)
+        , the gap ranges are cached until they are outdated.
         """
-        # TODO: consider to discard the outdated gap ranges, this method is invoked
-        # only when low-level database found conflict on index keys, which means this
-        # internal gap-range list will need to be refreshed again
-        if not hasattr(self, "_gap_ranges"):
-            model_cls = self.orm_model_class
-            db_table = self.get_db_table_name(model_cls)
-            # TODO, figure out how to support multi-column primary key
-            pk_db_column = self.get_pk_db_column(model_cls)
-            raw_sql_queries = get_sql_table_pk_gap_ranges(
-                db_table=db_table, pk_db_column=pk_db_column, max_value=max_value
-            )
-            # execute 3 SELECT statements in one round trip to database server
-            self._gap_ranges = self.low_lvl_get_gap_range(raw_sql_queries)
+        if self._gap_ranges_outdated():
+            self._stats["gap_cache_miss"] += 1
+            self._refresh_gap_ranges(max_value)
+        else:
+            self._stats["gap_cache_hit"] += 1
+        return self._gap_ranges
+
+    def _refresh_gap_ranges(self, max_value):
+        raw_sql_queries = self._gap_ranges_queries(max_value)
+        self._set_gap_ranges(self.low_lvl_get_gap_range(raw_sql_queries))
         return self._gap_ranges
 
-    # TODO: rename to `async-refresh-gap-ranges`
     async def async_get_gap_ranges(self, max_value):
-        model_cls = self.orm_model_class
-        db_table = self.get_db_table_name(model_cls)
-        pk_db_column = self.get_pk_db_column(model_cls)
-        raw_sql_queries = get_sql_table_pk_gap_ranges(
-            db_table=db_table, pk_db_column=pk_db_column, max_value=max_value
-        )
-        return await self.async_lowlvl_gap_range(raw_sql_queries)
+        if self._gap_ranges_outdated():
+            self._stats["gap_cache_miss"] += 1
+            await self._async_refresh_gap_ranges(max_value)
+        else:
+            self._stats["gap_cache_hit"] += 1
+        return self._gap_ranges
+
+    async def _async_refresh_gap_ranges(self, max_value):
+        raw_sql_queries = self._gap_ranges_queries(max_value)
+        self._set_gap_ranges(await self.async_lowlvl_gap_range(raw_sql_queries))
+        return self._gap_ranges
 
     def clean_gap_ranges(self, max_value):
-        if hasattr(self, "_gap_ranges"):
-            delattr(self, "_gap_ranges")
-        if hasattr(self, "_recent_invalid_ids"):
-            delattr(self, "_recent_invalid_ids")
+        self._gap_ranges_loaded_at = None
+        self._recent_invalid_ids.clear()
 
     def _rand_gap_id(self, instances, gap_ranges, dup_id, id_field_name="id"):
         chosen_id = 0
@@ -161,7 +428,8 @@ class IdGapNumberFinder:
             if chosen_id in self._recent_invalid_ids:
                 chosen_id = 0
         old_id = getattr(dup_instance, id_field_name)
-        self._recent_invalid_ids.append(old_id)
+        self._recent_invalid_ids.add(old_id)
+        self._stats["collision"] += 1
         setattr(dup_instance, id_field_name, chosen_id)
 
     def expected_db_errors(self):
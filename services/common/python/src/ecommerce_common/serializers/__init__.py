@@ -1,8 +1,14 @@
 import logging
 from collections.abc import Iterable
 
-from django.db.models import Model as DjangoModel, QuerySet
-from django.core.exceptions import ObjectDoesNotExist
+from django.db import connections, router
+from django.db.models import Model as DjangoModel, QuerySet, prefetch_related_objects
+from django.db.models.constants import LOOKUP_SEP
+from django.core.exceptions import (
+    ObjectDoesNotExist,
+    FieldDoesNotExist,
+    ValidationError as DjangoValidationError,
+)
 
 from rest_framework.serializers import ModelSerializer, ListSerializer, IntegerField
 from rest_framework.exceptions import (
@@ -24,6 +30,9 @@ __all__ = ["BulkUpdateListSerializer", "ExtendedModelSerializer"]
 
 _logger = logging.getLogger(__name__)
 
+# more than one instance share the same key in the instance index
+_DUPLICATE_KEY = object()
+
 
 class BulkUpdateListSerializer(ValidationErrorCallbackMixin, ListSerializer):
     """
@@ -31,6 +40,11 @@ class BulkUpdateListSerializer(ValidationErrorCallbackMixin, ListSerializer):
     * override update() that is not support in ListSerializer,
     """
 
+    # write all the child forms in batches in update(), instead of saving one
+    # model instance at a time through the child serializer
+    BATCH_WRITE = False
+    BATCH_SIZE = 500
+
     class Meta:
         pass
 
@@ -48,6 +62,80 @@ class BulkUpdateListSerializer(ValidationErrorCallbackMixin, ListSerializer):
         ):  # validate only in bulk-update case
             self.validators.append(EditFormObjIdValidator())
         self.pk_field_name = self.child.pk_field_name
+        self._instance_index = (None, {})
+
+    def get_child_instance(self, pk_condition: dict):
+        """
+        return the instance matching `pk_condition` in current queryset, the
+        queryset is evaluated only once and indexed by the fields in the
+        condition, so validating N child forms no longer costs N queries.
+        Raise `DoesNotExist` or `ValueError` like `QuerySet.get()` does
+        """
+        qset = self.instance
+        condition = self._normalize_pk_condition(qset.model, pk_condition)
+        if condition is None:
+            # complex lookups e.g. `field__in`, `relation__field`, are not indexed
+            return qset.get(**pk_condition)
+        attnames = tuple(sorted(condition.keys()))
+        key = tuple(condition[a] for a in attnames)
+        try:
+            index = self._get_instance_index(qset, attnames)
+            obj = index.get(key, None)
+        except TypeError:  # unhashable value in the condition or instances
+            return qset.get(**pk_condition)
+        if obj is _DUPLICATE_KEY:
+            return qset.get(**pk_condition)  # let the queryset report the error
+        if obj is None:
+            errmsg = "%s matching query does not exist." % qset.model._meta.object_name
+            raise qset.model.DoesNotExist(errmsg)
+        return obj
+
+    def _get_instance_index(self, qset, attnames: tuple) -> dict:
+        if self._instance_index[0] is not qset:
+            # the instance is replaced, e.g. nested serializer set up for
+            # another parent form
+            self._instance_index = (qset, {})
+        indexes = self._instance_index[1]
+        if attnames not in indexes:
+            index = {}
+            for obj in qset:  # result cache of the queryset is reused
+                key = tuple(getattr(obj, a) for a in attnames)
+                index[key] = _DUPLICATE_KEY if key in index else obj
+            indexes[attnames] = index
+        return indexes[attnames]
+
+    def _normalize_pk_condition(self, model_cls, pk_condition):
+        # convert the condition to {attname: python value}, return None if
+        # any part of it cannot be indexed
+        out = {}
+        for name, value in pk_condition.items():
+            if LOOKUP_SEP in name:
+                return None
+            try:
+                field = (
+                    model_cls._meta.pk
+                    if name == "pk"
+                    else model_cls._meta.get_field(name)
+                )
+            except FieldDoesNotExist:
+                return None
+            if field.primary_key and isinstance(value, dict):
+                # compound primary key, the value consists of its columns
+                sub_condition = self._normalize_pk_condition(model_cls, value)
+                if sub_condition is None:
+                    return None
+                out.update(sub_condition)
+                continue
+            if not getattr(field, "concrete", False) or field.many_to_many:
+                return None
+            if isinstance(value, DjangoModel):
+                value = value.pk
+            try:  # same conversion and error message as `QuerySet.get()`
+                value = field.get_prep_value(value)
+            except DjangoValidationError as e:
+                raise ValueError(*e.messages) from e
+            out[field.attname] = value
+        return out
 
     @property
     def instance_ids(self):
@@ -107,29 +195,44 @@ class BulkUpdateListSerializer(ValidationErrorCallbackMixin, ListSerializer):
         ret = []
         try:
             with self.child.atomicity():
-                for pk, d in data_map.items():
-                    obj = instance_map.pop(pk, None)
-                    ret.append(self.child.update(obj, d))
-                if allow_delete and any(
-                    instance_map
-                ):  # check whether caller allows extra removal(s)
-                    for m in instance_map.values():
-                        del_kwargs = {}
-                        if isinstance(m, SoftDeleteObjectMixin):
-                            del_kwargs["hard"] = (
-                                True  # apply hard delete if it is soft-delete model
-                            )
-                        m.delete(**del_kwargs)
-                if allow_insert:  # check whether caller allows extra insertion(s)
-                    pk_field_name = self.child.pk_field_name
-                    data_map = self._insert_data_map(data=validated_data)
-                    new_added_list = []
-                    for d in data_map:
-                        ret.append(self.child.create(d))
-                        _pk = getattr(ret[-1], pk_field_name)
-                        new_added_list.append(_pk)
+                if self.BATCH_WRITE:
+                    ret = self._batch_update(
+                        instance_map,
+                        data_map,
+                        validated_data,
+                        allow_insert,
+                        allow_delete,
+                    )
+                    new_added_list = [
+                        getattr(m, self.child.pk_field_name)
+                        for m in ret[len(data_map) :]
+                    ]
                     if any(new_added_list):
                         log_msg += ["new_added_list", new_added_list]
+                else:
+                    for pk, d in data_map.items():
+                        obj = instance_map.pop(pk, None)
+                        ret.append(self.child.update(obj, d))
+                    if allow_delete and any(
+                        instance_map
+                    ):  # check whether caller allows extra removal(s)
+                        for m in instance_map.values():
+                            del_kwargs = {}
+                            if isinstance(m, SoftDeleteObjectMixin):
+                                del_kwargs["hard"] = (
+                                    True  # apply hard delete if it is soft-delete model
+                                )
+                            m.delete(**del_kwargs)
+                    if allow_insert:  # check whether caller allows extra insertion(s)
+                        pk_field_name = self.child.pk_field_name
+                        data_map = self._insert_data_map(data=validated_data)
+                        new_added_list = []
+                        for d in data_map:
+                            ret.append(self.child.create(d))
+                            _pk = getattr(ret[-1], pk_field_name)
+                            new_added_list.append(_pk)
+                        if any(new_added_list):
+                            log_msg += ["new_added_list", new_added_list]
             if any(log_msg):
                 log_msg += [
                     "srlz_cls_parent",
@@ -150,6 +253,129 @@ class BulkUpdateListSerializer(ValidationErrorCallbackMixin, ListSerializer):
             raise
         return ret
 
+    def _batch_update(
+        self, instance_map, data_map, validated_data, allow_insert, allow_delete
+    ):
+        """
+        write all the child forms in bounded number of statements :
+        - field changes of existing instances are saved by one `bulk_update()`
+          over union of the changed fields
+        - new instances are saved by `bulk_create()` only if their IDs are known
+          after insertion, either preassigned by the queryset (e.g. from ID gap
+          finder) or returned by the database, otherwise each of them is saved
+          by the child serializer
+        - discarded instances are hard-deleted by one filtered delete
+        - the child serializer writes nested data (e.g. m2m fields, nested
+          forms) only for the fields whose data actually changed
+        """
+        child = self.child
+        model_cls = child.Meta.model
+        manager = model_cls._default_manager
+        prefetch_lookups = child.get_batch_prefetch_lookups()
+        if prefetch_lookups and any(instance_map):
+            prefetch_related_objects(list(instance_map.values()), *prefetch_lookups)
+        ret, changed_objs, changed_fields, nested_writes = [], [], set(), []
+        for pk, d in data_map.items():
+            obj = instance_map.pop(pk, None)
+            values, nested_data = child.split_batch_data(d, instance=obj)
+            fields = self._assign_changed_fields(obj, values)
+            if any(fields):
+                changed_objs.append(obj)
+                changed_fields.update(fields)
+            nested_names = child.get_changed_nested_fields(obj, nested_data)
+            if any(nested_names):
+                nested_data = {k: nested_data.get(k) for k in nested_names}
+                nested_writes.append((obj, nested_data, False))
+            ret.append(obj)
+        if any(changed_objs):
+            # bulk_update() does not call Field.pre_save()
+            for field in model_cls._meta.concrete_fields:
+                if getattr(field, "auto_now", False):
+                    for obj in changed_objs:
+                        field.pre_save(obj, add=False)
+                    changed_fields.add(field.name)
+            manager.bulk_update(
+                changed_objs, fields=sorted(changed_fields), batch_size=self.BATCH_SIZE
+            )
+        if allow_delete and any(instance_map):
+            discarded = [m.pk for m in instance_map.values()]
+            model_cls._base_manager.filter(pk__in=discarded).delete()
+        if allow_insert and not self._batch_insert_supported(manager):
+            for d in self._insert_data_map(data=validated_data):
+                ret.append(child.create(d))
+        elif allow_insert:
+            new_objs = []
+            for d in self._insert_data_map(data=validated_data):
+                values, nested_data = child.split_batch_data(d, instance=None)
+                obj = model_cls(**values)
+                nested_data = {k: v for k, v in nested_data.items() if v}
+                if any(nested_data):
+                    nested_writes.append((obj, nested_data, True))
+                new_objs.append(obj)
+            if any(new_objs):
+                manager.bulk_create(new_objs, batch_size=self.BATCH_SIZE)
+            ret.extend(new_objs)
+        for obj, nested_data, created in nested_writes:
+            assert (
+                obj.pk is not None
+            ), "ID of new instance is required for writing its nested data"
+            child.write_nested_data(obj, nested_data, created=created)
+            # prefetched relations are outdated
+            getattr(obj, "_prefetched_objects_cache", {}).clear()
+        return ret
+
+    @staticmethod
+    def _batch_insert_supported(manager) -> bool:
+        qset_cls = type(manager.get_queryset())
+        if getattr(qset_cls, "BULK_CREATE_RESERVE_IDS", False):
+            return True
+        db_alias = router.db_for_write(manager.model)
+        return connections[db_alias].features.can_return_rows_from_bulk_insert
+
+    def _assign_changed_fields(self, obj, values: dict, assign=True) -> list:
+        # return names of the concrete fields whose value differs from the
+        # given data, the primary key and non-model fields are skipped
+        opts = obj._meta
+        out = []
+        for name, value in values.items():
+            try:
+                field = opts.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if not field.concrete or field.many_to_many or field.primary_key:
+                continue
+            new_value = value.pk if isinstance(value, DjangoModel) else value
+            if getattr(obj, field.attname) == new_value:
+                continue
+            if assign:
+                setattr(obj, name, value)
+            out.append(field.name)
+        return out
+
+    def _instance_changed(self, obj, data: dict) -> bool:
+        return any(self._assign_changed_fields(obj, data, assign=False))
+
+    def has_changes(self, instances, validated_data, allow_delete=True) -> bool:
+        """
+        check whether writing `validated_data` to existing `instances` would
+        insert, update, or delete (if `allow_delete` is set) any instance
+        """
+        model_cls = self.child.Meta.model
+        opts = model_cls._meta
+        pk_field = (
+            opts.pk
+            if self.pk_field_name == "pk"
+            else opts.get_field(self.pk_field_name)
+        )
+        remains = {getattr(m, pk_field.attname): m for m in instances}
+        for d in validated_data:
+            key = d.get(self.pk_field_name, None)
+            key = key.pk if isinstance(key, DjangoModel) else key
+            obj = remains.pop(key, None)
+            if obj is None or self._instance_changed(obj, d):
+                return True
+        return allow_delete and any(remains)
+
     def create(self, *args, **kwargs):
         log_msg = []
         srlz_cls_parent = "%s.%s" % (type(self).__module__, type(self).__qualname__)
@@ -224,7 +450,7 @@ class ExtendedModelSerializer(ModelSerializer, SerializerExcludeFieldsMixin):
             if not pk_condition:
                 pk_condition = {self.pk_field_name: data.get(self.pk_field_name, "")}
             try:
-                self.instance = self.parent.instance.get(**pk_condition)
+                self.instance = self.parent.get_child_instance(pk_condition)
             except (ObjectDoesNotExist, ValueError) as e:
                 srlz_cls_parent = "%s.%s" % (
                     type(self.parent).__module__,
@@ -275,6 +501,77 @@ class ExtendedModelSerializer(ModelSerializer, SerializerExcludeFieldsMixin):
     def extra_setup_before_validation(self, instance, data):
         pass
 
+    def split_batch_data(self, validated_data, instance=None):
+        """
+        split validated data of a form into concrete field values, which are
+        written in batch by the list serializer, and the rest (e.g. m2m fields,
+        nested forms) which is written by `write_nested_data()`. Subclasses can
+        augment or discard fields at here like what they do in create() / update()
+        """
+        opts = self.Meta.model._meta
+        names = set()
+        for field in opts.concrete_fields:
+            names.update([field.name, field.attname])
+        values, nested_data = {}, {}
+        for k, v in validated_data.items():
+            dst = values if k in names else nested_data
+            dst[k] = v
+        return values, nested_data
+
+    def get_batch_prefetch_lookups(self) -> list:
+        """
+        relations prefetched for the instances before batch update, in order to
+        find out changed nested data without extra query for each instance
+        """
+        opts = self.Meta.model._meta
+        out = []
+        for name, field in self.fields.items():
+            if field.read_only:
+                continue
+            try:
+                model_field = opts.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if model_field.many_to_many:
+                out.append(name)
+        return out
+
+    def get_changed_nested_fields(self, instance, nested_data: dict) -> list:
+        """
+        return names of nested fields whose data differs from current state of
+        `instance`, m2m fields are compared with current related objects, the
+        other nested data is considered as changed if it is not empty.
+        """
+        opts = self.Meta.model._meta
+        out = []
+        for name, value in nested_data.items():
+            try:
+                model_field = opts.get_field(name)
+            except FieldDoesNotExist:
+                model_field = None
+            if model_field and model_field.many_to_many:
+                current = {obj.pk for obj in getattr(instance, name).all()}
+                value = {v.pk if isinstance(v, DjangoModel) else v for v in value}
+                if current != value:
+                    out.append(name)
+            elif value:
+                out.append(name)
+        return out
+
+    def write_nested_data(self, instance, nested_data: dict, created=False):
+        """
+        write nested data of an instance saved in batch, by default only m2m
+        fields are written, subclasses should handle the other nested fields
+        """
+        opts = self.Meta.model._meta
+        for name, value in nested_data.items():
+            try:
+                model_field = opts.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if model_field.many_to_many:
+                getattr(instance, name).set(value or [])
+
     @property
     def _readable_fields(self):  # override same method in parent Serializer
         self.exclude_read_fields()
@@ -329,6 +626,7 @@ class DjangoBaseClosureBulkSerializer(BulkUpdateListSerializer, ClosureTableMixi
         ret = None
         with self.child.atomicity():
             self.clean_dup_update_paths()
+            self.apply_edit_paths_diff()
             ret = super().update(instance=instance, validated_data=validated_data)
             # end of group bulk update
         return ret
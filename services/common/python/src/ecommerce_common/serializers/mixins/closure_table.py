@@ -1,5 +1,12 @@
 import logging
-from collections import OrderedDict
+from collections import OrderedDict, deque
+
+from django.db.models import Q
+from rest_framework.exceptions import (
+    ValidationError as RestValidationError,
+    ErrorDetail as RestErrorDetail,
+)
+from rest_framework.settings import api_settings
 
 from ecommerce_common.util.graph import path_exists
 from ecommerce_common.validators import (
@@ -22,6 +29,9 @@ class ClosureTableMixin:
     DEPTH_FIELD_NAME = None
     ANCESTOR_FIELD_NAME = None
     DESCENDANT_FIELD_NAME = None
+    # estimate the paths to delete / insert for all moved subtrees at once, or
+    # reuse existing path objects of each edit tree in dependency order
+    EDIT_PATHS_SET_BASED = True
 
     @property
     def is_create(self):
@@ -53,6 +63,10 @@ class ClosureTableMixin:
         loop_node_list = ", ".join(loop_node_list)
         return err_msg.format(loop_forms=loop_node_list)
 
+    def _loop_validation_error(self, err_msg):
+        _detail = {api_settings.NON_FIELD_ERRORS_KEY: RestErrorDetail(err_msg)}
+        return RestValidationError(detail=_detail)
+
     # TODO: explain what's new_parent in comment
     def prepare_cycle_detection_validators(self, forms):
         """
@@ -110,58 +124,83 @@ class ClosureTableMixin:
         return vobj
 
     def get_sorted_insertion_forms(self, forms):
-        """reorder the forms in case there are dependencies among the newly added forms"""
+        """
+        reorder the forms in case there are dependencies among the newly added forms,
+        by topological sort (Kahn's algorithm) over the `new_parent` references, so
+        each form is placed after the form of its parent
+        """
         if hasattr(self, "_sorted_insertion_forms"):
             return self._sorted_insertion_forms
         self._saved_nodes = []  # TODO: delete at the end of creation operations
-        insert_after = {}
         insert_after_log = []
-        seq_to_sorted_log = []
-        unsorted_forms = []
-        sorted_forms = []
-        for idx in range(len(forms)):
-            form = forms[idx]
+        parent_idx_map = {}
+        children = [[] for _ in range(len(forms))]
+        ready = deque()
+        exist_parent_ids = set()
+        for idx, form in enumerate(forms):
             exist_parent = self._get_field_data(form, "exist_parent", default="")
             new_parent = self._get_field_data(form, "new_parent", default="")
-            self._set_field_data(form=form, key="_sort_idx", val=idx)
             if exist_parent in self.EMPTY_VALUES:
                 if new_parent in self.EMPTY_VALUES:
-                    sorted_forms.append(form)
-                else:  # record the position the current form should be in sorted list
-                    key = idx
-                    unsorted_forms.append(form)
-                    insert_after[key] = forms[int(new_parent)]
-                    insert_after_log.append((key, int(new_parent)))
+                    ready.append(idx)
+                else:  # current form has to be placed after its parent form
+                    parent_idx_map[idx] = int(new_parent)
+                    children[int(new_parent)].append(idx)
+                    insert_after_log.append((idx, int(new_parent)))
             else:
-                sorted_forms.append(form)
-        while (
-            len(sorted_forms) < len(forms) and not unsorted_forms in self.EMPTY_VALUES
-        ):
-            for form in unsorted_forms:
-                key = self._get_field_data(form=form, key="_sort_idx")
-                try:
-                    new_parent = sorted_forms.index(insert_after[key])
-                    seq_to_sorted_log.append((key, new_parent))
-                    self._set_field_data(form, "new_parent", new_parent)
-                    sorted_forms.append(form)
-                    unsorted_forms.remove(form)
-                except ValueError as e:
-                    # skip if parent form required hasn't been added yet to the sorted list.
-                    seq_to_sorted_log.append((key, -1))
-        for form in sorted_forms:
-            self._get_field_data(form=form, key="_sort_idx", remove_after_read=True)
-        # import pdb
-        # pdb.set_trace()
+                exist_parent_ids.add(exist_parent)
+                ready.append(idx)
+        sorted_forms = []
+        seq_to_sorted = {}
+        while ready:
+            idx = ready.popleft()
+            form = forms[idx]
+            if idx in parent_idx_map:
+                new_parent = seq_to_sorted[parent_idx_map[idx]]
+                self._set_field_data(form, "new_parent", new_parent)
+            seq_to_sorted[idx] = len(sorted_forms)
+            sorted_forms.append(form)
+            ready.extend(children[idx])
+        if len(sorted_forms) != len(forms):
+            unsorted = [idx for idx in range(len(forms)) if idx not in seq_to_sorted]
+            log_msg = ["unsorted_forms", unsorted, "insert_after", insert_after_log]
+            _logger.warning(None, *log_msg)
+            raise self._loop_validation_error(self._loopdetect_errmsg(unsorted))
+        self._insertion_paths = self._load_insertion_paths(exist_parent_ids)
         self._sorted_insertion_forms = sorted_forms
         log_msg = [
             "insert_after",
             insert_after_log,
             "seq_to_sorted_log",
-            seq_to_sorted_log,
+            list(seq_to_sorted.items()),
         ]
         _logger.debug(None, *log_msg)
         return sorted_forms
 
+    def _load_insertion_paths(self, node_ids) -> dict:
+        """
+        fetch ancestors of all the given existing nodes in one query, return dict
+        which maps each node ID to list of `(ancestor, depth)` , including the
+        node itself at depth 0
+        """
+        out = {}
+        if not node_ids:
+            return out
+        conditions = {"{d}__in".format(d=self.DESCENDANT_FIELD_NAME): node_ids}
+        qset = self.CLOSURE_MODEL_CLS.objects.filter(**conditions).select_related(
+            self.ANCESTOR_FIELD_NAME
+        )
+        desc_id_attname = self.CLOSURE_MODEL_CLS._meta.get_field(
+            self.DESCENDANT_FIELD_NAME
+        ).attname
+        for a in qset:
+            item = (
+                getattr(a, self.ANCESTOR_FIELD_NAME),
+                getattr(a, self.DEPTH_FIELD_NAME),
+            )
+            out.setdefault(str(getattr(a, desc_id_attname)), []).append(item)
+        return out
+
     def _get_insertion_parent_id(self, exist_parent="", new_parent=""):
         parent_id = ""
         if exist_parent in self.EMPTY_VALUES:
@@ -180,13 +219,6 @@ class ClosureTableMixin:
         if leaf_node is None or self.get_node_ID(leaf_node) is None:
             raise ValueError("leaf_node must be saved before calling this function")
         self._saved_nodes.append(leaf_node)
-        out = [
-            {
-                self.ANCESTOR_FIELD_NAME: leaf_node,
-                self.DESCENDANT_FIELD_NAME: leaf_node,
-                self.DEPTH_FIELD_NAME: 0,
-            }
-        ]
         parent_id = self._get_insertion_parent_id(
             exist_parent=exist_parent, new_parent=new_parent
         )
@@ -199,22 +231,38 @@ class ClosureTableMixin:
             parent_id,
         ]
         _logger.debug(None, *log_msg)
+        # paths of the parent are either loaded in advance (existing parent),
+        # or already estimated when the parent node was inserted (new parent)
+        insertion_paths = getattr(self, "_insertion_paths", None)
+        if insertion_paths is None:
+            insertion_paths = self._insertion_paths = {}
+        ancestors = []
         if not parent_id in self.EMPTY_VALUES:
-            node_cls = type(
-                leaf_node
-            )  # the node_cls must have related field `ancestors`
-            ancestors = node_cls.objects.get(
-                pk=parent_id
-            ).ancestors.all()  # TODO refactor
-            path_objs = [
-                {
-                    self.DEPTH_FIELD_NAME: (a.depth + 1),
-                    self.ANCESTOR_FIELD_NAME: a.ancestor,
-                    self.DESCENDANT_FIELD_NAME: leaf_node,
-                }
-                for a in ancestors
-            ]
-            out += path_objs
+            ancestors = insertion_paths.get(str(parent_id))
+            if ancestors is None:
+                node_cls = type(
+                    leaf_node
+                )  # the node_cls must have related field `ancestors`
+                qset = node_cls.objects.get(pk=parent_id).ancestors.select_related(
+                    self.ANCESTOR_FIELD_NAME
+                )
+                ancestors = [
+                    (
+                        getattr(a, self.ANCESTOR_FIELD_NAME),
+                        getattr(a, self.DEPTH_FIELD_NAME),
+                    )
+                    for a in qset
+                ]
+        leaf_paths = [(leaf_node, 0)] + [(a, depth + 1) for a, depth in ancestors]
+        insertion_paths[str(self.get_node_ID(leaf_node))] = leaf_paths
+        out = [
+            {
+                self.ANCESTOR_FIELD_NAME: a,
+                self.DESCENDANT_FIELD_NAME: leaf_node,
+                self.DEPTH_FIELD_NAME: depth,
+            }
+            for a, depth in leaf_paths
+        ]
         return out
 
     def _init_edit_tree(self, forms, instances):
@@ -756,6 +804,13 @@ class ClosureTableMixin:
 
     def get_sorted_update_forms(self, forms, instances):
         if not hasattr(self, "_sorted_update_forms"):
+            if self.EDIT_PATHS_SET_BASED:
+                moves = self._load_edit_moves(forms=forms)
+                if any(moves):
+                    self._construct_edit_paths_diff(moves=moves)
+                # the diff does not depend on order of the edit trees
+                self._sorted_update_forms = list(forms)
+                return self._sorted_update_forms
             # check whether parent is modified.
             edit_trees = self._init_edit_tree(forms=forms, instances=instances)
             if any(edit_trees):
@@ -783,6 +838,147 @@ class ClosureTableMixin:
 
     #### end of get_sorted_update_forms
 
+    def _load_edit_moves(self, forms) -> dict:
+        """
+        return the nodes whose parent will be changed, as dict which maps ID of
+        each node to ID of its new parent (empty string means root)
+        """
+        new_parents = {}
+        for form in forms:
+            _id = self._get_field_data(form=form, key="id")
+            _exist_parent = self._get_field_data(
+                form=form, key="exist_parent", default=""
+            )
+            new_parents[str(_id)] = (
+                "" if _exist_parent in self.EMPTY_VALUES else str(_exist_parent)
+            )
+        conditions = {
+            "{d}__in".format(d=self.DESCENDANT_FIELD_NAME): list(new_parents.keys()),
+            self.DEPTH_FIELD_NAME: 1,
+        }
+        qset = self.CLOSURE_MODEL_CLS.objects.filter(**conditions).values_list(
+            self.DESCENDANT_FIELD_NAME, self.ANCESTOR_FIELD_NAME
+        )
+        old_parents = {str(d): str(a) for d, a in qset}
+        moves = {k: v for k, v in new_parents.items() if v != old_parents.get(k, "")}
+        log_msg = ["old_parents", old_parents, "moves", moves]
+        _logger.debug(None, *log_msg)
+        return moves
+
+    def _construct_edit_paths_diff(self, moves: dict):
+        """
+        estimate the closure paths to delete and to insert for all the moved
+        subtrees, from one fetch of the paths of all affected descendants and
+        new parents. The paths of the nodes outside the moved subtrees are
+        never changed.
+        """
+        moved_ids = list(moves.keys())
+        new_parent_ids = [v for v in moves.values() if v]
+        closure_qset = self.CLOSURE_MODEL_CLS.objects
+        affected_descs = closure_qset.filter(
+            **{"{a}__in".format(a=self.ANCESTOR_FIELD_NAME): moved_ids}
+        ).values(self.DESCENDANT_FIELD_NAME)
+        desc_in_field = "{d}__in".format(d=self.DESCENDANT_FIELD_NAME)
+        condition = Q(**{desc_in_field: affected_descs}) | Q(
+            **{desc_in_field: new_parent_ids}
+        )
+        qset = closure_qset.filter(condition).values_list(
+            self.PK_FIELD_NAME,
+            self.ANCESTOR_FIELD_NAME,
+            self.DESCENDANT_FIELD_NAME,
+            self.DEPTH_FIELD_NAME,
+        )
+        # descendant ID -> {ancestor ID: (depth, path ID)}
+        old_paths = {}
+        for path_id, asc_id, desc_id, depth in qset:
+            old_paths.setdefault(str(desc_id), {})[str(asc_id)] = (depth, path_id)
+        moved_ids = set(moved_ids)
+        affected = set(
+            d for d, ascs in old_paths.items() if not moved_ids.isdisjoint(ascs)
+        )
+        parents = {}
+        for d in affected:
+            if d in moves:
+                parents[d] = moves[d]
+            else:  # the parent is also in the affected set
+                ascs = old_paths[d].items()
+                parents[d] = next(a for a, (depth, _) in ascs if depth == 1)
+        # descendant ID -> {ancestor ID: depth} after the edit
+        new_paths = {
+            p: {a: depth for a, (depth, _) in old_paths[p].items()}
+            for p in new_parent_ids
+            if p not in affected
+        }
+        for d in affected:
+            chain = []
+            node = d
+            while node and node not in new_paths:
+                if node in chain:
+                    loop_nodes = chain[chain.index(node) :]
+                    log_msg = ["moves", moves, "loop_nodes", loop_nodes]
+                    _logger.warning(None, *log_msg)
+                    err_msg = "nodes ({}) will form a loop, which is NOT allowed in closure table"
+                    err_msg = err_msg.format(", ".join(loop_nodes))
+                    raise self._loop_validation_error(err_msg)
+                chain.append(node)
+                node = parents[node]
+            base = new_paths[node] if node else {}
+            for node in reversed(chain):
+                path = {a: depth + 1 for a, depth in base.items()}
+                path[node] = 0
+                new_paths[node] = base = path
+        delete_path_ids = []
+        create_paths = []
+        for d in affected:
+            old_ascs, new_ascs = old_paths[d], new_paths[d]
+            for a, (depth, path_id) in old_ascs.items():
+                if new_ascs.get(a) != depth:
+                    delete_path_ids.append(path_id)
+            for a, depth in new_ascs.items():
+                if old_ascs.get(a, (None,))[0] != depth:
+                    create_paths.append((a, d, depth))
+        self._edit_paths_diff = {"delete": delete_path_ids, "create": create_paths}
+        log_msg = [
+            "moves",
+            moves,
+            "num_affected",
+            len(affected),
+            "delete_paths",
+            delete_path_ids,
+            "create_paths",
+            create_paths,
+        ]
+        _logger.debug(None, *log_msg)
+
+    def apply_edit_paths_diff(self):
+        """
+        delete the stale paths in one statement first, in order not to violate
+        unique constraint on (ancestor, descendant), then insert the new paths
+        """
+        if not hasattr(self, "_edit_paths_diff"):
+            return
+        diff = self._edit_paths_diff
+        delattr(self, "_edit_paths_diff")
+        model_cls = self.CLOSURE_MODEL_CLS
+        if diff["delete"]:
+            # hard-delete through base manager, bypass soft-delete queryset
+            conditions = {"{p}__in".format(p=self.PK_FIELD_NAME): diff["delete"]}
+            model_cls._base_manager.filter(**conditions).delete()
+        asc_attname = model_cls._meta.get_field(self.ANCESTOR_FIELD_NAME).attname
+        desc_attname = model_cls._meta.get_field(self.DESCENDANT_FIELD_NAME).attname
+        new_objs = [
+            model_cls(**{asc_attname: a, desc_attname: d, self.DEPTH_FIELD_NAME: depth})
+            for a, d, depth in diff["create"]
+        ]
+        model_cls.objects.bulk_create(new_objs)
+        log_msg = [
+            "num_deleted_paths",
+            len(diff["delete"]),
+            "num_created_paths",
+            len(new_objs),
+        ]
+        _logger.info(None, *log_msg)
+
     def _chk_duplicate_paths(
         self, obj_list, tag="update", clear=False, log_collector=None
     ):
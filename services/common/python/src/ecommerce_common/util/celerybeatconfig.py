@@ -40,6 +40,18 @@ beat_schedule = {
         #'schedule':30,
         "kwargs": {"days": 6},
     },
+    "softdelete-retention-usermgt": {
+        "task": "user_management.async_tasks.purge_softdeleted_data",
+        "options": {"queue": "usermgt_default"},
+        "schedule": crontab(hour=3, minute=30, day_of_week="sun"),
+        "kwargs": {"days": 90, "batch_size": 100, "max_batches": 20, "archive": True},
+    },
+    "softdelete-retention-product": {
+        "task": "product.async_tasks.purge_softdeleted_data",
+        "options": {"queue": "productmgt_default"},
+        "schedule": crontab(hour=3, minute=45, day_of_week="sun"),
+        "kwargs": {"days": 90, "batch_size": 100, "max_batches": 20, "archive": True},
+    },
     "rotate-auth-keystores": {
         "task": "user_management.async_tasks.rotate_keystores",
         "options": {"queue": "usermgt_default"},
@@ -1,87 +1,89 @@
-def depth_first_search(
-    graph: dict, node, visited: dict, parent: int, is_directed, options
-):
-    """DFS algorithm for undirected graph"""
-    # DFS visits each node N if it hasn't been visited,
-    # then recursively further visit all other node N_x connected with node N
-    # until all nodes are visited.
-    visited[node] = True
-    # print( "".join(["[visit edge] : (", str(parent), ",", str(node), ")"]))
-    options["node_visited"].append(node)
+from typing import Optional
 
-    def _visit_fn(adj):
-        if not visited[adj]:
-            depth_first_search(graph, adj, visited, node, is_directed, options)
-        elif adj != parent:
-            options["has_cycle"] = True
+# colours of nodes in depth-first search
+_WHITE, _GREY, _BLACK = 0, 1, 2
+_NO_MORE_ADJ = object()
 
-    tuple(map(_visit_fn, graph[node]["outbound"]))
-    if not is_directed:
-        tuple(map(_visit_fn, graph[node]["inbound"]))
+
+def _adjacent_nodes(graph: dict, node, is_directed: bool):
+    edges = graph[node]
+    if is_directed:
+        return iter(edges["outbound"])
+    # in undirected graph, each edge is visited from both of its ends
+    return iter([*edges["outbound"], *edges["inbound"]])
+
+
+def find_cycle(graph: dict, is_directed: bool = True) -> Optional[list]:
+    """
+    iterative DFS with three-colour marking, which runs in O(V+E) time and
+    does not rely on Python call stack.
+    Return node list `[N0, N1, ... Nx]` of the first cycle found, which
+    means the edges N0 --> N1 --> ... --> Nx --> N0 exist, or `None` if the
+    graph is acyclic.
+    """
+    colour = {k: _WHITE for k in graph.keys()}
+    for root in graph.keys():
+        if colour[root] != _WHITE:
+            continue
+        colour[root] = _GREY
+        # each frame in the stack consists of node, iterator of adjacent nodes,
+        # parent node, and whether the edge back to the parent has been skipped
+        # (undirected graph only)
+        path = [root]
+        path_idx = {root: 0}
+        stack = [[root, _adjacent_nodes(graph, root, is_directed), None, False]]
+        while stack:
+            frame = stack[-1]
+            node, adjs = frame[0], frame[1]
+            adj = next(adjs, _NO_MORE_ADJ)
+            if adj is _NO_MORE_ADJ:
+                # run out of adjacent nodes, finish current node
+                colour[node] = _BLACK
+                stack.pop()
+                path.pop()
+                path_idx.pop(node)
+                continue
+            if not is_directed and adj == frame[2] and not frame[3]:
+                frame[3] = True  # the edge back to parent, skip it once
+                continue
+            adj_colour = colour[adj]
+            if adj_colour == _GREY:
+                return path[path_idx[adj] :]
+            elif adj_colour == _WHITE:
+                colour[adj] = _GREY
+                path_idx[adj] = len(path)
+                path.append(adj)
+                adjs = _adjacent_nodes(graph, adj, is_directed)
+                stack.append([adj, adjs, node, False])
+            # black node, all paths starting from it have been explored
+    return None
 
 
 def is_graph_cyclic(graph: dict, is_directed=False):
-    result = False
-    loop_start_node = None
-    visited = {k: False for k in graph.keys()}
-    subgraph = {"has_cycle": False, "node_visited": []}
-    # In case we get a graph including multiple disconnected subgraphs,
-    # loop through all subgraphs & check any unvisited node
-    while True:
-        node_id = list(visited.keys())[0]
-        # treated as undirected graph, because I need to visit all nodes of the subgraphs
-        depth_first_search(
-            graph=graph,
-            node=node_id,
-            visited=visited,
-            parent=-1,
-            is_directed=False,
-            options=subgraph,
-        )
-        if subgraph["has_cycle"]:
-            result = True
-            loop_start_node = subgraph["node_visited"]
-            break
-        if False in visited.values():
-            # move the nodes which haven't been visited yet to beginning of the list, run DFS again in next iteration.
-            visited = {
-                k: v for k, v in sorted(visited.items(), key=lambda item: item[1])
-            }
-            subgraph["node_visited"].clear()
-        else:
-            break
-    if result is True and is_directed is True:
-        node_start = loop_start_node[0]
-        result = path_exists(
-            graph=graph, node_src=node_start, node_dst=node_start, is_directed=True
-        )
-        if result is False:
-            loop_start_node = None
-    return result, loop_start_node
+    loop_node_list = find_cycle(graph=graph, is_directed=is_directed)
+    return loop_node_list is not None, loop_node_list
 
 
-# end of is_graph_cyclic()
+def iter_reachable_nodes(graph: dict, node_src, is_directed: bool = True):
+    """
+    iterative DFS, yield all the nodes which can be visited from `node_src`,
+    including `node_src` itself
+    """
+    visited = {node_src}
+    stack = [node_src]
+    while stack:
+        node = stack.pop()
+        yield node
+        for adj in _adjacent_nodes(graph, node, is_directed):
+            if adj not in visited:
+                visited.add(adj)
+                stack.append(adj)
 
 
 def path_exists(graph: dict, node_src, node_dst, is_directed: bool = True):
     assert (
         node_src is not None and node_dst is not None
     ), "both of node_src and node_dst have to be non-null value"
-    visited = {k: False for k in graph.keys()}
-    subgraph = {"has_cycle": False, "node_visited": []}
-    node_id = node_src
-    depth_first_search(
-        graph=graph,
-        node=node_id,
-        visited=visited,
-        parent=-1,
-        is_directed=is_directed,
-        options=subgraph,
-    )
     # path exists while both of the nodes can be visited in any subgraph of the given input graph
-    result = visited[node_src] and visited[node_dst]
-    return result
-
-
-#### while bool(visited):
-#### visited = {key:status for key, status in visited.items() if not status}
+    reachable = iter_reachable_nodes(graph, node_src, is_directed=is_directed)
+    return any(node == node_dst for node in reachable)
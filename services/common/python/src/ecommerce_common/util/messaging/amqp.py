@@ -1,5 +1,8 @@
+import os
 import socket
 import logging
+import threading
+from collections import deque
 from functools import partial
 from contextlib import contextmanager
 from typing import Optional
@@ -68,6 +71,120 @@ def get_producer(conn, block=False, on_return=None):
     # producer = kombu.Producer(channel=conn_from_pool.default_channel)
 
 
+class ProducerPool:
+    """
+    Long-lived producers for publishing messages, each producer works with its
+    own connection which is kept open and reused by subsequent publish operations,
+    so a hot publishing path does not set up any connection.
+    A producer is discarded (and its connection closed) once any error happens
+    while it is in use, next acquisition will establish new connection.
+    """
+
+    def __init__(
+        self,
+        amqp_uri: str,
+        ssl=None,
+        transport_options: Optional[dict] = None,
+        limit: Optional[int] = None,
+    ):
+        self._amqp_uri = amqp_uri
+        self._ssl = ssl
+        self._transport_options = AMQP_DEFAULT_TRANSPORT_OPTIONS.copy()
+        if transport_options:
+            self._transport_options.update(transport_options)
+        self._limit = limit
+        self._lock = threading.Lock()
+        self._idle = deque()
+
+    def _create_connection(self) -> kombu.Connection:
+        return kombu.Connection(
+            self._amqp_uri, ssl=self._ssl, transport_options=self._transport_options
+        )
+
+    def _create_producer(self) -> KombuProducer:
+        # channel is opened lazily on first use
+        return KombuProducer(self._create_connection())
+
+    def _discard(self, producer):
+        try:
+            producer.connection.release()
+        except Exception as e:
+            log_args = ["action", "discard-producer", "msg", str(e.args)]
+            _logger.warning(None, *log_args)
+
+    @contextmanager
+    def acquire(self):
+        with self._lock:
+            producer = self._idle.pop() if self._idle else None
+        if producer is None:
+            producer = self._create_producer()
+        try:
+            yield producer
+        except BaseException:
+            self._discard(producer)
+            raise
+        with self._lock:
+            if self._limit is None or len(self._idle) < self._limit:
+                self._idle.append(producer)
+                producer = None
+        if producer:
+            self._discard(producer)
+
+    def clear(self):
+        with self._lock:
+            discarding = list(self._idle)
+            self._idle.clear()
+        for producer in discarding:
+            self._discard(producer)
+
+    def __len__(self):
+        return len(self._idle)
+
+
+## end of class ProducerPool
+
+
+_producer_pools = {}
+_producer_pools_lock = threading.Lock()
+
+
+def get_producer_pool(
+    amqp_uri: str, ssl=None, transport_options: Optional[dict] = None
+) -> ProducerPool:
+    """return the producer pool shared by all publishers with the same setup"""
+    key = (amqp_uri, repr(ssl), repr(sorted((transport_options or {}).items())))
+    pool = _producer_pools.get(key)
+    if pool is None:
+        with _producer_pools_lock:
+            pool = _producer_pools.get(key)
+            if pool is None:
+                pool = ProducerPool(
+                    amqp_uri, ssl=ssl, transport_options=transport_options
+                )
+                _producer_pools[key] = pool
+    return pool
+
+
+def clear_producer_pools():
+    with _producer_pools_lock:
+        pools = list(_producer_pools.values())
+        _producer_pools.clear()
+    for pool in pools:
+        pool.clear()
+
+
+def _reset_producer_pools_after_fork():
+    # connections inherited from parent process must not be used in child
+    # process, simply forget them without closing.
+    global _producer_pools_lock
+    _producer_pools.clear()
+    _producer_pools_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_producer_pools_after_fork)
+
+
 class AMQPPublisher:
     """
     Utility helper for publishing messages to RabbitMQ.
@@ -164,9 +281,13 @@ class AMQPPublisher:
         self.publish_kwargs = publish_kwargs
 
     @log_fn_wrapper(logger=_logger, loglevel=logging.INFO)
-    def publish(self, payload, exchange, routing_key, conn=None, **kwargs):
+    def publish(
+        self, payload, exchange, routing_key, conn=None, producer=None, **kwargs
+    ):
         """
         Note :
+        The message is published by the given long-lived `producer` (e.g. from
+        `ProducerPool`), or the producer acquired from the connection pool.
         RabbitMQ doesn't seem reliable on mandatory flag, so Kombu producer will
         receive basic.return payload ONLY in every other publish operation, which
         is problematic.
@@ -195,35 +316,34 @@ class AMQPPublisher:
         declare.extend(kwargs.pop("declare", ()))
         publish_kwargs.update(kwargs)  # remaining publish-time kwargs win
 
+        publish_kwargs.update(
+            {
+                "body": payload,
+                "exchange": exchange,
+                "routing_key": routing_key,
+                "headers": headers,
+                "delivery_mode": delivery_mode,
+                "mandatory": mandatory,
+                # immediate=immediate, # RabbitMQ <= 3.2.4 doesn't support this
+                "priority": priority,
+                "expiration": expiration,
+                "compression": compression,
+                "declare": declare,
+                "retry": retry,
+                "retry_policy": retry_policy,
+                "serializer": serializer,
+            }
+        )
         result = None
         try:
-            _get_conn_kwargs = {
-                "conn": conn,
-                "block": False,
-                "timeout": 2.0,
-                "transport_options": transport_options,
-            }
-            if conn is None:
-                _get_conn_kwargs.update({"amqp_uri": self.amqp_uri, "ssl": self.ssl})
-            with get_connection(**_get_conn_kwargs) as conn_from_pool:
-                with get_producer(conn=conn_from_pool, block=False) as producer:
-                    result = producer.publish(
-                        body=payload,
-                        exchange=exchange,
-                        routing_key=routing_key,
-                        headers=headers,
-                        delivery_mode=delivery_mode,
-                        mandatory=mandatory,
-                        # immediate=immediate, # RabbitMQ <= 3.2.4 doesn't support this
-                        priority=priority,
-                        expiration=expiration,
-                        compression=compression,
-                        declare=declare,
-                        retry=retry,
-                        retry_policy=retry_policy,
-                        serializer=serializer,
-                        **publish_kwargs  # properties
-                    )
+            if producer is not None:
+                result = producer.publish(**publish_kwargs)
+            else:
+                result = self._publish_from_pool(
+                    conn=conn,
+                    transport_options=transport_options,
+                    publish_kwargs=publish_kwargs,
+                )
         except ChannelError as exc:
             if "NO_ROUTE" in str(exc):
                 raise UndeliverableMessage(
@@ -232,6 +352,19 @@ class AMQPPublisher:
             raise
         return result
 
+    def _publish_from_pool(self, conn, transport_options, publish_kwargs):
+        _get_conn_kwargs = {
+            "conn": conn,
+            "block": False,
+            "timeout": 2.0,
+            "transport_options": transport_options,
+        }
+        if conn is None:
+            _get_conn_kwargs.update({"amqp_uri": self.amqp_uri, "ssl": self.ssl})
+        with get_connection(**_get_conn_kwargs) as conn_from_pool:
+            with get_producer(conn=conn_from_pool, block=False) as producer:
+                return producer.publish(**publish_kwargs)
+
     # def on_return(self, *args, **kwargs):
     #    err = args[0]
 
@@ -32,6 +32,8 @@ RPC_EXCHANGE_DEFAULT_TYPE = amqp_exchange_type.DIRECT.value
 RPC_EXCHANGE_DEFAULT_NAME = "rpc-default-allapps"
 
 RPC_ROUTE_KEY_PATTERN_SEND = "rpc.%s.%s"
+# remote task which runs several packed method invocations in one go
+RPC_BATCH_METHOD_NAME = "batch_dispatch"
 
 
 class amqp_delivery_mode(Enum):
@@ -1,12 +1,24 @@
-import os, uuid, socket, logging
+import os, uuid, socket, logging, asyncio, threading
+from concurrent.futures import Future as ConcurrentFuture, wait as futures_wait
 from datetime import datetime, timedelta, UTC
-from typing import Dict, Optional
+from functools import partial
+from typing import Dict, List, Optional
 from amqp.exceptions import ConsumerCancelled, NotFound as AmqpNotFound
-from kombu import Exchange as KombuExchange, Queue as KombuQueue
+from kombu import (
+    Consumer as KombuConsumer,
+    Exchange as KombuExchange,
+    Queue as KombuQueue,
+)
 from kombu.exceptions import OperationalError as KombuOperationalError
 
 from ecommerce_common.util import _get_amqp_url
-from .amqp import AMQPPublisher, AMQPQueueConsumer, get_connection, UndeliverableMessage
+from .amqp import (
+    AMQPPublisher,
+    AMQPQueueConsumer,
+    ProviderCollector,
+    get_producer_pool,
+    UndeliverableMessage,
+)
 from .constants import (
     MSG_PAYLOAD_DEFAULT_CONTENT_TYPE,
     AMQP_SSL_CONFIG_KEY,
@@ -17,6 +29,7 @@ from .constants import (
     RPC_EXCHANGE_DEFAULT_NAME,
     RPC_EXCHANGE_DEFAULT_TYPE,
     RPC_ROUTE_KEY_PATTERN_SEND,
+    RPC_BATCH_METHOD_NAME,
 )
 
 ROUTE_KEY_PATTERN_REPLYTO = "rpc.reply.%s.%s"
@@ -39,6 +52,7 @@ class ReplyListener:
     # needs to scale, different consumers with different broker setups will
     # be required (TODO)
     queue_consumer: Optional[AMQPQueueConsumer] = None
+    queue_consumer_cls = AMQPQueueConsumer
 
     def __init__(
         self,
@@ -49,7 +63,7 @@ class ReplyListener:
     ):
         cls = type(self)
         if cls._num_objs_created == 0:
-            cls.queue_consumer = AMQPQueueConsumer(amqp_uri=broker_url)
+            cls.queue_consumer = cls.queue_consumer_cls(amqp_uri=broker_url)
         cls._num_objs_created += 1  # TODO, lock required in async tasks
         self._reply_events = {}
         self._id = "{0}:{1}".format(dst_app_label, src_app_label)
@@ -152,7 +166,7 @@ class ReplyListener:
         reply_event = self._reply_events.get(correlation_id, None)
         if reply_event is not None:
             reply_event.send(body=body)
-            if reply_event.finished:
+            if reply_event.resolved:
                 self._reply_events.pop(correlation_id, None)
         else:
             log_args = [
@@ -254,6 +268,12 @@ class RpcReplyEvent:
     def finished(self):
         return self.resp_body["status"] in self.valid_finish_status
 
+    @property
+    def resolved(self) -> bool:
+        # the event no longer accepts any message after invalid status transition
+        invalid = self.status_opt.INVALID_STATUS_TRANSITION
+        return self.finished or self.resp_body["status"] == invalid
+
     @property
     def timeout(self):
         time_now = datetime.now(UTC)
@@ -263,27 +283,273 @@ class RpcReplyEvent:
 # end of class RpcReplyEvent
 
 
+class ReplyDispatcher(AMQPQueueConsumer):
+    """
+    Reply consumer which keeps subscribing to the reply queues of all registered
+    listeners in one background daemon thread, received messages are handed over
+    to the listeners as soon as they arrive, application callers no longer take
+    turn to run consumer code.
+    """
+
+    def __init__(self, amqp_uri, config=None, **kwargs):
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self._active_conn = None
+        self._active_channel = None
+        super().__init__(amqp_uri, config=config, **kwargs)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._thread_lock:
+            if self.running:
+                return
+            self.should_stop = False
+            self._thread = threading.Thread(
+                target=self.run, name="rpc-reply-dispatcher", daemon=True
+            )
+            self._thread.start()
+        _logger.debug(None, "action", "rpc-reply-dispatcher-started")
+
+    def stop(self, timeout: Optional[float] = None):
+        with self._thread_lock:
+            thread = self._thread
+            self._thread = None
+            self.should_stop = True
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout=timeout)
+        _logger.debug(None, "action", "rpc-reply-dispatcher-stopped")
+
+    def _new_consumer(self, consumer_cls, provider):
+        consumer = consumer_cls(
+            queues=[provider.queue],
+            callbacks=[provider.handle_message],
+            accept=self._accept,
+        )
+        consumer.qos(prefetch_count=1)
+        return consumer
+
+    def get_consumers(self, consumer_cls, channel):
+        # consumers bound to the channel of previous connection are no longer
+        # usable, always rebuild them whenever the connection is (re)established
+        self._consumers = {
+            p: self._new_consumer(consumer_cls, p) for p in list(self._providers)
+        }
+        return list(self._consumers.values())
+
+    def on_consume_ready(self, connection, channel, consumers, **kwargs):
+        self._active_conn = connection
+        self._active_channel = channel
+
+    def on_consume_end(self, connection, channel):
+        self._active_conn = None
+        self._active_channel = None
+
+    def on_iteration(self):
+        # synchronize subscriptions with the providers (un)registered after
+        # the dispatcher started, this runs in the dispatcher thread so the
+        # connection is never shared with other threads.
+        channel = self._active_channel
+        if channel is None:
+            return
+        providers = set(self._providers)
+        for provider in list(self._consumers.keys()):
+            if provider in providers:
+                continue
+            consumer = self._consumers.pop(provider)
+            consumer.cancel()
+            ProviderCollector.undeclare(
+                self, conn=self._active_conn, label=provider.identity
+            )
+        for provider in providers:
+            if provider in self._consumers:
+                continue
+            consumer_cls = partial(KombuConsumer, channel)
+            consumer = self._new_consumer(consumer_cls, provider)
+            consumer.consume()
+            self._consumers[provider] = consumer
+
+
+## end of class ReplyDispatcher
+
+
+class DispatchedRpcReplyEvent(RpcReplyEvent):
+    """
+    Reply event completed by the dispatcher thread, the internal future is
+    done as soon as the event reaches final status.
+    """
+
+    def __init__(self, listener, timeout_s, corr_id: str = ""):
+        super().__init__(listener=listener, timeout_s=timeout_s, corr_id=corr_id)
+        self._lock = threading.Lock()
+        self._future = ConcurrentFuture()
+
+    @property
+    def remaining_secs(self) -> float:
+        remain = (self._time_deadline - datetime.now(UTC)).total_seconds()
+        return max(remain, 0)
+
+    def send(self, body):
+        with self._lock:
+            super().send(body=body)
+            if self.resolved and not self._future.done():
+                self._future.set_result(None)
+
+    def refresh(self, retry=False, num_of_msgs_fetch=None, timeout=0.5):
+        """
+        wait until the event is resolved, at most `timeout` seconds, no need
+        to run consumer code at here
+        """
+        if retry is True and self.timeout is True:
+            self._time_deadline = datetime.now(UTC) + self._timeout_s
+        if not self.timeout:
+            self.wait(timeout=timeout)
+        self.resp_body["timeout"] = self.timeout
+        return None
+
+    def wait(self, timeout: Optional[float] = None) -> Dict:
+        """
+        block until the event is resolved or the deadline of the event is
+        reached, the optional `timeout` shortens the waiting time
+        """
+        remain = self.remaining_secs
+        if timeout is not None:
+            remain = min(remain, timeout)
+        futures_wait([self._future], timeout=remain)
+        if not self._future.done() and self.timeout:
+            self._on_timeout()
+        return self.result
+
+    def _on_timeout(self):
+        self.resp_body["timeout"] = True
+        self._listener.discard_reply_event(self.resp_body["corr_id"])
+
+
+# end of class DispatchedRpcReplyEvent
+
+
+class AsyncRpcReplyEvent(DispatchedRpcReplyEvent):
+    """
+    Reply event which can be awaited in asyncio applications, the future
+    completed by the dispatcher thread wakes up the waiting coroutine through
+    the event loop it belongs to.
+    """
+
+    def refresh(self, retry=False, num_of_msgs_fetch=None, timeout=0.5):
+        if retry is True and self.timeout is True:
+            self._time_deadline = datetime.now(UTC) + self._timeout_s
+        self.resp_body["timeout"] = self.timeout
+        return None
+
+    async def wait(self) -> Dict:
+        if self.resolved:
+            return self.result
+        fut = asyncio.wrap_future(self._future)
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), timeout=self.remaining_secs)
+        except asyncio.TimeoutError:
+            self._on_timeout()
+        return self.result
+
+
+# end of class AsyncRpcReplyEvent
+
+
+class DispatchedReplyListener(ReplyListener):
+    """
+    Reply listener running in dispatcher mode, all the instances share the same
+    dispatcher thread, which completes the reply events by correlation ID in
+    background, callers simply wait on their own event with a deadline.
+    """
+
+    _num_objs_created = 0
+    queue_consumer: Optional[ReplyDispatcher] = None
+    queue_consumer_cls = ReplyDispatcher
+    reply_event_cls = DispatchedRpcReplyEvent
+
+    def destroy(self):
+        consumer = self.queue_consumer
+        consumer.unregister_provider(self)
+        if consumer.running and consumer._providers_registered:
+            return  # the reply queue will be deleted by the dispatcher thread
+        consumer.stop()
+        consumer.undeclare(label=self._id)
+
+    def declare_queue(self, conn):
+        super().declare_queue(conn=conn)
+        self.queue_consumer.start()
+
+    def get_reply_event(self, correlation_id, timeout_s=10):
+        reply_event = self.reply_event_cls(
+            listener=self, timeout_s=timeout_s, corr_id=correlation_id
+        )
+        self._reply_events[correlation_id] = reply_event
+        return reply_event
+
+    def discard_reply_event(self, correlation_id):
+        self._reply_events.pop(correlation_id, None)
+
+    def refresh_reply_events(self, num_of_msgs_fetch=None, timeout: float = 0.5):
+        # messages are consumed by the dispatcher thread
+        return None
+
+
+## end of class DispatchedReplyListener
+
+
+class AsyncReplyListener(DispatchedReplyListener):
+    """
+    Reply listener for asyncio applications, it has its own dispatcher thread
+    separate from the listeners for synchronous callers.
+    """
+
+    _num_objs_created = 0
+    queue_consumer: Optional[ReplyDispatcher] = None
+    reply_event_cls = AsyncRpcReplyEvent
+
+
+## end of class AsyncReplyListener
+
+
 class RPCproxy:
     """
     Each RPC proxy object has independent listener in case several message brokers
     are applied to one single application.
+
+    With `reply_dispatcher` enabled, replies are consumed by a shared daemon
+    thread, callers wait on their own reply event instead of taking turn to
+    drain the reply queue.
     """
 
+    listener_cls = ReplyListener
+    dispatched_listener_cls = DispatchedReplyListener
+
     def __init__(
-        self, dst_app_name: str, src_app_name: str, srv_basepath: str = ".", **options
+        self,
+        dst_app_name: str,
+        src_app_name: str,
+        srv_basepath: str = ".",
+        reply_dispatcher: bool = False,
+        **options
     ):
         _default_msg_broker_url = _get_amqp_url(
             secrets_path=os.path.join(srv_basepath, "common/data/secrets.json")
         )
         self._dst_app_name = dst_app_name
         self._src_app_name = src_app_name
-        self._rpc_reply_listener = ReplyListener(
+        listener_cls = (
+            self.dispatched_listener_cls if reply_dispatcher else self.listener_cls
+        )
+        self._rpc_reply_listener = listener_cls(
             broker_url=_default_msg_broker_url,
             dst_app_label=dst_app_name,
             src_app_label=src_app_name,
         )
         self._options = options
         self._options.update({"broker_url": _default_msg_broker_url})
+        self._method_proxies = {}
 
     def __del__(self):
         listener = self._rpc_reply_listener
@@ -292,6 +558,20 @@ class RPCproxy:
         listener.destroy()
 
     def __getattr__(self, name):
+        if name.startswith("_"):
+            # internal attributes not yet initialized, never map them to RPC
+            raise AttributeError(name)
+        # method proxies are cached, which keeps publisher setup out of hot path
+        proxy = self._method_proxies.get(name)
+        if proxy is None:
+            proxy = self._new_method_proxy(name)
+            self._method_proxies[name] = proxy
+        return proxy
+
+    def batch(self) -> "RpcBatch":
+        return RpcBatch(proxy=self)
+
+    def _new_method_proxy(self, name):
         return MethodProxy(
             dst_app_name=self._dst_app_name,
             src_app_name=self._src_app_name,
@@ -326,6 +606,8 @@ class MethodProxy:
         self._publisher = self.publisher_cls(
             amqp_uri=broker_url, serializer=serializer, ssl=self.ssl, **options
         )
+        self._exchange = get_rpc_exchange(self._config)
+        self._routing_key = RPC_ROUTE_KEY_PATTERN_SEND % (dst_app_name, method_name)
 
     @property
     def ssl(self):
@@ -352,11 +634,8 @@ class MethodProxy:
             "chord": None,
         }
         payload = [args, kwargs, payld_metadata]
-        exchange = get_rpc_exchange(self._config)
-        routing_key = RPC_ROUTE_KEY_PATTERN_SEND % (
-            self._dst_app_name,
-            self._method_name,
-        )
+        exchange = self._exchange
+        routing_key = self._routing_key
         reply_to = self._reply_listener.routing_key
         correlation_id = str(uuid.uuid4())
         context = self.get_message_context(
@@ -375,12 +654,13 @@ class MethodProxy:
             extra_transport_opts = {}
             if self.enable_confirm is not None:
                 extra_transport_opts["confirm_publish"] = self.enable_confirm
-            with get_connection(
+            producer_pool = get_producer_pool(
                 amqp_uri=self._broker_url,
                 ssl=self.ssl,
                 transport_options=extra_transport_opts,
-            ) as conn:
-                self._reply_listener.declare_queue(conn=conn)
+            )
+            with producer_pool.acquire() as producer:
+                self._reply_listener.declare_queue(conn=producer.connection)
                 result = self._publisher.publish(
                     payload=payload,
                     exchange=exchange,
@@ -390,7 +670,7 @@ class MethodProxy:
                     reply_to=reply_to,
                     correlation_id=correlation_id,
                     extra_headers=context,
-                    conn=conn,
+                    producer=producer,
                 )
             if self.enable_confirm is True and result.ready is False:
                 raise UndeliverableMessage(exchange=exchange, routing_key=routing_key)
@@ -428,3 +708,133 @@ class MethodProxy:
 
 
 ## end of class MethodProxy
+
+
+class RpcBatch:
+    """
+    Pack several method invocations to the same remote application into one
+    RPC message, the remote batch dispatcher runs them in order then replies
+    with results of all the invocations at once, which reduces the number of
+    round trips in fan-out paths to one.
+    See `dispatch_rpc_batch()` for the worker side.
+    """
+
+    def __init__(self, proxy: RPCproxy):
+        self._proxy = proxy
+        self._calls = []
+
+    def __len__(self):
+        return len(self._calls)
+
+    def add(self, method_name: str, *args, **kwargs) -> int:
+        """append an invocation, return its position in the batch"""
+        self._calls.append({"method": method_name, "args": args, "kwargs": kwargs})
+        return len(self._calls) - 1
+
+    def send(self):
+        """
+        publish the entire batch, return the reply event from the method proxy,
+        which has to be awaited if the batch is created by `AsyncRPCproxy`
+        """
+        assert any(self._calls), "empty batch"
+        method_proxy = getattr(self._proxy, RPC_BATCH_METHOD_NAME)
+        return method_proxy(calls=self._calls)
+
+    def demux(self, batch_result: Dict) -> List[Dict]:
+        """
+        split the result of the entire batch into results of individual
+        invocations, in the same order as they were added. If the batch as a
+        whole did not complete successfully, each invocation gets the same
+        status of the batch.
+        """
+        status_opt = RpcReplyEvent.status_opt
+        status = batch_result["status"]
+        items = batch_result["result"]
+        base = {"timeout": batch_result["timeout"], "corr_id": batch_result["corr_id"]}
+        if status == status_opt.SUCCESS:
+            if isinstance(items, list) and len(items) == len(self._calls):
+                return [self._demux_item(base, item) for item in items]
+            status = status_opt.REMOTE_ERROR
+            base["error"] = "malformed batch reply"
+        elif batch_result.get("error"):
+            base["error"] = batch_result["error"]
+        return [dict(base, status=status, result=None) for _ in self._calls]
+
+    @staticmethod
+    def _demux_item(base: Dict, item: Dict) -> Dict:
+        out = dict(base, status=item["status"], result=item.get("result"))
+        if item.get("error"):
+            out["error"] = item["error"]
+        return out
+
+
+## end of class RpcBatch
+
+
+def dispatch_rpc_batch(task, calls: List[Dict], registry: Dict) -> List[Dict]:
+    """
+    worker side of `RpcBatch`, run each packed invocation with the Celery task
+    found in `registry` by method name, locally in the current worker process.
+    Request headers of the batch task (e.g. `src_app`) are forwarded to each
+    invocation, failure of one invocation does not abort the others.
+    """
+    status_opt = RpcReplyEvent.status_opt
+    headers = task.request.headers
+    out = []
+    for call in calls:
+        method_name = call.get("method")
+        target = registry.get(method_name)
+        if target is None:
+            item = {
+                "status": status_opt.REMOTE_ERROR,
+                "result": None,
+                "error": "unknown method %s" % method_name,
+            }
+            out.append(item)
+            continue
+        eager_result = target.apply(
+            args=call.get("args"),
+            kwargs=call.get("kwargs"),
+            headers=headers,
+            throw=False,
+        )
+        item = {"status": eager_result.state, "result": None}
+        if eager_result.successful():
+            item["result"] = eager_result.result
+        else:
+            item["error"] = repr(eager_result.result)
+        out.append(item)
+    return out
+
+
+class AsyncRPCproxy(RPCproxy):
+    """
+    RPC proxy for asyncio applications, each method call is awaitable and
+    returns the reply event once the remote server completed the task,
+    the event loop is never blocked by publishing or receiving messages.
+    """
+
+    listener_cls = AsyncReplyListener
+    dispatched_listener_cls = AsyncReplyListener
+
+    def _new_method_proxy(self, name):
+        return AsyncMethodProxy(
+            dst_app_name=self._dst_app_name,
+            src_app_name=self._src_app_name,
+            method_name=name,
+            reply_listener=self._rpc_reply_listener,
+            **self._options
+        )
+
+
+class AsyncMethodProxy(MethodProxy):
+    async def __call__(self, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        fn = partial(self._call, *args, **kwargs)
+        reply_event = await loop.run_in_executor(None, fn)
+        if not reply_event.finished:
+            await reply_event.wait()
+        return reply_event
+
+
+## end of class AsyncMethodProxy
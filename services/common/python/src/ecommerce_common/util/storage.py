@@ -7,7 +7,7 @@ import copy
 import secrets
 import functools
 
-from ecommerce_common.util.python import util_os
+from ecommerce_common.util import util_os
 
 
 class AbstractStorage:
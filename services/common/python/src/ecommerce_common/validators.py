@@ -129,40 +129,31 @@ class ClosureCrossTreesLoopValidator(TreeNodesLoopValidator):
         """
         nodes = super()._build_graph(tree_edge)
         log_msg = []
-        for key, node in nodes.items():
-            if (node["inbound"] == self.ROOT_OF_TREE) or (
-                isinstance(node["inbound"], dict) and node["inbound"]["path_len"] == 1
-            ):
-                continue  # already done, no need to update the parent of current node key
-            # list all ancestors of current node in ascending order
-            filter_dict = {
-                self.descendant_column_name: key,
-                "{depth}__gt".format(depth=self.depth_column_name): 0,
-            }
-            query = (
-                self.closure_model.objects.values(
-                    self.depth_column_name, self.ancestor_column_name
+        pending_keys = [
+            key
+            for key, node in nodes.items()
+            if not (
+                (node["inbound"] == self.ROOT_OF_TREE)
+                or (
+                    isinstance(node["inbound"], dict)
+                    and node["inbound"]["path_len"] == 1
                 )
-                .filter(**filter_dict)
-                .order_by(self.depth_column_name)
             )
-            if query.count() == 0:
+        ]  # the rest are already done, no need to update the parent of these nodes
+        ancestors = self._load_ancestors(pending_keys)
+        for key in pending_keys:
+            node = nodes[key]
+            # all ancestors of current node in ascending order of depth
+            node_ancestors = ancestors[key]
+            if not node_ancestors:
                 node["inbound"] = self.ROOT_OF_TREE
             log_msg.extend(["updating_node_key", key])
-            for q in query:  # loop through each ancestor of current node
-                parent_key = str(q[self.ancestor_column_name])
+            for parent_key, path_len in node_ancestors:
                 parent_node = nodes.get(parent_key, None)
                 # look for any ancestor presented in the graph
                 if parent_node is None:
                     continue
-                path_len = q[self.depth_column_name]
                 if node["inbound"] == self.NOT_UPDATE_YET:
-                    # grand_parent = parent_node['inbound']
-                    # if isinstance(grand_parent, dict) and grand_parent.get('_user_req', False) \
-                    #        and grand_parent['ID'] == key:
-                    #    import pdb
-                    #    pdb.set_trace()
-                    #    pass
                     node["inbound"] = {"path_len": path_len, "ID": parent_key}
                     parent_node["outbound"].add(key)
                     break
@@ -174,14 +165,39 @@ class ClosureCrossTreesLoopValidator(TreeNodesLoopValidator):
                     log_msg.extend(["err_msg", err_msg])
                     _logger.error(None, *log_msg)
                     raise ValueError(err_msg)
-                # elif node['inbound']['path_len'] > path_len:
-                #     node['inbound']['path_len'] = path_len
-                #     node['inbound']["ID"] =  parent_key
-                #     nodes[parent_key]['outbound'].add(key)
         log_msg.extend(["nodes", nodes])
         _logger.debug(None, *log_msg)
         return nodes
 
+    def _load_ancestors(self, node_keys) -> dict:
+        """
+        fetch ancestors of all the given nodes in one query, return dict which
+        maps each node key to list of `(ancestor key, depth)` in ascending order
+        of the depth
+        """
+        out = {key: [] for key in node_keys}
+        if not node_keys:
+            return out
+        filter_dict = {
+            "{desc}__in".format(desc=self.descendant_column_name): node_keys,
+            "{depth}__gt".format(depth=self.depth_column_name): 0,
+        }
+        query = (
+            self.closure_model.objects.values_list(
+                self.descendant_column_name,
+                self.ancestor_column_name,
+                self.depth_column_name,
+            )
+            .filter(**filter_dict)
+            .order_by(self.descendant_column_name, self.depth_column_name)
+        )
+        for desc_id, asc_id, depth in query:
+            out[str(desc_id)].append((str(asc_id), depth))
+        return out
+
+
+## end of class ClosureCrossTreesLoopValidator
+
 
 class NumberBoundaryValidator:
     requires_context = False
@@ -1,3 +1,4 @@
+import hashlib
 import json
 import logging
 
@@ -7,11 +8,30 @@ from django.utils import timezone
 from django.core.exceptions import ObjectDoesNotExist
 
 from django.contrib.contenttypes.models import ContentType
-from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 
 _logger = logging.getLogger(__name__)
 
 
+def hash_serialized_obj_id(value: str) -> int:
+    """signed 64-bit hash of serialized object ID, fits BIGINT column"""
+    digest = hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, byteorder="big", signed=True)
+
+
+class ObjectIdHashField(models.BigIntegerField):
+    """
+    hash of the canonical `object_id` in the same row, it is always derived
+    from `object_id` before the row is inserted or saved (including
+    `bulk_create()`), so applications never need to set it.
+    """
+
+    def pre_save(self, model_instance, add):
+        value = hash_serialized_obj_id(model_instance.object_id)
+        setattr(model_instance, self.attname, value)
+        return value
+
+
 class _SoftDeleteIdSerializerMixin:
     """
     To support soft-deleted instance with compound primary key (multi-column pkey)
@@ -37,6 +57,25 @@ class _SoftDeleteIdSerializerMixin:
             out = json.loads(value)  # TODO, ensure key order
         return out
 
+    @classmethod
+    def canonical_obj_id(cls, value: str) -> str:
+        # normalize serialized ID, e.g. key order of dict
+        return cls.serialize_obj_id(value=cls.deserialize_obj_id(value))
+
+    @classmethod
+    def obj_ids_lookup(cls, values, prefix="") -> dict:
+        """
+        filter condition for a batch of primary key values, the hash column is
+        index-sought first, then the serialized IDs are compared to rule out
+        hash collision
+        """
+        serialized = [cls.serialize_obj_id(value=v) for v in values]
+        return {
+            "%sobject_hash__in"
+            % prefix: [hash_serialized_obj_id(v) for v in serialized],
+            "%sobject_id__in" % prefix: serialized,
+        }
+
     @property
     def deserialized_obj_id(self):
         return type(self).deserialize_obj_id(self.object_id)
@@ -57,6 +96,9 @@ class ChangeSet(models.Model, _SoftDeleteIdSerializerMixin):
     # all other data types will result in changeset lookup error. The same sulr is also applied
     # to SoftDeleteRecord declared below
     object_id = models.CharField(db_column="object_id", max_length=100)
+    object_hash = ObjectIdHashField(
+        db_column="object_hash", db_index=True, editable=False
+    )
     record = GenericForeignKey(ct_field="content_type", fk_field="object_id")
 
     @classmethod
@@ -70,6 +112,28 @@ class ChangeSet(models.Model, _SoftDeleteIdSerializerMixin):
         )
 
 
+def backfill_object_hash(model_cls, using="default", batch_size=500):
+    """
+    normalize `object_id` and fill `object_hash` of existing rows in a
+    changeset or soft-delete record model, for data migration
+    """
+    qset = model_cls.objects.using(using).order_by("pk")
+    last_pk = 0
+    while True:
+        rows = list(qset.filter(pk__gt=last_pk)[:batch_size])
+        if not rows:
+            break
+        for row in rows:
+            try:
+                canonical = _SoftDeleteIdSerializerMixin.canonical_obj_id(row.object_id)
+            except ValueError:  # not serialized by this module, keep it
+                canonical = row.object_id
+            row.object_id = canonical
+            row.object_hash = hash_serialized_obj_id(canonical)
+        qset.bulk_update(rows, ["object_id", "object_hash"])
+        last_pk = rows[-1].pk
+
+
 class SoftDeleteRecord(models.Model, _SoftDeleteIdSerializerMixin):
     class Meta:
         abstract = True
@@ -80,19 +144,30 @@ class SoftDeleteRecord(models.Model, _SoftDeleteIdSerializerMixin):
         ContentType, db_column="content_type", on_delete=models.CASCADE
     )
     object_id = models.CharField(db_column="object_id", max_length=100)
+    object_hash = ObjectIdHashField(
+        db_column="object_hash", db_index=True, editable=False
+    )
     record = GenericForeignKey(ct_field="content_type", fk_field="object_id")
 
 
 class SoftDeleteQuerySet(models.QuerySet):
     # TODO, ensure atomicity
     def delete(self, *args, **kwargs):
+        if self._set_based_enabled(**kwargs):
+            kwargs.pop("hard", None)
+            return SoftDeleteCollector(model_cls=self.model).delete(self, **kwargs)
         for obj in self:
             obj.delete(*args, **kwargs)
 
     def undelete(self, *args, **kwargs):
+        if self._set_based_enabled(**kwargs):
+            return SoftDeleteCollector(model_cls=self.model).undelete(self, **kwargs)
         for obj in self:
             obj.undelete(*args, **kwargs)
 
+    def _set_based_enabled(self, hard=False, **kwargs):
+        return not hard and getattr(self.model, "SOFTDELETE_SET_BASED", False)
+
 
 class SoftDeleteManager(models.Manager):
     default_qset_cls = None
@@ -155,6 +230,11 @@ class SoftDeleteObjectMixin(models.Model):
 
     SOFTDELETE_CHANGESET_MODEL = None
     SOFTDELETE_RECORD_MODEL = None
+    # soft-delete / undelete a queryset of the model by `SoftDeleteCollector`
+    # instead of the per-object methods. Subclasses which override `delete()`
+    # to remove extra relations should report these relations in
+    # `get_softdelete_relations()` before enabling it.
+    SOFTDELETE_SET_BASED = False
 
     objects = SoftDeleteManager()
     time_deleted = models.DateTimeField(
@@ -299,11 +379,7 @@ class SoftDeleteObjectMixin(models.Model):
             self.save()
             # TODO, provide extra instance variable for subclasses which determines
             #      what related fields to delete followed by the instance deletion.
-            related_fields = [
-                f
-                for f in self._meta.get_fields()
-                if f.auto_created and not f.concrete and (f.one_to_many or f.one_to_one)
-            ]
+            related_fields = self._reverse_relation_fields()
             self._delete_relations(related_fields=related_fields, *args, **kwargs)
             if profile_id:
                 softdel_recs = cs.soft_delete_records.values_list("pk", flat=True)
@@ -365,8 +441,6 @@ class SoftDeleteObjectMixin(models.Model):
         return self.DONE_PARTIAL_RECOVERY if any(discarded) else self.DONE_FULL_RECOVERY
 
     def determine_change_set(self, profile_id, create=True):
-        content_type = ContentType.objects.get_for_model(self)
-        qs = None
         log_args = [
             "model_cls",
             type(self),
@@ -376,50 +450,327 @@ class SoftDeleteObjectMixin(models.Model):
             profile_id,
         ]
         loglevel = logging.DEBUG
-        try:
-            serialized_object_id = self.SOFTDELETE_RECORD_MODEL.serialize_obj_id(
-                value=self.pk
-            )
-            qs = self.SOFTDELETE_RECORD_MODEL.objects.filter(
-                content_type=content_type,
+        serialized_object_id = self.SOFTDELETE_CHANGESET_MODEL.serialize_obj_id(
+            value=self.pk
+        )
+        found = type(self).find_change_sets(pks=[self.pk], profile_id=profile_id)
+        qs = found.get(serialized_object_id)
+        if qs:
+            log_args.extend(["msg", "Found changeSet"])
+        elif create:
+            qs = self.SOFTDELETE_CHANGESET_MODEL.objects.create(
+                content_type=ContentType.objects.get_for_model(self),
                 object_id=serialized_object_id,
-                changeset__done_by=profile_id,
-            )
-            qs = qs.latest("time_created").changeset
-            log_args.extend(["msg", "Found changeSet via latest recordset."])
-        except self.SOFTDELETE_RECORD_MODEL.DoesNotExist:
-            serialized_object_id = self.SOFTDELETE_CHANGESET_MODEL.serialize_obj_id(
-                value=self.pk
+                done_by=profile_id,
             )
-            try:
-                qs = self.SOFTDELETE_CHANGESET_MODEL.objects.filter(
-                    content_type=content_type,
-                    object_id=serialized_object_id,
-                    done_by=profile_id,
-                )
-                qs = qs.latest("time_created")
-                log_args.extend(["msg", "Found changeSet via changeset"])
-            except self.SOFTDELETE_CHANGESET_MODEL.DoesNotExist:
-                if create:
-                    qs = self.SOFTDELETE_CHANGESET_MODEL.objects.create(
-                        content_type=content_type,
-                        object_id=serialized_object_id,
-                        done_by=profile_id,
-                    )
-                    log_args.extend(["msg", "new changeSet created"])
-                    loglevel = logging.INFO
-                else:
-                    err_msg = self._changeset_not_found_err_msg
-                    log_args.extend(["msg", err_msg])
-                    _logger.error(None, *log_args)
-                    raise ObjectDoesNotExist(err_msg)
+            log_args.extend(["msg", "new changeSet created"])
+            loglevel = logging.INFO
+        else:
+            err_msg = self._changeset_not_found_err_msg
+            log_args.extend(["msg", err_msg])
+            _logger.error(None, *log_args)
+            raise ObjectDoesNotExist(err_msg)
         log_args.extend(["changeset_id", qs.pk])
         _logger.log(loglevel, None, *log_args)
         return qs
 
+    @classmethod
+    def find_change_sets(cls, pks, profile_id) -> dict:
+        """
+        look for the latest changeset done by the given user for each of the
+        primary keys, via soft-delete records first then changesets, return
+        dict which maps serialized ID to the changeset found
+        """
+        content_type = ContentType.objects.get_for_model(cls)
+        record_cls = cls.SOFTDELETE_RECORD_MODEL
+        cs_cls = cls.SOFTDELETE_CHANGESET_MODEL
+        found = {}
+        qset = record_cls.objects.filter(
+            content_type=content_type,
+            changeset__done_by=profile_id,
+            **record_cls.obj_ids_lookup(pks),
+        )
+        qset = qset.select_related("changeset").order_by("time_created")
+        for rec in qset:  # the latest one overwrites others
+            found[rec.object_id] = rec.changeset
+        missing = [pk for pk in pks if cs_cls.serialize_obj_id(value=pk) not in found]
+        if missing:
+            qset = cs_cls.objects.filter(
+                content_type=content_type,
+                done_by=profile_id,
+                **cs_cls.obj_ids_lookup(missing),
+            )
+            for cs in qset.order_by("time_created"):
+                found[cs.object_id] = cs
+        return found
+
     def filter_before_recover(self, records_in):
         """
         subclasses can override this function to filter out some useless records
         for apllication-level recovery (e.g. to avoid data corruption after recovery)
         """
         return records_in
+
+    @classmethod
+    def _reverse_relation_fields(cls):
+        return [
+            f
+            for f in cls._meta.get_fields()
+            if f.auto_created and not f.concrete and (f.one_to_many or f.one_to_one)
+        ]
+
+    @classmethod
+    def get_softdelete_relations(cls) -> list:
+        """
+        relation fields followed by `SoftDeleteCollector` when soft-deleting
+        objects of the model, which could be reverse one-to-many / one-to-one
+        relations, generic relations, or many-to-many fields (only the rows in
+        relation table are hard-deleted), subclasses can extend the list.
+        """
+        return cls._reverse_relation_fields()
+
+
+## end of class SoftDeleteObjectMixin
+
+
+class SoftDeleteCollector:
+    """
+    set-based soft-delete / undelete for all objects in a queryset
+    - related objects are collected level by level, with one query per
+      related model in each level
+    - delete flags are switched by queryset-level `update()`
+    - one changeset is created for each root object, all the changesets and
+      records are inserted by `bulk_create()` , so each changeset still covers
+      the objects cascaded from its root object, as `SoftDeleteObjectMixin.delete()`
+      does, and recovery of single object is not affected.
+    """
+
+    def __init__(self, model_cls):
+        self.model_cls = model_cls
+        self._skip_model_types = (ChangeSet, SoftDeleteRecord)
+
+    def delete(self, qset, changeset=None, profile_id=None, skip_model_types=None):
+        self._skip_model_types += tuple(skip_model_types or [])
+        qset = qset.filter(time_deleted__isnull=True)
+        roots = list(qset)
+        if not roots:
+            return
+        now = timezone.now()
+        qset.update(time_deleted=now)
+        changesets = self._prepare_changesets(roots, changeset, profile_id, now)
+        records = {}
+        # each item in a level consists of a model class, and pairs of its
+        # soft-deleted objects with the changesets they belong to
+        level = [(self.model_cls, list(zip(roots, changesets)))]
+        while level:
+            next_level = []
+            for model_cls, pairs in level:
+                self._add_records(records, model_cls, pairs, now)
+                for field in model_cls.get_softdelete_relations():
+                    item = self._delete_relation(model_cls, field, pairs, now)
+                    if item:
+                        next_level.append(item)
+            level = next_level
+        for record_cls, objs in records.items():
+            record_cls.objects.bulk_create(objs, ignore_conflicts=True)
+        log_args = [
+            "model_cls",
+            self.model_cls,
+            "num_roots",
+            len(roots),
+            "changeset_ids",
+            sorted(set(cs.pk for cs in changesets)),
+            "num_records",
+            sum(len(objs) for objs in records.values()),
+            "profile_id",
+            profile_id,
+        ]
+        _logger.debug(None, *log_args)
+
+    def _prepare_changesets(self, roots, changeset, profile_id, now) -> list:
+        if changeset:
+            return [changeset] * len(roots)
+        cs_cls = self.model_cls.SOFTDELETE_CHANGESET_MODEL
+        content_type = ContentType.objects.get_for_model(self.model_cls)
+        changesets = [
+            cs_cls(
+                content_type=content_type,
+                object_id=cs_cls.serialize_obj_id(value=obj.pk),
+                done_by=profile_id,
+                time_created=now,
+            )
+            for obj in roots
+        ]
+        cs_cls.objects.bulk_create(changesets)
+        if any(cs.pk is None for cs in changesets):
+            # the database backend does not return IDs of inserted rows
+            qset = cs_cls.objects.filter(
+                content_type=content_type,
+                done_by=profile_id,
+                time_created=now,
+                **cs_cls.obj_ids_lookup([obj.pk for obj in roots]),
+            )
+            saved = {cs.object_id: cs for cs in qset}
+            changesets = [saved[cs.object_id] for cs in changesets]
+        return changesets
+
+    def _add_records(self, records, model_cls, pairs, now):
+        record_cls = model_cls.SOFTDELETE_RECORD_MODEL
+        content_type = ContentType.objects.get_for_model(model_cls)
+        objs = records.setdefault(record_cls, [])
+        for obj, cs in pairs:
+            record = record_cls(
+                changeset=cs,
+                content_type=content_type,
+                object_id=record_cls.serialize_obj_id(value=obj.pk),
+                time_created=now,
+            )
+            objs.append(record)
+
+    def _relation_lookup(self, model_cls, field, pairs):
+        # return filter condition of the related objects, and functions which
+        # get the key linking a parent object and its related objects
+        if isinstance(field, GenericRelation):
+            content_type = ContentType.objects.get_for_model(
+                model_cls, for_concrete_model=field.for_concrete_model
+            )
+            condition = {
+                field.content_type_field_name: content_type,
+                "%s__in" % field.object_id_field_name: [o.pk for o, _ in pairs],
+            }
+            attname = field.related_model._meta.get_field(
+                field.object_id_field_name
+            ).attname
+            parent_key_fn = lambda obj: str(obj.pk)
+            child_key_fn = lambda obj: str(getattr(obj, attname))
+        else:  # reverse one-to-many or one-to-one relation
+            fk = field.field
+            target_attname = fk.target_field.attname
+            condition = {
+                "%s__in" % fk.name: [getattr(o, target_attname) for o, _ in pairs]
+            }
+            parent_key_fn = lambda obj: getattr(obj, target_attname)
+            child_key_fn = lambda obj: getattr(obj, fk.attname)
+        return condition, parent_key_fn, child_key_fn
+
+    def _delete_relation(self, model_cls, field, pairs, now):
+        rel_cls = field.related_model
+        if issubclass(rel_cls, self._skip_model_types):
+            return
+        if field.many_to_many:
+            # hard-delete rows in the relation table, not the related objects
+            through = field.remote_field.through
+            condition = {"%s__in" % field.m2m_field_name(): [o.pk for o, _ in pairs]}
+            through._default_manager.filter(**condition).delete()
+            return
+        condition, parent_key_fn, child_key_fn = self._relation_lookup(
+            model_cls, field, pairs
+        )
+        rel_qset = rel_cls._default_manager.filter(**condition)
+        if not issubclass(rel_cls, SoftDeleteObjectMixin):
+            rel_qset.delete()
+            return
+        children = list(rel_qset)
+        if not children:
+            return
+        changesets = {parent_key_fn(obj): cs for obj, cs in pairs}
+        child_pairs = [(c, changesets[child_key_fn(c)]) for c in children]
+        if rel_cls.SOFTDELETE_SET_BASED:
+            rel_qset.update(time_deleted=now)
+            return rel_cls, child_pairs
+        for child, cs in child_pairs:  # fall back to per-object deletion
+            child.delete(changeset=cs)
+
+    def undelete(self, qset, changeset=None, profile_id=None):
+        roots = list(qset.filter(time_deleted__isnull=False))
+        if not roots:
+            return
+        if changeset:
+            changesets = {changeset.pk: (changeset, roots[0])}
+        else:
+            changesets = self._find_changesets(roots, profile_id)
+        record_cls = self.model_cls.SOFTDELETE_RECORD_MODEL
+        records = {}
+        for rec in record_cls.objects.filter(changeset__in=list(changesets)):
+            records.setdefault(rec.changeset_id, []).append(rec)
+        # model class -> list of object IDs
+        recovering, discarding = {}, {}
+        for cs_id, (cs, root) in changesets.items():
+            related_records = records.get(cs_id, [])
+            filtered = root.filter_before_recover(records_in=related_records)
+            filtered_ids = set(r.pk for r in filtered)
+            for rec in related_records:
+                content_type = ContentType.objects.get_for_id(rec.content_type_id)
+                dst = recovering if rec.pk in filtered_ids else discarding
+                objs = dst.setdefault(content_type.model_class(), [])
+                objs.append(rec.deserialized_obj_id)
+        for model_cls, obj_ids in recovering.items():
+            self._recover(model_cls, obj_ids)
+        cs_cls = self.model_cls.SOFTDELETE_CHANGESET_MODEL
+        cs_cls.objects.filter(pk__in=list(changesets)).delete()
+        for model_cls, obj_ids in discarding.items():
+            self._hard_delete(model_cls, obj_ids)
+        log_args = [
+            "model_cls",
+            self.model_cls,
+            "changeset_ids",
+            sorted(changesets.keys()),
+            "num_recovered",
+            sum(len(v) for v in recovering.values()),
+            "num_discarded",
+            sum(len(v) for v in discarding.values()),
+            "profile_id",
+            profile_id,
+        ]
+        _logger.debug(None, *log_args)
+
+    def _find_changesets(self, roots, profile_id) -> dict:
+        record_cls = self.model_cls.SOFTDELETE_RECORD_MODEL
+        found = self.model_cls.find_change_sets(
+            pks=[o.pk for o in roots], profile_id=profile_id
+        )
+        roots = {record_cls.serialize_obj_id(value=o.pk): o for o in roots}
+        missing = roots.keys() - found.keys()
+        if missing:
+            err_msg = SoftDeleteObjectMixin._changeset_not_found_err_msg
+            log_args = [
+                "model_cls",
+                self.model_cls,
+                "model_ids",
+                sorted(missing),
+                "profile_id",
+                profile_id,
+                "msg",
+                err_msg,
+            ]
+            _logger.error(None, *log_args)
+            raise ObjectDoesNotExist(err_msg)
+        return {cs.pk: (cs, roots[obj_id]) for obj_id, cs in found.items()}
+
+    def _split_obj_ids(self, obj_ids):
+        # compound primary keys (serialized as list or dict) cannot be used in
+        # `pk__in` lookup, the objects are processed one by one
+        single = [i for i in obj_ids if not isinstance(i, (list, dict))]
+        compound = [i for i in obj_ids if isinstance(i, (list, dict))]
+        return single, compound
+
+    def _recover(self, model_cls, obj_ids):
+        single, compound = self._split_obj_ids(obj_ids)
+        if single:
+            qset = model_cls._base_manager.filter(pk__in=single)
+            qset.update(time_deleted=None)
+        for obj_id in compound:
+            obj = model_cls.objects.get(pk=obj_id)
+            obj.time_deleted = None
+            obj.save()
+
+    def _hard_delete(self, model_cls, obj_ids):
+        single, compound = self._split_obj_ids(obj_ids)
+        if single:
+            model_cls._base_manager.filter(pk__in=single).delete()
+        for obj_id in compound:
+            obj = model_cls.objects.get(pk=obj_id)
+            obj.delete(hard=True)
+
+
+## end of class SoftDeleteCollector
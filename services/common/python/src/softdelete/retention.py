@@ -0,0 +1,191 @@
+import gzip
+import io
+import json
+import logging
+from datetime import timedelta
+from pathlib import Path
+
+from django.core import serializers as django_serializers
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction, DEFAULT_DB_ALIAS
+from django.utils import timezone
+from django.contrib.contenttypes.models import ContentType
+
+from ecommerce_common.util.storage import FileSystemStorage
+
+_logger = logging.getLogger(__name__)
+
+
+class SoftDeleteRetention:
+    """
+    hard-delete soft-deleted objects and their changesets which are older than
+    `max_age`, in bounded batches, each batch runs in its own transaction.
+    If `storage` is given, each batch is exported to a gzip-compressed JSON-lines
+    archive before deletion, one line per changeset with all the objects it
+    covers, the batch is not deleted if the export fails.
+    """
+
+    def __init__(
+        self,
+        changeset_cls,
+        max_age: timedelta,
+        batch_size: int = 100,
+        using: str = DEFAULT_DB_ALIAS,
+        storage=None,
+        archive_dir: str = "softdelete",
+    ):
+        self.changeset_cls = changeset_cls
+        self.record_cls = changeset_cls._meta.get_field(
+            "soft_delete_records"
+        ).related_model
+        self.max_age = max_age
+        self.batch_size = batch_size
+        self.using = using
+        self.storage = storage
+        self.archive_dir = archive_dir
+
+    def run(self, max_batches: int = 10) -> dict:
+        """return number of hard-deleted rows for each model"""
+        counts = {}
+        t0 = timezone.now() - self.max_age
+        for _ in range(max_batches):
+            num_changesets = self._purge_batch(t0, counts)
+            if num_changesets < self.batch_size:
+                break
+        return counts
+
+    def _purge_batch(self, t0, counts) -> int:
+        cs_qset = self.changeset_cls.objects.using(self.using)
+        with transaction.atomic(using=self.using):
+            qset = cs_qset.filter(time_created__lt=t0).order_by("time_created", "pk")
+            changesets = list(qset[: self.batch_size])
+            if not changesets:
+                return 0
+            objs = self._load_objects(changesets)
+            if self.storage:
+                self._export(changesets, objs)
+            for model_cls, model_objs in objs.items():
+                self._hard_delete(model_cls, model_objs.values(), counts)
+            _, deleted = cs_qset.filter(pk__in=[cs.pk for cs in changesets]).delete()
+            for label, num in deleted.items():
+                counts[label] = counts.get(label, 0) + num
+        return len(changesets)
+
+    def _load_objects(self, changesets) -> dict:
+        # model class -> {(changeset ID, serialized object ID): object}
+        obj_ids = {}
+        records = self.record_cls.objects.using(self.using).filter(
+            changeset__in=changesets
+        )
+        for rec in records:
+            content_type = ContentType.objects.get_for_id(rec.content_type_id)
+            ids = obj_ids.setdefault(content_type.model_class(), {})
+            ids[rec.object_id] = (rec.changeset_id, rec.deserialized_obj_id)
+        out = {}
+        for model_cls, ids in obj_ids.items():
+            qset = model_cls._base_manager.using(self.using).filter(
+                time_deleted__isnull=False
+            )
+            single = [v[1] for v in ids.values() if not isinstance(v[1], (list, dict))]
+            loaded = list(qset.filter(pk__in=single)) if single else []
+            for v in ids.values():
+                if isinstance(v[1], (list, dict)):  # compound primary key
+                    loaded.extend(qset.filter(pk=v[1]))
+            model_objs = out.setdefault(model_cls, {})
+            for obj in loaded:
+                serial_id = self.record_cls.serialize_obj_id(value=obj.pk)
+                changeset_id = ids[serial_id][0]
+                model_objs[(changeset_id, serial_id)] = obj
+        return out
+
+    def _hard_delete(self, model_cls, objs, counts):
+        single = [o.pk for o in objs if not isinstance(o.pk, (list, dict))]
+        if single:
+            qset = model_cls._base_manager.using(self.using).filter(pk__in=single)
+            _, deleted = qset.delete()
+        else:
+            deleted = {}
+        for obj in objs:
+            if isinstance(obj.pk, (list, dict)):
+                obj.delete(hard=True)
+                label = obj._meta.label
+                deleted[label] = deleted.get(label, 0) + 1
+        for label, num in deleted.items():
+            counts[label] = counts.get(label, 0) + num
+
+    def _export(self, changesets, objs):
+        lines = {
+            cs.pk: {
+                "changeset": {
+                    "id": cs.pk,
+                    "done_by": cs.done_by,
+                    "time_created": cs.time_created,
+                    "content_type": ContentType.objects.get_for_id(
+                        cs.content_type_id
+                    ).natural_key(),
+                    "object_id": cs.object_id,
+                },
+                "objects": [],
+            }
+            for cs in changesets
+        }
+        for model_objs in objs.values():
+            keys = list(model_objs.keys())
+            serialized = django_serializers.serialize(
+                "python", [model_objs[k] for k in keys]
+            )
+            for (changeset_id, _), item in zip(keys, serialized):
+                lines[changeset_id]["objects"].append(item)
+        content = io.BytesIO()
+        with gzip.GzipFile(fileobj=content, mode="wb") as f:
+            for line in lines.values():
+                f.write(json.dumps(line, cls=DjangoJSONEncoder).encode("utf-8"))
+                f.write(b"\n")
+        fname = "%s-%s-%d.jsonl.gz" % (
+            self.changeset_cls._meta.db_table,
+            timezone.now().strftime("%Y%m%d%H%M%S"),
+            changesets[0].pk,
+        )
+        result = self.storage.save(
+            path="%s/%s" % (self.archive_dir, fname), content=content
+        )
+        log_args = [
+            "action",
+            "softdelete-archive",
+            "path",
+            result["path"],
+            "size",
+            result["size"],
+            "num_changesets",
+            len(changesets),
+        ]
+        _logger.info(None, *log_args)
+
+
+## end of class SoftDeleteRetention
+
+
+def purge_expired_softdeleted(
+    changeset_cls,
+    days: int,
+    batch_size: int = 100,
+    max_batches: int = 10,
+    using: str = DEFAULT_DB_ALIAS,
+    archive_location=None,
+) -> dict:
+    """
+    entry for periodic tasks of each application, the archives are saved to
+    local path `archive_location` if specified
+    """
+    storage = None
+    if archive_location:
+        Path(archive_location).mkdir(parents=True, exist_ok=True)
+        storage = FileSystemStorage(location=str(archive_location))
+    retention = SoftDeleteRetention(
+        changeset_cls=changeset_cls,
+        max_age=timedelta(days=days),
+        batch_size=batch_size,
+        using=using,
+        storage=storage,
+    )
+    return retention.run(max_batches=max_batches)
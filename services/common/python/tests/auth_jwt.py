@@ -0,0 +1,229 @@
+import json
+import time
+import unittest
+from contextlib import ExitStack
+from datetime import datetime, timedelta, UTC
+from unittest.mock import patch
+
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+
+from ecommerce_common.auth.jwt import JWT, VerifiedTokenCache
+from ecommerce_common.auth.keystore import invalidate_shared_keystore
+
+
+class LocalRsaKeystore:
+    """minimal in-memory keystore, with locally generated RSA key pairs"""
+
+    def __init__(self, num_keys=2, key_size_in_bits=2048):
+        self._secrets = {}
+        self._pubkeys = {}
+        for idx in range(num_keys):
+            kid = "utest-key-%s" % idx
+            privkey = rsa.generate_private_key(
+                public_exponent=65537, key_size=key_size_in_bits
+            )
+            for dst, key in (
+                (self._secrets, privkey),
+                (self._pubkeys, privkey.public_key()),
+            ):
+                item = json.loads(RSAAlgorithm.to_jwk(key))
+                item.update({"kid": kid, "alg": "RS256", "use": "sig"})
+                dst[kid] = item
+
+    def choose_pubkey(self, kid):
+        return self._pubkeys[kid].copy()
+
+    def revoke(self, kid):
+        self._secrets.pop(kid, None)
+        self._pubkeys.pop(kid, None)
+
+    def choose_secret(self, kid=None, randonly=False):
+        kid = kid or next(iter(self._secrets.keys()))
+        return self._secrets[kid].copy()
+
+
+def gen_encoded_token(keystore, audience, valid_secs=300, **extra_payld):
+    now_time = datetime.now(UTC)
+    token = JWT()
+    payload = {
+        "profile": 123,
+        "aud": audience,
+        "iat": now_time,
+        "exp": now_time + timedelta(seconds=valid_secs),
+    }
+    payload.update(extra_payld)
+    token.payload.update(payload)
+    return token.encode(keystore=keystore)
+
+
+def shift_clock(secs):
+    """
+    move forward the clocks read by the verified-token cache and PyJWT, instead
+    of waiting for the token to expire
+    """
+
+    class _ShiftedDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.now(tz) + timedelta(seconds=secs)
+
+    origin_time_fn = time.time
+    stack = ExitStack()
+    stack.enter_context(
+        patch(
+            "ecommerce_common.auth.jwt.time.time",
+            side_effect=lambda: origin_time_fn() + secs,
+        )
+    )
+    stack.enter_context(patch("jwt.api_jwt.datetime", _ShiftedDatetime))
+    return stack
+
+
+class VerifiedTokenCacheTestCase(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = VerifiedTokenCache(max_entries=3)
+        now = time.time()
+        keys = [cache.gen_key("token-%s" % idx, ["store"]) for idx in range(4)]
+        for idx, key in enumerate(keys[:3]):
+            cache.set(key, value=idx, expiry=now + 100)
+        self.assertEqual(cache.get(keys[0]), 0)  # `keys[1]` is least recently used
+        cache.set(keys[3], value=3, expiry=now + 100)
+        self.assertEqual(len(cache), 3)
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertEqual(cache.get(keys[0]), 0)
+        self.assertEqual(cache.get(keys[3]), 3)
+
+    def test_expired_first(self):
+        cache = VerifiedTokenCache(max_entries=3)
+        now = time.time()
+        keys = [cache.gen_key("token-%s" % idx, None) for idx in range(4)]
+        cache.set(keys[0], value=0, expiry=now + 100, now=now)
+        cache.set(keys[1], value=1, expiry=now + 5, now=now)
+        cache.set(keys[2], value=2, expiry=now + 100, now=now)
+        # `keys[1]` expires before the cache is full
+        later = now + 6
+        cache.set(keys[3], value=3, expiry=now + 100, now=later)
+        self.assertEqual(len(cache), 3)
+        self.assertIsNone(cache.get(keys[1], now=later))
+        for idx in (0, 2, 3):
+            self.assertEqual(cache.get(keys[idx], now=later), idx)
+        # expired entry is never returned, even if the cache is not full
+        cache.set(keys[1], value=1, expiry=later - 1, now=later)
+        self.assertIsNone(cache.get(keys[1], now=later))
+
+    def test_audience_in_key(self):
+        key0 = VerifiedTokenCache.gen_key("token-1", ["store", "product"])
+        key1 = VerifiedTokenCache.gen_key("token-1", ["product", "store"])
+        key2 = VerifiedTokenCache.gen_key("token-1", ["store"])
+        self.assertEqual(key0, key1)
+        self.assertNotEqual(key0, key2)
+
+
+class JwtVerifyCacheTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._keystore = LocalRsaKeystore(num_keys=1)
+
+    def setUp(self):
+        self._orig_cache = JWT.verified_cache
+        JWT.verified_cache = VerifiedTokenCache(max_entries=16)
+
+    def tearDown(self):
+        JWT.verified_cache = self._orig_cache
+
+    def test_verify_hit(self):
+        encoded = gen_encoded_token(self._keystore, audience=["store"])
+        with patch.object(
+            JWT._decoder, "decode_complete", wraps=JWT._decoder.decode_complete
+        ) as mock_decode:
+            for _ in range(3):
+                token = JWT()
+                payld = token.verify(
+                    keystore=self._keystore, audience=["store"], unverified=encoded
+                )
+                self.assertTrue(token.valid)
+                self.assertEqual(payld["profile"], 123)
+                self.assertEqual(token.payload["profile"], 123)
+                self.assertEqual(token.header["kid"], "utest-key-0")
+            # signature is verified only once
+            self.assertEqual(mock_decode.call_count, 1)
+        # modifying returned payload does not affect cached entry
+        payld["profile"] = 456
+        payld["aud"].append("product")
+        token.payload["aud"].append("order")
+        token = JWT(encoded=encoded)
+        payld = token.verify(keystore=self._keystore, audience=["store"])
+        self.assertEqual(payld["profile"], 123)
+        self.assertListEqual(payld["aud"], ["store"])
+        self.assertListEqual(token.payload["aud"], ["store"])
+
+    def test_revoked_key_not_hit(self):
+        keystore = LocalRsaKeystore(num_keys=2)
+        encoded = gen_encoded_token(keystore, audience=["store"])
+        kid = JWT(encoded=encoded).header["kid"]
+        token = JWT()
+        payld = token.verify(keystore=keystore, audience=["store"], unverified=encoded)
+        self.assertEqual(payld["profile"], 123)
+        self.assertEqual(len(JWT.verified_cache), 1)
+        keystore.revoke(kid)
+        token = JWT()
+        payld = token.verify(keystore=keystore, audience=["store"], unverified=encoded)
+        self.assertIsNone(payld)
+        self.assertFalse(token.valid)
+        self.assertEqual(len(JWT.verified_cache), 0)
+
+    def test_cleared_on_keystore_invalidation(self):
+        encoded = gen_encoded_token(self._keystore, audience=["store"])
+        token = JWT()
+        token.verify(keystore=self._keystore, audience=["store"], unverified=encoded)
+        self.assertEqual(len(JWT.verified_cache), 1)
+        invalidate_shared_keystore()
+        self.assertEqual(len(JWT.verified_cache), 0)
+
+    def test_verify_failure_not_cached(self):
+        encoded = gen_encoded_token(self._keystore, audience=["store"])
+        for _ in range(2):
+            token = JWT()
+            payld = token.verify(
+                keystore=self._keystore, audience=["product"], unverified=encoded
+            )
+            self.assertIsNone(payld)
+            self.assertFalse(token.valid)
+        self.assertEqual(len(JWT.verified_cache), 0)
+        tampered = encoded[:-4] + ("AAAA" if encoded[-4:] != "AAAA" else "BBBB")
+        token = JWT()
+        payld = token.verify(
+            keystore=self._keystore, audience=["store"], unverified=tampered
+        )
+        self.assertIsNone(payld)
+        self.assertEqual(len(JWT.verified_cache), 0)
+
+    def test_verify_until_expiry(self):
+        valid_secs = 300
+        encoded = gen_encoded_token(
+            self._keystore, audience=["store"], valid_secs=valid_secs
+        )
+        token = JWT()
+        payld = token.verify(
+            keystore=self._keystore, audience=["store"], unverified=encoded
+        )
+        self.assertEqual(payld["profile"], 123)
+        self.assertEqual(len(JWT.verified_cache), 1)
+        with shift_clock(secs=valid_secs - 60):
+            with patch.object(
+                JWT._decoder, "decode_complete", wraps=JWT._decoder.decode_complete
+            ) as mock_decode:
+                token = JWT()
+                payld = token.verify(
+                    keystore=self._keystore, audience=["store"], unverified=encoded
+                )
+            self.assertEqual(payld["profile"], 123)
+            self.assertEqual(mock_decode.call_count, 0)
+        with shift_clock(secs=valid_secs + 1):
+            token = JWT()
+            payld = token.verify(
+                keystore=self._keystore, audience=["store"], unverified=encoded
+            )
+        self.assertIsNone(payld)
+        self.assertFalse(token.valid)
@@ -0,0 +1,55 @@
+"""
+micro-benchmark of JWT verification throughput, with locally generated RSA keystore
+
+run the script by the command :
+    python -m tests.benchmark.auth_jwt [--num-tokens 200] [--rounds 5]
+"""
+
+import argparse
+import time
+
+from ecommerce_common.auth.jwt import JWT, VerifiedTokenCache
+
+from tests.auth_jwt import LocalRsaKeystore, gen_encoded_token
+
+
+def _verify_all(keystore, tokens, audience):
+    t0 = time.perf_counter()
+    for encoded in tokens:
+        payld = JWT().verify(keystore=keystore, audience=audience, unverified=encoded)
+        assert payld, "verification failure"
+    return time.perf_counter() - t0
+
+
+def run(num_tokens, rounds):
+    keystore = LocalRsaKeystore(num_keys=2)
+    audience = ["store"]
+    tokens = [
+        gen_encoded_token(keystore, audience=audience, jti=str(idx))
+        for idx in range(num_tokens)
+    ]
+    orig_cache = JWT.verified_cache
+    results = {"miss": [], "hit": []}
+    try:
+        for _ in range(rounds):
+            JWT.verified_cache = VerifiedTokenCache(max_entries=num_tokens)
+            # every token is verified for the first time
+            results["miss"].append(_verify_all(keystore, tokens, audience))
+            # all tokens are already in the cache
+            results["hit"].append(_verify_all(keystore, tokens, audience))
+    finally:
+        JWT.verified_cache = orig_cache
+    for label, elapsed in results.items():
+        best = min(elapsed)
+        print(
+            "%-5s: %10.1f verify/sec , best of %d rounds, %d tokens per round"
+            % (label, num_tokens / best, rounds, num_tokens)
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-tokens", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    run(num_tokens=args.num_tokens, rounds=args.rounds)
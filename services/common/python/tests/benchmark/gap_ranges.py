@@ -0,0 +1,109 @@
+"""
+micro-benchmark of primary-key gap scan and ID assignment , against SQLite
+in-memory database with the schema compatible to MySQL tables which use
+4-byte unsigned integer as primary key.
+
+run the script by the command :
+    python -m tests.benchmark.gap_ranges [--num-rows 100000] [--rounds 3]
+
+The self-join query (used before the window-function query) is measured as
+the baseline, the 3 window-function queries are compared with the single CTE
+query which returns the same gap ranges.
+"""
+
+import argparse
+import random
+import sqlite3
+import time
+
+from ecommerce_common.models.db import (
+    get_sql_table_pk_gap_ranges,
+    get_sql_table_pk_gap_ranges_cte,
+)
+from ecommerce_common.models.mixins import IdBlockAllocator
+
+TABLE_NAME = "bench_saleable_item"
+MAX_VALUE = pow(2, 32) - 1
+
+
+def _selfjoin_gap_query(db_table, pk_db_column):
+    subquery = "SELECT m1.{pk} as lowerbound, MIN(m2.{pk}) as upperbound FROM {tbl} m1 \
+        INNER JOIN {tbl} AS m2 ON m1.{pk} < m2.{pk} GROUP BY m1.{pk} \
+        ORDER BY m1.{pk} ASC".format(tbl=db_table, pk=pk_db_column)
+    return "SELECT m3.lowerbound + 1 AS gap_from, m3.upperbound - 1 AS gap_to FROM \
+        (%s) m3 WHERE m3.lowerbound < m3.upperbound - 1 LIMIT 8" % (subquery)
+
+
+def _create_table(num_rows, density):
+    conn = sqlite3.connect(":memory:")
+    conn.execute(
+        "CREATE TABLE %s (id INTEGER UNSIGNED NOT NULL PRIMARY KEY)" % TABLE_NAME
+    )
+    ids = random.sample(range(1, int(num_rows / density)), k=num_rows)
+    conn.executemany("INSERT INTO %s VALUES (?)" % TABLE_NAME, [(i,) for i in ids])
+    conn.commit()
+    return conn
+
+
+def _best_of(rounds, fn):
+    elapsed = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn()
+        elapsed.append(time.perf_counter() - t0)
+    return min(elapsed)
+
+
+def _scan_window_fn(conn):
+    queries = get_sql_table_pk_gap_ranges(TABLE_NAME, "id", MAX_VALUE)
+    out = []
+    for query in queries:
+        out.extend(conn.execute(query).fetchall())
+    return out
+
+
+def _scan_single_cte(conn):
+    query = get_sql_table_pk_gap_ranges_cte(TABLE_NAME, "id", MAX_VALUE)
+    return conn.execute(query).fetchall()
+
+
+def _assign_ids(conn, allocator, num_ids, batch_size):
+    allocator.refill(_scan_window_fn(conn))
+    for _ in range(0, num_ids, batch_size):
+        allocator.reserve(batch_size)
+
+
+def run(num_rows, rounds, density):
+    conn = _create_table(num_rows, density)
+    query = _selfjoin_gap_query(TABLE_NAME, "id")
+    cost_sj = _best_of(rounds, lambda: conn.execute(query).fetchall())
+    cost = _best_of(rounds, lambda: _scan_window_fn(conn))
+    cost_cte = _best_of(rounds, lambda: _scan_single_cte(conn))
+    print(
+        "gap scan, %7d rows: self-join %9.2f ms , window function %9.2f ms"
+        ", single CTE %9.2f ms"
+        % (num_rows, cost_sj * 1000, cost * 1000, cost_cte * 1000)
+    )
+    allocator = IdBlockAllocator(block_size=64)
+    num_ids = 10000
+    cost = _best_of(rounds, lambda: _assign_ids(conn, allocator, num_ids, 50))
+    print(
+        "reserve IDs, %7d rows: %10.1f IDs/sec (batch size 50, with one gap scan)"
+        % (num_rows, num_ids / cost)
+    )
+    conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-rows", type=int, default=100000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument(
+        "--density", type=float, default=0.9, help="ratio of used IDs in [1, N]"
+    )
+    args = parser.parse_args()
+    run(
+        num_rows=args.num_rows,
+        rounds=args.rounds,
+        density=args.density,
+    )
@@ -0,0 +1,68 @@
+"""
+micro-benchmark of cycle detection on hierarchy trees, compared with the
+recursive implementation used before
+
+run the script by the command :
+    python -m tests.benchmark.graph [--num-nodes 50000] [--num-trees 500] [--rounds 3]
+
+- `forest` : `--num-trees` random trees with `--num-nodes` nodes in total,
+  the previous implementation re-sorts all visited nodes for each tree
+- `deep-chain` : one tree whose depth is `--num-nodes` , which exceeds
+  recursion limit of the previous implementation
+"""
+
+import argparse
+import random
+import time
+
+from ecommerce_common.util.graph import is_graph_cyclic
+
+from tests.graph import gen_chain, legacy_is_graph_cyclic
+
+
+def _gen_forest(num_nodes, num_trees):
+    graph = {n: {"outbound": set(), "inbound": []} for n in range(num_nodes)}
+    for n in range(num_trees, num_nodes):
+        # parent is chosen from the nodes of the same tree
+        parent = random.randrange(n % num_trees, n, num_trees)
+        graph[parent]["outbound"].add(n)
+        graph[n]["inbound"].append(parent)
+    return graph
+
+
+def _best_of(rounds, fn, graph):
+    elapsed = []
+    try:
+        for _ in range(rounds):
+            t0 = time.perf_counter()
+            fn(graph, is_directed=True)
+            elapsed.append(time.perf_counter() - t0)
+    except RecursionError:
+        return "RecursionError"
+    return "%9.2f ms" % (min(elapsed) * 1000)
+
+
+def run(num_nodes, num_trees, rounds):
+    graphs = {
+        "forest": _gen_forest(num_nodes, num_trees),
+        "deep-chain": gen_chain(num_nodes),
+    }
+    for label, graph in graphs.items():
+        print(
+            "%-10s, %6d nodes: recursive %s , iterative %s"
+            % (
+                label,
+                num_nodes,
+                _best_of(rounds, legacy_is_graph_cyclic, graph),
+                _best_of(rounds, is_graph_cyclic, graph),
+            )
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-nodes", type=int, default=50000)
+    parser.add_argument("--num-trees", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    run(num_nodes=args.num_nodes, num_trees=args.num_trees, rounds=args.rounds)
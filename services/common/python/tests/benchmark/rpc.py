@@ -0,0 +1,64 @@
+"""
+micro-benchmark of RPC publishing throughput, against kombu in-memory transport
+
+run the script by the command :
+    python -m tests.benchmark.rpc [--num-calls 2000] [--rounds 5]
+"""
+
+import argparse
+import time
+from unittest.mock import patch
+
+from kombu import Connection, Queue as KombuQueue
+
+from ecommerce_common.util.messaging.constants import RPC_ROUTE_KEY_PATTERN_SEND
+from ecommerce_common.util.messaging.rpc import RPCproxy, get_rpc_exchange
+
+BROKER_URL = "memory://"
+DST_APP, METHOD = "remote-bench", "noop"
+
+
+def _declare_request_queue(conn):
+    routing_key = RPC_ROUTE_KEY_PATTERN_SEND % (DST_APP, METHOD)
+    queue = KombuQueue(
+        name=routing_key, exchange=get_rpc_exchange(config={}), routing_key=routing_key
+    )
+    bound_q = queue(conn.default_channel)
+    bound_q.declare()
+    return bound_q
+
+
+def _publish_all(rpc, num_calls):
+    t0 = time.perf_counter()
+    for idx in range(num_calls):
+        evt = getattr(rpc, METHOD)(idx=idx)
+        assert evt.result["status"] == evt.status_opt.INITED, "publish failure"
+    return time.perf_counter() - t0
+
+
+def run(num_calls, rounds):
+    elapsed = []
+    with patch(
+        "ecommerce_common.util.messaging.rpc._get_amqp_url", return_value=BROKER_URL
+    ):
+        rpc = RPCproxy(dst_app_name=DST_APP, src_app_name="bench")
+    with Connection(BROKER_URL) as conn:
+        bound_q = _declare_request_queue(conn)
+        for _ in range(rounds):
+            elapsed.append(_publish_all(rpc, num_calls))
+            bound_q.purge()
+            # reply events are never completed in this benchmark
+            rpc._rpc_reply_listener._reply_events.clear()
+    best = min(elapsed)
+    print(
+        "publish: %10.1f calls/sec , best of %d rounds, %d calls per round"
+        % (num_calls / best, rounds, num_calls)
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-calls", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    run(num_calls=args.num_calls, rounds=args.rounds)
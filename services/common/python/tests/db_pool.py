@@ -0,0 +1,107 @@
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import create_engine, text as sa_text
+from sqlalchemy.exc import TimeoutError as SqlAlTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from ecommerce_common.models.db import (
+    SqlAlchemyPoolMetrics,
+    sqlalchemy_pool_kwargs,
+)
+
+
+class PoolOptionsTestCase(unittest.TestCase):
+    def test_valid(self):
+        options = {"pool_size": 3, "pool_recycle": 1800, "pool_pre_ping": True}
+        self.assertDictEqual(sqlalchemy_pool_kwargs(options), options)
+        self.assertDictEqual(sqlalchemy_pool_kwargs(None), {})
+
+    def test_unknown_option(self):
+        with self.assertRaises(ValueError) as cm:
+            sqlalchemy_pool_kwargs({"pool_size": 3, "size": 4, "recycle": 9})
+        self.assertIn("recycle, size", str(cm.exception))
+
+
+class PoolMetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        fd, self._db_path = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(fd)
+        pool_kwargs = sqlalchemy_pool_kwargs(
+            {"pool_size": 2, "max_overflow": 1, "pool_timeout": 0.1}
+        )
+        self._engine = create_engine(
+            "sqlite:///%s" % self._db_path, poolclass=QueuePool, **pool_kwargs
+        )
+        self._metrics = SqlAlchemyPoolMetrics(self._engine)
+
+    def tearDown(self):
+        self._engine.dispose()
+        os.remove(self._db_path)
+
+    def _connect(self):
+        return self._engine.connect()
+
+    def test_checkout_overflow(self):
+        conns = [self._connect() for _ in range(3)]
+        for conn in conns:
+            conn.execute(sa_text("SELECT 1"))
+        actual = self._metrics.snapshot()
+        self.assertEqual(actual["pool_class"], "QueuePool")
+        self.assertEqual(actual["size"], 2)
+        self.assertEqual(actual["checked_out"], 3)
+        self.assertEqual(actual["overflow"], 1)
+        self.assertEqual(actual["num_connects"], 3)
+        self.assertEqual(actual["max_checked_out"], 3)
+        self.assertEqual(actual["num_drained"], 3)
+        self.assertEqual(actual["connect"]["count"], 3)
+        self.assertGreater(actual["connect"]["total_secs"], 0)
+        self.assertEqual(actual["hold"]["count"], 0)
+        for conn in conns:
+            conn.close()
+        actual = self._metrics.snapshot()
+        self.assertEqual(actual["checked_out"], 0)
+        self.assertEqual(actual["checked_in"], 2)
+        self.assertEqual(actual["num_checkins"], 3)
+        self.assertEqual(actual["hold"]["count"], 3)
+        self.assertGreater(actual["hold"]["max_secs"], 0)
+        # reuse the connections in the pool
+        with self._connect() as conn:
+            conn.execute(sa_text("SELECT 1"))
+        actual = self._metrics.snapshot()
+        self.assertEqual(actual["num_connects"], 3)
+        self.assertEqual(actual["num_checkouts"], 4)
+        self.assertEqual(actual["num_drained"], 3)
+        self.assertEqual(actual["connect"]["count"], 3)
+        self.assertEqual(actual["hold"]["count"], 4)
+
+    def test_timeout(self):
+        conns = [self._connect() for _ in range(3)]
+        with self.assertRaises(SqlAlTimeoutError):
+            self._connect()
+        actual = self._metrics.snapshot()
+        self.assertEqual(actual["num_checkouts"], 3)
+        self.assertEqual(actual["connect"]["count"], 3)
+        for conn in conns:
+            conn.close()
+        self._metrics.reset()
+        actual = self._metrics.snapshot()
+        self.assertEqual(actual["num_drained"], 0)
+        self.assertEqual(actual["hold"]["avg_secs"], 0)
+        # checkout before reset is not measured
+        conn = self._connect()
+        self._metrics.reset()
+        conn.close()
+        actual = self._metrics.snapshot()
+        self.assertEqual(actual["num_checkins"], 1)
+        self.assertEqual(actual["hold"]["count"], 0)
+
+    def test_engine_disposed(self):
+        self._engine.dispose()
+        with self._connect() as conn:
+            conn.execute(sa_text("SELECT 1"))
+        actual = self._metrics.snapshot()
+        self.assertEqual(actual["connect"]["count"], 1)
+        self.assertEqual(actual["num_checkouts"], 1)
+        self.assertEqual(actual["hold"]["count"], 1)
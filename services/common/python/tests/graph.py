@@ -1,6 +1,84 @@
+import random
 import unittest
 
-from ecommerce_common.util.graph import is_graph_cyclic, path_exists
+from ecommerce_common.util.graph import (
+    find_cycle,
+    is_graph_cyclic,
+    path_exists,
+)
+
+
+# the recursive implementation used before, as reference in the tests below
+def _legacy_dfs(graph: dict, node, visited: dict, parent, is_directed, options):
+    visited[node] = True
+    options["node_visited"].append(node)
+
+    def _visit_fn(adj):
+        if not visited[adj]:
+            _legacy_dfs(graph, adj, visited, node, is_directed, options)
+        elif adj != parent:
+            options["has_cycle"] = True
+
+    tuple(map(_visit_fn, graph[node]["outbound"]))
+    if not is_directed:
+        tuple(map(_visit_fn, graph[node]["inbound"]))
+
+
+def legacy_is_graph_cyclic(graph: dict, is_directed=False):
+    visited = {k: False for k in graph.keys()}
+    subgraph = {"has_cycle": False, "node_visited": []}
+    while True:
+        node_id = list(visited.keys())[0]
+        _legacy_dfs(graph, node_id, visited, -1, False, subgraph)
+        if subgraph["has_cycle"]:
+            break
+        if False not in visited.values():
+            return False, None
+        visited = {k: v for k, v in sorted(visited.items(), key=lambda item: item[1])}
+        subgraph["node_visited"].clear()
+    loop_node_list = subgraph["node_visited"]
+    if is_directed and not legacy_path_exists(
+        graph, loop_node_list[0], loop_node_list[0]
+    ):
+        return False, None
+    return True, loop_node_list
+
+
+def legacy_path_exists(graph: dict, node_src, node_dst, is_directed=True):
+    visited = {k: False for k in graph.keys()}
+    subgraph = {"has_cycle": False, "node_visited": []}
+    _legacy_dfs(graph, node_src, visited, -1, is_directed, subgraph)
+    return visited[node_src] and visited[node_dst]
+
+
+def gen_graph(num_nodes: int, num_edges: int = 0, max_inbound=None) -> dict:
+    """
+    random directed graph with the same structure as the graph built in
+    `TreeNodesLoopValidator` , if `max_inbound` is 1 , each node has at most
+    one parent, which is a forest possibly containing cycles
+    """
+    graph = {n: {"outbound": set(), "inbound": []} for n in range(num_nodes)}
+    for _ in range(num_edges):
+        src, dst = random.randrange(num_nodes), random.randrange(num_nodes)
+        if max_inbound is not None and len(graph[dst]["inbound"]) >= max_inbound:
+            continue
+        if dst in graph[src]["outbound"]:
+            continue
+        graph[src]["outbound"].add(dst)
+        graph[dst]["inbound"].append(src)
+    return graph
+
+
+def gen_chain(num_nodes: int, cyclic: bool = False) -> dict:
+    graph = {
+        n: {"outbound": {n + 1}, "inbound": [n - 1]} for n in range(1, num_nodes - 1)
+    }
+    graph[0] = {"outbound": {1}, "inbound": []}
+    graph[num_nodes - 1] = {"outbound": set(), "inbound": [num_nodes - 2]}
+    if cyclic:
+        graph[num_nodes - 1]["outbound"].add(0)
+        graph[0]["inbound"].append(num_nodes - 1)
+    return graph
 
 
 class CycleDetectionTestCase(unittest.TestCase):
@@ -118,3 +196,80 @@ class PathExistTestCase(unittest.TestCase):
         self.assertTrue(result)
         result = path_exists(graph=graph, node_src=9, node_dst=2)
         self.assertFalse(result)
+
+
+class IterativeSearchPropertyTestCase(unittest.TestCase):
+    num_samples = 300
+
+    def setUp(self):
+        random.seed(1357)
+
+    def assert_valid_cycle(self, graph, loop_node_list, is_directed):
+        self.assertGreater(len(loop_node_list), 0)
+        self.assertEqual(len(set(loop_node_list)), len(loop_node_list))
+        edges = zip(loop_node_list, loop_node_list[1:] + loop_node_list[:1])
+        for src, dst in edges:
+            adjs = set(graph[src]["outbound"])
+            if not is_directed:
+                adjs.update(graph[src]["inbound"])
+            self.assertIn(dst, adjs)
+
+    def test_directed_forest_match_legacy(self):
+        for _ in range(self.num_samples):
+            num_nodes = random.randrange(1, 40)
+            num_edges = random.randrange(0, num_nodes + 2)
+            graph = gen_graph(num_nodes, num_edges, max_inbound=1)
+            expect, _ = legacy_is_graph_cyclic(graph, is_directed=True)
+            actual, loop_node_list = is_graph_cyclic(graph, is_directed=True)
+            self.assertEqual(actual, expect)
+            if actual:
+                self.assert_valid_cycle(graph, loop_node_list, is_directed=True)
+            else:
+                self.assertIsNone(loop_node_list)
+
+    def test_undirected_match_legacy(self):
+        for _ in range(self.num_samples):
+            num_nodes = random.randrange(1, 40)
+            num_edges = random.randrange(0, num_nodes + 2)
+            graph = gen_graph(num_nodes, num_edges)
+            expect, _ = legacy_is_graph_cyclic(graph, is_directed=False)
+            actual, loop_node_list = is_graph_cyclic(graph, is_directed=False)
+            self.assertEqual(actual, expect)
+            if actual:
+                self.assert_valid_cycle(graph, loop_node_list, is_directed=False)
+
+    def test_directed_general_graph(self):
+        # a directed graph is cyclic if and only if there is an edge (N0, N1)
+        # where N0 can be visited from N1
+        for _ in range(self.num_samples):
+            num_nodes = random.randrange(1, 30)
+            graph = gen_graph(num_nodes, random.randrange(0, num_nodes * 2))
+            expect = any(
+                legacy_path_exists(graph, adj, node)
+                for node, edges in graph.items()
+                for adj in edges["outbound"]
+            )
+            loop_node_list = find_cycle(graph, is_directed=True)
+            self.assertEqual(loop_node_list is not None, expect)
+            if loop_node_list:
+                self.assert_valid_cycle(graph, loop_node_list, is_directed=True)
+
+    def test_path_exists_match_legacy(self):
+        for _ in range(self.num_samples):
+            num_nodes = random.randrange(1, 30)
+            graph = gen_graph(num_nodes, random.randrange(0, num_nodes * 2))
+            src, dst = random.randrange(num_nodes), random.randrange(num_nodes)
+            for is_directed in (True, False):
+                expect = legacy_path_exists(graph, src, dst, is_directed)
+                actual = path_exists(graph, src, dst, is_directed=is_directed)
+                self.assertEqual(actual, expect)
+
+    def test_deep_chain(self):
+        num_nodes = 50000
+        graph = gen_chain(num_nodes)
+        self.assertEqual(is_graph_cyclic(graph, is_directed=True), (False, None))
+        self.assertTrue(path_exists(graph, 0, num_nodes - 1))
+        self.assertFalse(path_exists(graph, num_nodes - 1, 0))
+        graph = gen_chain(num_nodes, cyclic=True)
+        loop_node_list = find_cycle(graph, is_directed=True)
+        self.assertListEqual(sorted(loop_node_list), list(range(num_nodes)))
@@ -0,0 +1,323 @@
+import random
+import sqlite3
+import unittest
+from unittest.mock import patch
+
+from ecommerce_common.models.db import (
+    get_sql_table_pk_gap_ranges,
+    get_sql_table_pk_gap_ranges_cte,
+)
+from ecommerce_common.models.mixins import (
+    ExpiringIdSet,
+    IdBlockAllocator,
+    IdGapNumberFinder,
+)
+
+
+class _Record:
+    def __init__(self, id_=None):
+        self.id = id_
+
+
+class _SqliteFinder(IdGapNumberFinder):
+    MAX_GAP_VALUE = 100000
+
+    def __new__(cls, orm_model_class, conn, *args, **kwargs):
+        instance = super().__new__(cls, orm_model_class, *args, **kwargs)
+        instance._conn = conn
+        return instance
+
+    def expected_db_errors(self):
+        return (sqlite3.IntegrityError,)
+
+    def is_db_err_recoverable(self, error) -> bool:
+        return "UNIQUE" in error.args[0]
+
+    def low_lvl_get_gap_range(self, raw_sql_queries) -> list:
+        out = []
+        for query in raw_sql_queries:
+            out.extend(self._conn.execute(query).fetchall())
+        return out
+
+    def get_pk_db_column(self, model_cls) -> str:
+        return "id"
+
+    def get_db_table_name(self, model_cls) -> str:
+        return "utest_record"
+
+    def extract_dup_id_from_error(self, error):
+        return error.dup_id
+
+
+def _brute_force_gaps(ids, max_value):
+    out, lower = [], 1
+    for pk in sorted(ids):
+        if lower < pk:
+            out.append((lower, pk - 1))
+        lower = pk + 1
+    if ids and lower <= max_value:
+        out.append((lower, max_value))
+    return out
+
+
+class GapRangeQueryTestCase(unittest.TestCase):
+    def setUp(self):
+        self._conn = sqlite3.connect(":memory:")
+        self._conn.execute("CREATE TABLE utest_record (id INTEGER PRIMARY KEY)")
+
+    def tearDown(self):
+        self._conn.close()
+
+    def _load_gaps(self, ids, max_value, max_num_gaps=8):
+        self._conn.execute("DELETE FROM utest_record")
+        self._conn.executemany(
+            "INSERT INTO utest_record VALUES (?)", [(i,) for i in ids]
+        )
+        raw_sql_queries = get_sql_table_pk_gap_ranges(
+            db_table="utest_record",
+            pk_db_column="id",
+            max_value=max_value,
+            max_num_gaps=max_num_gaps,
+        )
+        out = []
+        for query in raw_sql_queries:
+            out.extend(self._conn.execute(query).fetchall())
+        return out
+
+    def test_edge_cases(self):
+        self.assertListEqual(self._load_gaps([], 50), [])
+        self.assertListEqual(self._load_gaps([1], 50), [(2, 50)])
+        self.assertListEqual(self._load_gaps([50], 50), [(1, 49)])
+        self.assertListEqual(self._load_gaps(list(range(1, 51)), 50), [])
+        self.assertListEqual(self._load_gaps([1, 2, 9, 10], 10), [(3, 8)])
+
+    def test_match_brute_force(self):
+        for _ in range(20):
+            ids = random.sample(range(1, 300), k=random.randrange(2, 150))
+            actual = self._load_gaps(ids, max_value=300, max_num_gaps=300)
+            expect = _brute_force_gaps(ids, max_value=300)
+            self.assertListEqual(sorted(actual), expect)
+
+    def test_limit_num_gaps(self):
+        ids = list(range(1, 100, 2))
+        actual = self._load_gaps(ids, max_value=100, max_num_gaps=8)
+        # no head gap, 8 internal gaps at most, 1 tail gap
+        self.assertEqual(len(actual), 9)
+        self.assertTupleEqual(actual[-1], (100, 100))
+
+    def test_single_cte_query_equivalent(self):
+        cases = [
+            ([], 50, 8),
+            ([1], 50, 8),
+            ([50], 50, 8),
+            (list(range(1, 51)), 50, 8),
+            (list(range(1, 100, 2)), 100, 8),
+            (list(range(2, 100, 3)), 100, 300),
+        ]
+        for _ in range(20):
+            ids = random.sample(range(1, 300), k=random.randrange(1, 150))
+            cases.append((ids, 300, random.choice([1, 8, 300])))
+        for ids, max_value, max_num_gaps in cases:
+            expect = self._load_gaps(ids, max_value, max_num_gaps)
+            self._conn.execute("DELETE FROM utest_record")
+            self._conn.executemany(
+                "INSERT INTO utest_record VALUES (?)", [(i,) for i in ids]
+            )
+            query = get_sql_table_pk_gap_ranges_cte(
+                db_table="utest_record",
+                pk_db_column="id",
+                max_value=max_value,
+                max_num_gaps=max_num_gaps,
+            )
+            actual = self._conn.execute(query).fetchall()
+            self.assertListEqual(actual, sorted(expect))
+
+
+class IdBlockAllocatorTestCase(unittest.TestCase):
+    def test_reserve_within_gaps(self):
+        gap_ranges = [(3, 8), (20, 29), (100, 100)]
+        allocator = IdBlockAllocator(block_size=4)
+        allocator.refill(gap_ranges)
+        self.assertEqual(allocator.num_available, 17)
+        reserved = allocator.reserve(17)
+        self.assertEqual(len(set(reserved)), 17)
+        expect = {i for lower, upper in gap_ranges for i in range(lower, upper + 1)}
+        self.assertSetEqual(set(reserved), expect)
+        self.assertEqual(allocator.num_available, 0)
+        self.assertListEqual(allocator.reserve(1), [])
+
+    def test_ignore_invalid_ranges(self):
+        allocator = IdBlockAllocator(block_size=16)
+        allocator.refill([(10, 9), (5, 5)])
+        self.assertListEqual(allocator.reserve(3), [5])
+
+    def test_refill_discards_reserved(self):
+        allocator = IdBlockAllocator(block_size=8)
+        allocator.refill([(1, 1000)])
+        first = allocator.reserve(1)
+        self.assertEqual(allocator.num_available, 999)
+        allocator.refill([(2000, 2001)])
+        self.assertEqual(allocator.num_available, 2)
+        self.assertNotIn(first[0], allocator.reserve(2))
+
+
+class ReservedIdSaveTestCase(unittest.TestCase):
+    def setUp(self):
+        self._conn = sqlite3.connect(":memory:")
+        self._conn.execute("CREATE TABLE utest_record (id INTEGER PRIMARY KEY)")
+        IdGapNumberFinder._finder_orm_map.clear()
+        self._finder = _SqliteFinder(orm_model_class=_Record, conn=self._conn)
+        self._num_saved_calls = 0
+
+    def tearDown(self):
+        IdGapNumberFinder._finder_orm_map.clear()
+        self._conn.close()
+
+    def _save_fn(self, objs):
+        self._num_saved_calls += 1
+        try:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO utest_record VALUES (?)", [(o.id,) for o in objs]
+                )
+        except sqlite3.IntegrityError as e:
+            existing = self._conn.execute(
+                "SELECT id FROM utest_record WHERE id IN (%s)"
+                % ",".join(str(o.id) for o in objs)
+            ).fetchone()
+            e.dup_id = existing[0]
+            raise
+
+    def test_bulk_insert_no_retry(self):
+        existing = random.sample(range(1, 1001), k=700)
+        self._conn.executemany(
+            "INSERT INTO utest_record VALUES (?)", [(i,) for i in existing]
+        )
+        for _ in range(5):
+            objs = [_Record() for _ in range(40)]
+            self._num_saved_calls = 0
+            self._finder.save_with_reserved_ids(lambda: self._save_fn(objs), objs)
+            self.assertEqual(self._num_saved_calls, 1)
+            self.assertTrue(all(1 <= o.id <= _SqliteFinder.MAX_GAP_VALUE for o in objs))
+        num_rows = self._conn.execute("SELECT COUNT(*) FROM utest_record").fetchone()
+        self.assertEqual(num_rows[0], 900)
+
+    def test_fallback_random_id(self):
+        self._finder._id_allocator.refill([(1, 2)])
+        self._finder._refill_id_allocator = lambda gap_ranges: None
+        objs = [_Record() for _ in range(5)]
+        self._finder.save_with_reserved_ids(lambda: self._save_fn(objs), objs)
+        self.assertEqual(len({o.id for o in objs}), 5)
+        self.assertSetEqual({1, 2}, {o.id for o in objs[:2]})
+
+    def test_empty_table(self):
+        objs = [_Record() for _ in range(10)] + [_Record(id_=7)]
+        self._finder.save_with_reserved_ids(lambda: self._save_fn(objs), objs)
+        self.assertEqual(self._num_saved_calls, 1)
+        self.assertEqual(len({o.id for o in objs}), 11)
+
+    def test_recover_from_concurrent_insert(self):
+        objs = [_Record() for _ in range(3)]
+        self._finder.save_with_reserved_ids(lambda: self._save_fn(objs), objs)
+        # another process takes the ID numbers this process reserved
+        upcoming = self._finder._id_allocator.reserve(3)
+        self._finder._id_allocator.refill([(i, i) for i in upcoming])
+        self._conn.execute("INSERT INTO utest_record VALUES (?)", (upcoming[0],))
+        self._conn.commit()
+        objs = [_Record() for _ in range(3)]
+        self._num_saved_calls = 0
+        self._finder.save_with_reserved_ids(lambda: self._save_fn(objs), objs)
+        self.assertEqual(self._num_saved_calls, 2)
+        self.assertNotIn(upcoming[0], [o.id for o in objs])
+
+    def test_app_caller_duplicate(self):
+        objs = [_Record(id_=5), _Record(id_=5)]
+        with self.assertRaises(ValueError):
+            self._finder.save_with_reserved_ids(lambda: self._save_fn(objs), objs)
+
+
+class ExpiringIdSetTestCase(unittest.TestCase):
+    def test_expiry(self):
+        ids = ExpiringIdSet(max_entries=10, ttl_secs=5)
+        ids.add(123, now=100)
+        ids.add(456, now=103)
+        self.assertTrue(ids.contains(123, now=104.9))
+        self.assertFalse(ids.contains(123, now=105))
+        self.assertTrue(ids.contains(456, now=105))
+        self.assertEqual(len(ids), 1)
+
+    def test_bounded(self):
+        ids = ExpiringIdSet(max_entries=3, ttl_secs=60)
+        for i in range(5):
+            ids.add(i, now=100 + i)
+        self.assertEqual(len(ids), 3)
+        self.assertFalse(ids.contains(1, now=105))
+        self.assertTrue(ids.contains(2, now=105))
+        # re-adding an ID refreshes its expiry
+        ids.add(2, now=106)
+        ids.add(5, now=107)
+        self.assertTrue(ids.contains(2, now=107))
+        self.assertFalse(ids.contains(3, now=107))
+
+
+class GapRangeCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self._conn = sqlite3.connect(":memory:")
+        self._conn.execute("CREATE TABLE utest_record (id INTEGER PRIMARY KEY)")
+        self._conn.executemany(
+            "INSERT INTO utest_record VALUES (?)", [(i,) for i in (3, 4, 9)]
+        )
+        self._conn.commit()
+        IdGapNumberFinder._finder_orm_map.clear()
+        self._finder = _SqliteFinder(orm_model_class=_Record, conn=self._conn)
+
+    def tearDown(self):
+        IdGapNumberFinder._finder_orm_map.clear()
+        self._conn.close()
+
+    def _save_fn(self, objs):
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO utest_record VALUES (?)", [(o.id,) for o in objs]
+            )
+
+    def test_reuse_until_outdated(self):
+        finder = self._finder
+        max_value = finder.MAX_GAP_VALUE
+        gap_ranges = finder.get_gap_ranges(max_value)
+        self.assertListEqual(gap_ranges, [(1, 2), (5, 8), (10, max_value)])
+        finder.get_gap_ranges(max_value)
+        self.assertDictEqual(
+            finder.stats, {"gap_cache_hit": 1, "gap_cache_miss": 1, "collision": 0}
+        )
+        # outdated by number of saved instances
+        objs = [_Record(id_=i) for i in (1, 2)]
+        with patch.object(_SqliteFinder, "GAP_RANGES_MAX_INSERTS", 2):
+            finder.save_with_rand_id(lambda: self._save_fn(objs), objs)
+            gap_ranges = finder.get_gap_ranges(max_value)
+        self.assertListEqual(gap_ranges, [(5, 8), (10, max_value)])
+        self.assertEqual(finder.stats["gap_cache_miss"], 2)
+        # outdated by elapsed time
+        with patch.object(_SqliteFinder, "GAP_RANGES_TTL_SECS", 0):
+            finder.get_gap_ranges(max_value)
+        self.assertEqual(finder.stats["gap_cache_miss"], 3)
+        finder.reset_stats()
+        self.assertFalse(any(finder.stats.values()))
+
+    def test_count_collision(self):
+        objs = [_Record(id_=3)]
+
+        def save_fn():
+            try:
+                self._save_fn(objs)
+            except sqlite3.IntegrityError as e:
+                e.dup_id = objs[0].id
+                raise
+
+        with patch.object(_SqliteFinder, "_set_random_id"):
+            self._finder.save_with_rand_id(save_fn, objs)
+        self.assertNotIn(objs[0].id, (3, 4, 9))
+        self.assertIn(3, self._finder._recent_invalid_ids)
+        self.assertEqual(self._finder.stats["collision"], 1)
+        self._finder.clean_gap_ranges(max_value=_SqliteFinder.MAX_GAP_VALUE)
+        self.assertEqual(len(self._finder._recent_invalid_ids), 0)
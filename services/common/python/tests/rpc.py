@@ -1,18 +1,34 @@
 import os
 import socket
 import time
+import asyncio
+import threading
 import unittest
 from unittest.mock import patch, MagicMock
 
+from celery import Celery
+from kombu import Connection
+
 from ecommerce_common.logging.logger import ExtendedLogger
+from ecommerce_common.util.messaging.constants import RPC_ROUTE_KEY_PATTERN_SEND
 from ecommerce_common.util.messaging.rpc import (
     RPCproxy,
+    ReplyListener,
     RpcReplyEvent,
+    AsyncRPCproxy,
+    AsyncRpcReplyEvent,
+    DispatchedRpcReplyEvent,
+    RpcBatch,
+    dispatch_rpc_batch,
+    get_rpc_exchange,
     KombuQueue,
     KombuOperationalError,
 )
 from ecommerce_common.util.messaging.amqp import (
     AMQPQueueConsumer,
+    ProducerPool,
+    clear_producer_pools,
+    get_producer_pool,
     KombuProducer,
     KombuConsumerMixin,
     UndeliverableMessage,
@@ -28,11 +44,13 @@ class RpcProxyTestCase(unittest.TestCase):
 
     def tearDown(self):
         del self.mocked_channel
+        # producers created with mocked connections should not be reused
+        clear_producer_pools()
 
     # Note that the patch works ONLY in the function it is imported to,
     # NOT the function where it is originally declared.
     # https://stackoverflow.com/questions/8575713/
-    @patch("ecommerce_common.util.messaging.rpc.get_connection")
+    @patch.object(ProducerPool, attribute="_create_connection")
     @patch.object(KombuConsumerMixin, attribute="consume")
     @patch.object(KombuProducer, attribute="publish")
     @patch.object(KombuQueue, attribute="delete")
@@ -43,9 +61,7 @@ class RpcProxyTestCase(unittest.TestCase):
         prod_pub.return_value = "msg published"
         q_rm.return_value = "my-queue-1 removed"
         def_conn.return_value.default_channel = self.mocked_channel
-        ctx_mgr.return_value.__enter__.return_value.default_channel = (
-            self.mocked_channel
-        )
+        ctx_mgr.return_value.default_channel = self.mocked_channel
         rpc1 = RPCproxy(
             dst_app_name="remote-site-1",
             src_app_name="local-app",
@@ -95,7 +111,7 @@ class RpcProxyTestCase(unittest.TestCase):
 
     ## end of def test_pubsub_ok
 
-    @patch("ecommerce_common.util.messaging.rpc.get_connection")
+    @patch.object(ProducerPool, attribute="_create_connection")
     @patch.object(KombuProducer, attribute="publish")
     @patch.object(KombuQueue, attribute="delete")
     @patch.object(KombuQueue, attribute="declare")
@@ -104,7 +120,7 @@ class RpcProxyTestCase(unittest.TestCase):
         q_create.return_value = "my-queue-1 created"
         q_rm.return_value = "my-queue-1 removed"
         def_conn.return_value.default_channel = self.mocked_channel
-        ctx_mgr.return_value.__enter__.side_effect = KombuOperationalError(
+        ctx_mgr.side_effect = KombuOperationalError(
             "Errno 111 Unit Test Connection Error"
         )
         rpc1 = RPCproxy(
@@ -120,7 +136,7 @@ class RpcProxyTestCase(unittest.TestCase):
         q_rm.assert_not_called()
         del rpc1
 
-    @patch("ecommerce_common.util.messaging.rpc.get_connection")
+    @patch.object(ProducerPool, attribute="_create_connection")
     @patch.object(KombuProducer, attribute="publish")
     @patch.object(KombuQueue, attribute="delete")
     @patch.object(KombuQueue, attribute="declare")
@@ -129,9 +145,7 @@ class RpcProxyTestCase(unittest.TestCase):
         q_create.return_value = "my-queue-1 created"
         q_rm.return_value = "my-queue-1 removed"
         def_conn.return_value.default_channel = self.mocked_channel
-        ctx_mgr.return_value.__enter__.return_value.default_channel = (
-            self.mocked_channel
-        )
+        ctx_mgr.return_value.default_channel = self.mocked_channel
         prod_pub.side_effect = UndeliverableMessage(
             exchange="ut-exchange", routing_key="utest.app.method"
         )
@@ -148,7 +162,7 @@ class RpcProxyTestCase(unittest.TestCase):
         q_rm.assert_not_called()
         del rpc1
 
-    @patch("ecommerce_common.util.messaging.rpc.get_connection")
+    @patch.object(ProducerPool, attribute="_create_connection")
     @patch.object(KombuConsumerMixin, attribute="consume")
     @patch.object(KombuProducer, attribute="publish")
     @patch.object(KombuQueue, attribute="delete")
@@ -159,9 +173,7 @@ class RpcProxyTestCase(unittest.TestCase):
         prod_pub.return_value = "msg published"
         q_rm.return_value = "my-queue-1 removed"
         def_conn.return_value.default_channel = self.mocked_channel
-        ctx_mgr.return_value.__enter__.return_value.default_channel = (
-            self.mocked_channel
-        )
+        ctx_mgr.return_value.default_channel = self.mocked_channel
         reply_wait_max_secs = 1
         rpc1 = RPCproxy(
             dst_app_name="remote-site-1",
@@ -198,7 +210,7 @@ class RpcProxyTestCase(unittest.TestCase):
         q_rm.assert_not_called()
         del rpc1
 
-    @patch("ecommerce_common.util.messaging.rpc.get_connection")
+    @patch.object(ProducerPool, attribute="_create_connection")
     @patch.object(KombuConsumerMixin, attribute="consume")
     @patch.object(KombuProducer, attribute="publish")
     @patch.object(KombuQueue, attribute="delete")
@@ -211,9 +223,7 @@ class RpcProxyTestCase(unittest.TestCase):
         prod_pub.return_value = "msg published"
         q_rm.return_value = "my-queue-1 removed"
         def_conn.return_value.default_channel = self.mocked_channel
-        ctx_mgr.return_value.__enter__.return_value.default_channel = (
-            self.mocked_channel
-        )
+        ctx_mgr.return_value.default_channel = self.mocked_channel
         rpc1 = RPCproxy(
             dst_app_name="remote-site-1",
             src_app_name="local-app",
@@ -265,3 +275,475 @@ class RpcProxyTestCase(unittest.TestCase):
 
 
 ## end of class RpcProxyTestCase
+
+
+class ProducerPoolTestCase(unittest.TestCase):
+    broker_url = "memory://"
+
+    def test_reuse_producer(self):
+        pool = ProducerPool(amqp_uri=self.broker_url)
+        with pool.acquire() as producer1:
+            self.assertEqual(len(pool), 0)
+        with pool.acquire() as producer2:
+            pass
+        self.assertIs(producer1, producer2)
+        self.assertEqual(len(pool), 1)
+        pool.clear()
+        self.assertEqual(len(pool), 0)
+
+    def test_discard_on_failure(self):
+        pool = ProducerPool(amqp_uri=self.broker_url)
+        with pool.acquire() as producer1:
+            pass
+        with self.assertRaises(KombuOperationalError):
+            with pool.acquire() as producer2:
+                self.assertIs(producer1, producer2)
+                raise KombuOperationalError("[Errno 104] Connection reset by peer")
+        self.assertEqual(len(pool), 0)
+        with pool.acquire() as producer3:
+            pass
+        self.assertIsNot(producer1, producer3)
+        pool.clear()
+
+    def test_limit_idle_producers(self):
+        pool = ProducerPool(amqp_uri=self.broker_url, limit=1)
+        with pool.acquire():
+            with pool.acquire():
+                pass
+        self.assertEqual(len(pool), 1)
+        pool.clear()
+
+    def test_shared_pool(self):
+        pool1 = get_producer_pool(amqp_uri=self.broker_url)
+        pool2 = get_producer_pool(amqp_uri=self.broker_url)
+        pool3 = get_producer_pool(
+            amqp_uri=self.broker_url, transport_options={"confirm_publish": True}
+        )
+        self.assertIs(pool1, pool2)
+        self.assertIsNot(pool1, pool3)
+        clear_producer_pools()
+        self.assertIsNot(pool1, get_producer_pool(amqp_uri=self.broker_url))
+
+    @patch(
+        "ecommerce_common.util.messaging.rpc._get_amqp_url",
+        return_value=broker_url,
+    )
+    def test_cached_method_proxy(self, _):
+        rpc = RPCproxy(dst_app_name="remote-site-4", src_app_name="local-app")
+        self.assertIs(rpc.drill_holes, rpc.drill_holes)
+        self.assertIsNot(rpc.drill_holes, rpc.fill_holes)
+        with self.assertRaises(AttributeError):
+            rpc._unknown_attribute
+
+
+## end of class ProducerPoolTestCase
+
+
+class MockRemoteServer:
+    """
+    RPC server running in separate thread, it consumes requests from in-memory
+    transport, then reply progress and final result to the reply queue given
+    in each request, the same way Celery workers do
+    """
+
+    def __init__(self, broker_url, dst_app_name, method_name, fn, delay_secs=0):
+        self._conn = Connection(broker_url)
+        self._fn = fn
+        self._delay_secs = delay_secs
+        routing_key = RPC_ROUTE_KEY_PATTERN_SEND % (dst_app_name, method_name)
+        self._queue = KombuQueue(
+            name=routing_key,
+            exchange=get_rpc_exchange(config={}),
+            routing_key=routing_key,
+        )
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        # declare the request queue before any client publishes to it
+        self._queue(self._conn.default_channel).declare()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        self._thread.join(timeout=3)
+        self._conn.release()
+
+    def _reply(self, body, message):
+        props = message.properties
+        args, kwargs, _ = body
+        producer = self._conn.Producer()
+        for status, result in (
+            (RpcReplyEvent.status_opt.STARTED, None),
+            (RpcReplyEvent.status_opt.SUCCESS, self._fn(*args, **kwargs)),
+        ):
+            time.sleep(self._delay_secs)
+            producer.publish(
+                {"status": status, "result": result},
+                exchange="",
+                routing_key=props["reply_to"],
+                correlation_id=props["correlation_id"],
+                serializer="json",
+            )
+        message.ack()
+
+    def _run(self):
+        with self._conn.Consumer(queues=[self._queue], callbacks=[self._reply]):
+            while not self._stop.is_set():
+                try:
+                    self._conn.drain_events(timeout=0.1)
+                except socket.timeout:
+                    pass
+
+
+class DispatchedRpcProxyTestCase(unittest.TestCase):
+    broker_url = "memory://"
+
+    def setUp(self):
+        self._patcher = patch(
+            "ecommerce_common.util.messaging.rpc._get_amqp_url",
+            return_value=self.broker_url,
+        )
+        self._patcher.start()
+        self.rpc = RPCproxy(
+            dst_app_name="remote-site-3",
+            src_app_name="local-app",
+            reply_dispatcher=True,
+            reply_timeout_sec=3,
+        )
+
+    def tearDown(self):
+        self.rpc._rpc_reply_listener.destroy()
+        self._patcher.stop()
+
+    def test_fan_out_ok(self):
+        num_calls = 10
+        fn = lambda idx: idx + 100
+        with MockRemoteServer(self.broker_url, "remote-site-3", "add", fn):
+            evts = [self.rpc.add(idx=idx) for idx in range(num_calls)]
+            results = [e.wait() for e in evts]
+        for evt in evts:
+            self.assertIsInstance(evt, DispatchedRpcReplyEvent)
+            self.assertTrue(evt.finished)
+        actual = [r["result"] for r in results]
+        expect = [idx + 100 for idx in range(num_calls)]
+        self.assertListEqual(actual, expect)
+        listener = self.rpc._rpc_reply_listener
+        self.assertDictEqual(listener._reply_events, {})
+        self.assertTrue(listener.queue_consumer.running)
+
+    def test_refresh_compatible(self):
+        fn = lambda: "pong"
+        with MockRemoteServer(
+            self.broker_url, "remote-site-3", "ping", fn, delay_secs=0.1
+        ):
+            evt = self.rpc.ping()
+            # the event does not reach final status within the given time
+            err = evt.refresh(retry=False, timeout=0.05)
+            self.assertIsNone(err)
+            self.assertFalse(evt.finished)
+            self.assertFalse(evt.result["timeout"])
+            evt.refresh(retry=False, timeout=1)
+        self.assertTrue(evt.finished)
+        self.assertEqual(evt.result["result"], "pong")
+
+    def test_callers_in_threads(self):
+        num_calls = 8
+        fn = lambda idx: idx * idx
+        results = {}
+
+        def _caller(idx):
+            evt = self.rpc.square(idx=idx)
+            results[idx] = evt.wait(timeout=2)["result"]
+
+        with MockRemoteServer(self.broker_url, "remote-site-3", "square", fn):
+            threads = [
+                threading.Thread(target=_caller, args=(idx,))
+                for idx in range(num_calls)
+            ]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join(timeout=5)
+        self.assertDictEqual(results, {idx: idx * idx for idx in range(num_calls)})
+
+    @patch.object(ReplyListener, "refresh_reply_events")
+    def test_callers_not_serialized(self, mocked_refresh):
+        finished_order = []
+        slow_evt_state = {}
+
+        def _caller(method_name):
+            evt = getattr(self.rpc, method_name)()
+            evt.wait(timeout=3)
+            if method_name == "fast_task":
+                # the slow reply is still pending while this caller returns
+                slow_evt_state["finished"] = slow_evt.finished
+            finished_order.append(method_name)
+
+        slow_server = MockRemoteServer(
+            self.broker_url, "remote-site-3", "slow_task", lambda: 1, delay_secs=0.5
+        )
+        fast_server = MockRemoteServer(
+            self.broker_url, "remote-site-3", "fast_task", lambda: 2
+        )
+        with slow_server, fast_server:
+            slow_evt = self.rpc.slow_task()
+            slow_thread = threading.Thread(target=slow_evt.wait, kwargs={"timeout": 3})
+            slow_thread.start()
+            fast_thread = threading.Thread(target=_caller, args=("fast_task",))
+            fast_thread.start()
+            fast_thread.join(timeout=3)
+            slow_thread.join(timeout=3)
+            finished_order.append("slow_task")
+        self.assertListEqual(finished_order, ["fast_task", "slow_task"])
+        self.assertFalse(slow_evt_state["finished"])
+        self.assertTrue(slow_evt.finished)
+        self.assertEqual(slow_evt.result["result"], 1)
+        # none of the callers drains the reply queue by itself
+        self.assertEqual(mocked_refresh.call_count, 0)
+
+    def test_reply_timeout(self):
+        rpc = RPCproxy(
+            dst_app_name="remote-site-3",
+            src_app_name="local-app",
+            reply_dispatcher=True,
+            reply_timeout_sec=0.2,
+        )
+        fn = lambda: "too late"
+        with MockRemoteServer(
+            self.broker_url, "remote-site-3", "lazy_task", fn, delay_secs=0.4
+        ):
+            evt = rpc.lazy_task()
+            result = evt.wait()
+        self.assertFalse(evt.finished)
+        self.assertTrue(result["timeout"])
+        self.assertDictEqual(rpc._rpc_reply_listener._reply_events, {})
+        rpc._rpc_reply_listener.destroy()
+
+
+## end of class DispatchedRpcProxyTestCase
+
+
+class AsyncRpcProxyTestCase(unittest.IsolatedAsyncioTestCase):
+    broker_url = "memory://"
+
+    def setUp(self):
+        self._patcher = patch(
+            "ecommerce_common.util.messaging.rpc._get_amqp_url",
+            return_value=self.broker_url,
+        )
+        self._patcher.start()
+        self.rpc = AsyncRPCproxy(
+            dst_app_name="remote-site-2",
+            src_app_name="local-app",
+            reply_timeout_sec=3,
+        )
+
+    def tearDown(self):
+        self.rpc._rpc_reply_listener.destroy()
+        self._patcher.stop()
+
+    async def test_call_ok(self):
+        fn = lambda num, deep_mm: {"volume": num * deep_mm}
+        with MockRemoteServer(self.broker_url, "remote-site-2", "drill_holes", fn):
+            evt = await self.rpc.drill_holes(num=2, deep_mm=65)
+        self.assertIsInstance(evt, AsyncRpcReplyEvent)
+        self.assertTrue(evt.finished)
+        self.assertEqual(evt.result["status"], RpcReplyEvent.status_opt.SUCCESS)
+        self.assertEqual(evt.result["result"], {"volume": 130})
+        self.assertFalse(evt.result["timeout"])
+        listener = self.rpc._rpc_reply_listener
+        self.assertDictEqual(listener._reply_events, {})
+        self.assertTrue(listener.queue_consumer.running)
+
+    async def test_concurrent_calls(self):
+        num_calls = 20
+        fn = lambda idx: idx * 3
+        with MockRemoteServer(
+            self.broker_url, "remote-site-2", "multiply", fn, delay_secs=0.01
+        ):
+            coros = [self.rpc.multiply(idx=idx) for idx in range(num_calls)]
+            evts = await asyncio.gather(*coros)
+        actual = [e.result["result"] for e in evts]
+        expect = [idx * 3 for idx in range(num_calls)]
+        self.assertListEqual(actual, expect)
+        corr_ids = set(e.result["corr_id"] for e in evts)
+        self.assertEqual(len(corr_ids), num_calls)
+
+    async def test_loop_not_blocked(self):
+        ticks = []
+
+        async def _ticker():
+            while True:
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        fn = lambda: "done"
+        ticker = asyncio.create_task(_ticker())
+        with MockRemoteServer(
+            self.broker_url, "remote-site-2", "slow_task", fn, delay_secs=0.2
+        ):
+            evt = await self.rpc.slow_task()
+        ticker.cancel()
+        self.assertEqual(evt.result["result"], "done")
+        # the ticker keeps running while the caller awaits the reply
+        self.assertGreater(len(ticks), 10)
+
+    async def test_reply_timeout(self):
+        rpc = AsyncRPCproxy(
+            dst_app_name="remote-site-2",
+            src_app_name="local-app",
+            reply_timeout_sec=0.3,
+        )
+        fn = lambda: "too late"
+        with MockRemoteServer(
+            self.broker_url, "remote-site-2", "lazy_task", fn, delay_secs=0.5
+        ):
+            evt = await rpc.lazy_task()
+        self.assertFalse(evt.finished)
+        self.assertTrue(evt.result["timeout"])
+        # the remote server has not even started processing the request
+        self.assertEqual(evt.result["status"], RpcReplyEvent.status_opt.INITED)
+        self.assertDictEqual(rpc._rpc_reply_listener._reply_events, {})
+        rpc._rpc_reply_listener.destroy()
+
+    async def test_invalid_status_transition(self):
+        listener = self.rpc._rpc_reply_listener
+        evt = listener.get_reply_event(correlation_id="utest-corr-1", timeout_s=1)
+        message = MagicMock()
+        message.properties = {"correlation_id": "utest-corr-1"}
+        # the remote server never reports the task has started
+        listener.handle_message(body={"status": "SUCCESS"}, message=message)
+        result = await evt.wait()
+        self.assertFalse(evt.finished)
+        self.assertFalse(result["timeout"])
+        expect_status = RpcReplyEvent.status_opt.INVALID_STATUS_TRANSITION
+        self.assertEqual(result["status"], expect_status)
+        self.assertDictEqual(listener._reply_events, {})
+
+    @patch.object(KombuProducer, attribute="publish")
+    async def test_publish_fail(self, prod_pub):
+        prod_pub.side_effect = KombuOperationalError("[Errno 111] Connection refused")
+        evt = await self.rpc.drill_holes(num=1, deep_mm=5)
+        self.assertTrue(evt.finished)
+        self.assertEqual(evt.result["status"], RpcReplyEvent.status_opt.FAIL_CONN)
+
+
+## end of class AsyncRpcProxyTestCase
+
+
+class RpcBatchTestCase(unittest.TestCase):
+    broker_url = "memory://"
+
+    @classmethod
+    def setUpClass(cls):
+        cls.celery_app = Celery("utest-batch", broker=cls.broker_url)
+
+        @cls.celery_app.task(bind=True)
+        def get_profile(self, ids, fields):
+            src_app = self.request.headers["src_app"]
+            return [{"id": i, "src": src_app} for i in ids]
+
+        @cls.celery_app.task
+        def divide(a, b):
+            return a / b
+
+        cls.registry = {"get_profile": get_profile, "divide": divide}
+
+    def setUp(self):
+        self._patcher = patch(
+            "ecommerce_common.util.messaging.rpc._get_amqp_url",
+            return_value=self.broker_url,
+        )
+        self._patcher.start()
+        self.rpc = RPCproxy(
+            dst_app_name="remote-site-5",
+            src_app_name="local-app",
+            reply_dispatcher=True,
+            reply_timeout_sec=3,
+        )
+
+    def tearDown(self):
+        self.rpc._rpc_reply_listener.destroy()
+        self._patcher.stop()
+
+    def _mock_batch_task(self):
+        task = MagicMock()
+        task.request.headers = {"src_app": "local-app"}
+        return task
+
+    def test_dispatch(self):
+        calls = [
+            {
+                "method": "get_profile",
+                "args": [],
+                "kwargs": {"ids": [3, 4], "fields": []},
+            },
+            {"method": "divide", "args": [9, 0], "kwargs": {}},
+            {"method": "unknown", "args": [], "kwargs": {}},
+            {"method": "divide", "args": [9, 3], "kwargs": {}},
+        ]
+        results = dispatch_rpc_batch(
+            self._mock_batch_task(), calls=calls, registry=self.registry
+        )
+        self.assertEqual(len(results), len(calls))
+        self.assertEqual(results[0]["status"], RpcReplyEvent.status_opt.SUCCESS)
+        self.assertListEqual(
+            results[0]["result"],
+            [{"id": 3, "src": "local-app"}, {"id": 4, "src": "local-app"}],
+        )
+        self.assertEqual(results[1]["status"], RpcReplyEvent.status_opt.REMOTE_ERROR)
+        self.assertIn("ZeroDivisionError", results[1]["error"])
+        self.assertEqual(results[2]["status"], RpcReplyEvent.status_opt.REMOTE_ERROR)
+        self.assertEqual(results[3]["result"], 3)
+
+    def test_round_trip(self):
+        batch_task = self._mock_batch_task()
+        fn = lambda calls: dispatch_rpc_batch(batch_task, calls, self.registry)
+        batch = self.rpc.batch()
+        idx0 = batch.add("get_profile", ids=[5], fields=["id"])
+        idx1 = batch.add("divide", 8, 2)
+        idx2 = batch.add("divide", 8, 0)
+        with MockRemoteServer(self.broker_url, "remote-site-5", "batch_dispatch", fn):
+            evt = batch.send()
+            evt.wait()
+        self.assertEqual(evt.result["status"], RpcReplyEvent.status_opt.SUCCESS)
+        results = batch.demux(evt.result)
+        self.assertEqual(len(results), 3)
+        self.assertListEqual(results[idx0]["result"], [{"id": 5, "src": "local-app"}])
+        self.assertEqual(results[idx1]["result"], 4)
+        self.assertEqual(results[idx2]["status"], RpcReplyEvent.status_opt.REMOTE_ERROR)
+        for item in results:
+            self.assertEqual(item["corr_id"], evt.result["corr_id"])
+
+    def test_demux_batch_failure(self):
+        batch = RpcBatch(proxy=self.rpc)
+        batch.add("divide", 1, 2)
+        batch.add("divide", 3, 4)
+        batch_result = {
+            "status": RpcReplyEvent.status_opt.FAIL_CONN,
+            "result": None,
+            "timeout": False,
+            "corr_id": "utest-corr-id",
+            "error": "[Errno 111] Connection refused",
+        }
+        results = batch.demux(batch_result)
+        self.assertEqual(len(results), 2)
+        for item in results:
+            self.assertEqual(item["status"], RpcReplyEvent.status_opt.FAIL_CONN)
+            self.assertEqual(item["error"], batch_result["error"])
+        # number of results mismatch
+        batch_result.update(
+            {"status": RpcReplyEvent.status_opt.SUCCESS, "result": [{}], "error": None}
+        )
+        results = batch.demux(batch_result)
+        for item in results:
+            self.assertEqual(item["status"], RpcReplyEvent.status_opt.REMOTE_ERROR)
+
+    def test_empty_batch(self):
+        with self.assertRaises(AssertionError):
+            self.rpc.batch().send()
+
+
+## end of class RpcBatchTestCase
@@ -1,16 +1,26 @@
+import os
 import logging
-from typing import List
+from pathlib import Path
+from typing import Dict, List
 
 from celery.backends.rpc import RPCBackend as CeleryRpcBackend
 
-from ecommerce_common.util.messaging.constants import RPC_EXCHANGE_DEFAULT_NAME
+from ecommerce_common.util.messaging.constants import (
+    RPC_EXCHANGE_DEFAULT_NAME,
+    RPC_BATCH_METHOD_NAME,
+)
+from ecommerce_common.util.messaging.rpc import dispatch_rpc_batch
 from ecommerce_common.util.celery import app as celery_app
 from ecommerce_common.logging.util import log_fn_wrapper
+from softdelete.retention import purge_expired_softdeleted
 
+from .models.common import ProductmgtChangeSet, DB_ALIAS_APPLIED
 from .serializers.base import SaleableItemSerializer, SaleablePackageSerializer
 
 _logger = logging.getLogger(__name__)
 
+srv_basepath = Path(os.environ["SYS_BASE_PATH"]).resolve(strict=True)
+
 
 @celery_app.task(
     backend=CeleryRpcBackend(app=celery_app),
@@ -56,3 +66,33 @@ def get_product(
         serializer = serializer_cls(many=True, instance=qset, context=extra_context)
         out[_info["output_key"]] = serializer.data
     return out
+
+
+@celery_app.task(
+    backend=CeleryRpcBackend(app=celery_app),
+    queue="rpc_productmgt_batch_dispatch",
+    bind=True,
+    exchange=RPC_EXCHANGE_DEFAULT_NAME,
+    routing_key="rpc.product.%s" % RPC_BATCH_METHOD_NAME,
+)
+@log_fn_wrapper(logger=_logger, loglevel=logging.WARNING, log_if_succeed=False)
+def batch_dispatch(self, calls: List[Dict]) -> List[Dict]:
+    """run several RPC invocations packed by `RpcBatch` in one go"""
+    registry = {"get_product": get_product}
+    return dispatch_rpc_batch(self, calls=calls, registry=registry)
+
+
+@celery_app.task(queue="productmgt_default")
+@log_fn_wrapper(logger=_logger, loglevel=logging.INFO)
+def purge_softdeleted_data(days, batch_size=100, max_batches=10, archive=False):
+    archive_location = None
+    if archive:
+        archive_location = srv_basepath.joinpath("tmp/archive/product")
+    return purge_expired_softdeleted(
+        changeset_cls=ProductmgtChangeSet,
+        days=days,
+        batch_size=batch_size,
+        max_batches=max_batches,
+        using=DB_ALIAS_APPLIED,
+        archive_location=archive_location,
+    )
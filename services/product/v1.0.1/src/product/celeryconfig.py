@@ -34,6 +34,7 @@ def init_rpc(app):
     from ecommerce_common.util.messaging.constants import (
         RPC_EXCHANGE_DEFAULT_NAME,
         RPC_EXCHANGE_DEFAULT_TYPE,
+        RPC_BATCH_METHOD_NAME,
     )
 
     exchange = kombu.Exchange(
@@ -42,9 +43,19 @@ def init_rpc(app):
     # determine a list of task queues used at here, you don't need to
     # give option -Q at Celery command line
     app.conf.task_queues = [
+        kombu.Queue(
+            "productmgt_default",
+            routing_key="productmgt_default",
+            exchange=kombu.Exchange(name="productmgt_default", type="direct"),
+        ),
         kombu.Queue(
             "rpc_productmgt_get_product",
             exchange=exchange,
             routing_key="rpc.product.get_product",
         ),
+        kombu.Queue(
+            "rpc_productmgt_batch_dispatch",
+            exchange=exchange,
+            routing_key="rpc.product.%s" % RPC_BATCH_METHOD_NAME,
+        ),
     ]
@@ -0,0 +1,57 @@
+from django.db import migrations, models
+import softdelete.models
+
+
+def _backfill_object_hash(apps, schema_editor):
+    for model_name in ("ProductmgtChangeSet", "ProductmgtSoftDeleteRecord"):
+        model_cls = apps.get_model("product", model_name)
+        softdelete.models.backfill_object_hash(
+            model_cls, using=schema_editor.connection.alias
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("product", "0002_rawsqls"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productmgtchangeset",
+            name="object_hash",
+            field=softdelete.models.ObjectIdHashField(
+                db_column="object_hash", db_index=True, editable=False, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="productmgtsoftdeleterecord",
+            name="object_hash",
+            field=softdelete.models.ObjectIdHashField(
+                db_column="object_hash", db_index=True, editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(
+            _backfill_object_hash, reverse_code=migrations.RunPython.noop
+        ),
+        migrations.AlterField(
+            model_name="productmgtchangeset",
+            name="object_hash",
+            field=softdelete.models.ObjectIdHashField(
+                db_column="object_hash", db_index=True, editable=False
+            ),
+        ),
+        migrations.AlterField(
+            model_name="productmgtsoftdeleterecord",
+            name="object_hash",
+            field=softdelete.models.ObjectIdHashField(
+                db_column="object_hash", db_index=True, editable=False
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productmgtchangeset",
+            index=models.Index(
+                fields=["content_type", "done_by", "time_created"],
+                name="productmgt_cset_newest_idx",
+            ),
+        ),
+    ]
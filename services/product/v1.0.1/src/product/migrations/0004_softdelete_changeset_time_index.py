@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("product", "0003_softdelete_object_hash"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="productmgtchangeset",
+            index=models.Index(
+                fields=["time_created"], name="productmgt_cset_time_idx"
+            ),
+        ),
+    ]
@@ -69,22 +69,13 @@ class AppIdGapNumberFinder(IdGapNumberFinder):
         out = []
         db_conn = db_conns_map[DB_ALIAS_APPLIED]
         # currently this service does not enable multi-statement capability flag in MariaDB
-        # connection arguments, the 3 raw-SQL queries have to be executed one after another in
-        # different network flights
+        # connection arguments, by default the gap ranges are computed by single CTE query,
+        # otherwise the raw-SQL queries are executed one after another in different network
+        # flights
         with db_conn.cursor() as cursor:  # the connection has to be DB-API 2.0 compliant
-            cursor.execute(raw_sql_queries[0])
-            row = cursor.fetchone()
-            if row:
-                out.append(row)
-            # cursor.nextset() should be `None`, means no more result set
-            cursor.execute(raw_sql_queries[1])
-            rows = cursor.fetchall()
-            out.extend(rows)
-            # cursor.nextset()
-            cursor.execute(raw_sql_queries[2])
-            row = cursor.fetchone()
-            if row:
-                out.append(row)
+            for query in raw_sql_queries:
+                cursor.execute(query)
+                out.extend(cursor.fetchall())
         return out
 
     def get_pk_db_column(self, model_cls) -> str:
@@ -100,6 +91,19 @@ class AppIdGapNumberFinder(IdGapNumberFinder):
         return mysql_extract_dup_id_from_error(error)
 
 
+# one finder per model, the cached gap ranges and reserved ID blocks have to
+# outlive the querysets which Django clones on every manager call
+_id_gap_finders = {}
+
+
+def get_id_gap_finder(model_cls) -> AppIdGapNumberFinder:
+    finder = _id_gap_finders.get(model_cls)
+    if finder is None:
+        finder = AppIdGapNumberFinder(orm_model_class=model_cls)
+        _id_gap_finders[model_cls] = finder
+    return finder
+
+
 class UniqueIdentifierMixin(models.Model):
     """
     the mixin provides 4-byte integer as primary key, key generating function,
@@ -122,7 +126,7 @@ class UniqueIdentifierMixin(models.Model):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self._id_gap_finder = AppIdGapNumberFinder(orm_model_class=type(self))
+        self._id_gap_finder = get_id_gap_finder(type(self))
 
     def save(self, *args, **kwargs):
         save_instance_fn = partial(super().save, *args, **kwargs)
@@ -333,11 +337,14 @@ class _RelatedFieldMixin:
 
 
 class _SaleableItemQuerySet(_BaseIngredientQuerySet):
+    # IDs of new instances are known before insertion, no matter whether the
+    # database returns them from bulk insert
+    BULK_CREATE_RESERVE_IDS = True
+
     def bulk_create(self, objs, *args, **kwargs):
         save_instance_fn = partial(super().bulk_create, objs, *args, **kwargs)
-        if not hasattr(self, "_id_gap_finder"):
-            self._id_gap_finder = AppIdGapNumberFinder(orm_model_class=self.model)
-        return self._id_gap_finder.save_with_rand_id(save_instance_fn, objs=objs)
+        finder = get_id_gap_finder(self.model)
+        return finder.save_with_reserved_ids(save_instance_fn, objs=objs)
 
 
 class _SaleableItemManager(_BaseIngredientManager):
@@ -384,6 +391,12 @@ class AbstractProduct(
 
     ## end of delete()
 
+    @classmethod
+    def get_softdelete_relations(cls):
+        fields = super().get_softdelete_relations()
+        fields.append(cls._meta.get_field("tags"))
+        return fields
+
 
 class ProductSaleableItem(AbstractProduct):
     quota_material = _MatCodeOptions.MAX_NUM_SALE_ITEMS
@@ -445,6 +458,7 @@ class ProductSaleableItemComposite(SoftDeleteObjectMixin):
     # TODO, add another model for recording instructions of saleable item manufacturing
     SOFTDELETE_CHANGESET_MODEL = ProductmgtChangeSet
     SOFTDELETE_RECORD_MODEL = ProductmgtSoftDeleteRecord
+    SOFTDELETE_SET_BASED = True
 
     class Meta:
         db_table = "product_saleable_item_composite"
@@ -474,6 +488,7 @@ class ProductSaleableItemComposite(SoftDeleteObjectMixin):
 class ProductSaleablePackageComposite(SoftDeleteObjectMixin):
     SOFTDELETE_CHANGESET_MODEL = ProductmgtChangeSet
     SOFTDELETE_RECORD_MODEL = ProductmgtSoftDeleteRecord
+    SOFTDELETE_SET_BASED = True
 
     class Meta:
         db_table = "product_saleable_package_composite"
@@ -504,6 +519,7 @@ class ProductSaleableItemMedia(SoftDeleteObjectMixin):
 
     SOFTDELETE_CHANGESET_MODEL = ProductmgtChangeSet
     SOFTDELETE_RECORD_MODEL = ProductmgtSoftDeleteRecord
+    SOFTDELETE_SET_BASED = True
 
     class Meta:
         db_table = "product_saleable_item_media"
@@ -523,6 +539,7 @@ class ProductSaleableItemMedia(SoftDeleteObjectMixin):
 class ProductSaleablePackageMedia(SoftDeleteObjectMixin):
     SOFTDELETE_CHANGESET_MODEL = ProductmgtChangeSet
     SOFTDELETE_RECORD_MODEL = ProductmgtSoftDeleteRecord
+    SOFTDELETE_SET_BASED = True
 
     class Meta:
         db_table = "product_saleable_package_media"
@@ -589,6 +606,7 @@ class ProductAttributeType(SoftDeleteObjectMixin, MinimumInfoMixin):
 
     SOFTDELETE_CHANGESET_MODEL = ProductmgtChangeSet
     SOFTDELETE_RECORD_MODEL = ProductmgtSoftDeleteRecord
+    SOFTDELETE_SET_BASED = True
     min_info_field_names = ["id", "name", "dtype"]
 
     class Meta:
@@ -622,6 +640,7 @@ class BaseProductAttributeValue(SoftDeleteObjectMixin, _RelatedFieldMixin):
 
     SOFTDELETE_CHANGESET_MODEL = ProductmgtChangeSet
     SOFTDELETE_RECORD_MODEL = ProductmgtSoftDeleteRecord
+    SOFTDELETE_SET_BASED = True
     DATATYPE = None
 
     class Meta:
@@ -703,6 +722,12 @@ class BaseProductAttributeValue(SoftDeleteObjectMixin, _RelatedFieldMixin):
 
     ## end of delete()
 
+    @classmethod
+    def get_softdelete_relations(cls):
+        fields = super().get_softdelete_relations()
+        fields.append(cls._meta.get_field("_extra_charge"))
+        return fields
+
 
 ## end of class BaseProductAttributeValue
 
@@ -762,6 +787,7 @@ class ProductAppliedAttributePrice(SoftDeleteObjectMixin):
 
     SOFTDELETE_CHANGESET_MODEL = ProductmgtChangeSet
     SOFTDELETE_RECORD_MODEL = ProductmgtSoftDeleteRecord
+    SOFTDELETE_SET_BASED = True
 
     class Meta:
         db_table = "product_applied_attribute_price"
@@ -13,7 +13,6 @@ from softdelete.models import (
 from ecommerce_common.util.django.setup import test_enable as django_test_enable
 from ecommerce_common.models.db import ServiceModelRouter
 
-
 DB_ALIAS_APPLIED = "default" if django_test_enable else "product_dev_service"
 _atomicity_fn = partial(transaction.atomic, using=DB_ALIAS_APPLIED)
 
@@ -21,6 +20,15 @@ _atomicity_fn = partial(transaction.atomic, using=DB_ALIAS_APPLIED)
 class ProductmgtChangeSet(ChangeSet):
     class Meta:
         db_table = "productmgt_soft_delete_changeset"
+        # index seek for recovery of the newest deletion done by a user
+        indexes = [
+            models.Index(
+                fields=["content_type", "done_by", "time_created"],
+                name="productmgt_cset_newest_idx",
+            ),
+            # for retention task which scans expired changesets
+            models.Index(fields=["time_created"], name="productmgt_cset_time_idx"),
+        ]
 
 
 class ProductmgtSoftDeleteRecord(SoftDeleteRecord):
@@ -55,6 +63,7 @@ class BaseProductIngredient(SoftDeleteObjectMixin):
 
     SOFTDELETE_CHANGESET_MODEL = ProductmgtChangeSet
     SOFTDELETE_RECORD_MODEL = ProductmgtSoftDeleteRecord
+    SOFTDELETE_SET_BASED = True
     objects = _BaseIngredientManager()
 
     class Meta:
@@ -111,6 +120,18 @@ class BaseProductIngredient(SoftDeleteObjectMixin):
         result = super().undelete(*args, **kwargs)
         return result
 
+    @classmethod
+    def get_softdelete_relations(cls):
+        fields = super().get_softdelete_relations()
+        attr_fd_names = [
+            "attr_val_str",
+            "attr_val_pos_int",
+            "attr_val_int",
+            "attr_val_float",
+        ]
+        fields.extend([cls._meta.get_field(fname) for fname in attr_fd_names])
+        return fields
+
 
 #### end of class BaseProductIngredient
 
@@ -373,6 +373,36 @@ class AbstractSaleableSerializer(BaseIngredientSerializer):
         self.fields["media_set"].update(nested_validated_data["media_set"], instance)
         return instance
 
+    def split_batch_data(self, validated_data, instance=None):
+        if instance is None:
+            validated_data["usrprof"] = self.usrprof_id
+        else:
+            validated_data.pop("usrprof", None)
+        return super().split_batch_data(validated_data, instance=instance)
+
+    def get_batch_prefetch_lookups(self):
+        return super().get_batch_prefetch_lookups() + ["media_set"]
+
+    def get_changed_nested_fields(self, instance, nested_data):
+        others = {k: v for k, v in nested_data.items() if k != "media_set"}
+        out = super().get_changed_nested_fields(instance, others)
+        # empty media list discards all existing media of the instance, same as
+        # `CommonSaleableMediaMetaField.update()`
+        media = nested_data.get("media_set", None) or []
+        current = {m.media for m in instance.media_set.all()}
+        if current != set(media):
+            out.append("media_set")
+        return out
+
+    def write_nested_data(self, instance, nested_data, created=False):
+        if "media_set" in nested_data:
+            media = nested_data.pop("media_set") or []
+            if created:
+                self.fields["media_set"].create(media, instance)
+            else:
+                self.fields["media_set"].update(media, instance)
+        super().write_nested_data(instance, nested_data, created=created)
+
 
 ## end of class AbstractSaleableSerializer
 
@@ -425,6 +455,31 @@ class SaleableItemSerializer(AbstractSaleableSerializer):
         )
         return instance
 
+    def get_batch_prefetch_lookups(self):
+        return super().get_batch_prefetch_lookups() + ["ingredients_applied"]
+
+    def get_changed_nested_fields(self, instance, nested_data):
+        others = {k: v for k, v in nested_data.items() if k != "ingredients_applied"}
+        out = super().get_changed_nested_fields(instance, others)
+        composites = nested_data.get("ingredients_applied", None) or []
+        current = instance.ingredients_applied.all()
+        if self.fields["ingredients_applied"].has_changes(current, composites):
+            out.append("ingredients_applied")
+        return out
+
+    def write_nested_data(self, instance, nested_data, created=False):
+        if "ingredients_applied" in nested_data:
+            composites = nested_data.pop("ingredients_applied") or []
+            if created:
+                self.fields["ingredients_applied"].create(
+                    composites, sale_item=instance
+                )
+            else:
+                self.fields["ingredients_applied"].update(
+                    sale_item=instance, validated_data=composites
+                )
+        super().write_nested_data(instance, nested_data, created=created)
+
 
 ## end of class SaleableItemSerializer
 
@@ -473,5 +528,28 @@ class SaleablePackageSerializer(AbstractSaleableSerializer):
         )
         return instance
 
+    def get_batch_prefetch_lookups(self):
+        return super().get_batch_prefetch_lookups() + ["saleitems_applied"]
+
+    def get_changed_nested_fields(self, instance, nested_data):
+        others = {k: v for k, v in nested_data.items() if k != "saleitems_applied"}
+        out = super().get_changed_nested_fields(instance, others)
+        composites = nested_data.get("saleitems_applied", None) or []
+        current = instance.saleitems_applied.all()
+        if self.fields["saleitems_applied"].has_changes(current, composites):
+            out.append("saleitems_applied")
+        return out
+
+    def write_nested_data(self, instance, nested_data, created=False):
+        if "saleitems_applied" in nested_data:
+            composites = nested_data.pop("saleitems_applied") or []
+            if created:
+                self.fields["saleitems_applied"].create(composites, package=instance)
+            else:
+                self.fields["saleitems_applied"].update(
+                    package=instance, validated_data=composites
+                )
+        super().write_nested_data(instance, nested_data, created=created)
+
 
 ## end of class SaleablePackageSerializer
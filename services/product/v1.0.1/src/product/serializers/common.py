@@ -4,6 +4,7 @@ import logging
 
 from django.core.exceptions import ValidationError as DjangoValidationError
 from django.contrib.contenttypes.models import ContentType
+from django.db.models.constants import LOOKUP_SEP
 from rest_framework.fields import empty as DRFEmptyData, FloatField
 from rest_framework.exceptions import (
     ValidationError as RestValidationError,
@@ -134,6 +135,18 @@ class AttrValueListSerializer(AugmentIngredientRefMixin, BulkUpdateListSerialize
             unique_id_checker(value=value, caller=self)
         return value
 
+    def _instance_changed(self, obj, data):
+        if super()._instance_changed(obj, data):
+            return True
+        # extra charge is saved only if the amount is positive, see save() of
+        # the attribute value model, `_extra_charge` should be prefetched
+        extra_amount = data.get("extra_amount", None)
+        if extra_amount is None or extra_amount <= 0.0:
+            return False
+        charges = obj._extra_charge.all()
+        current = charges[0].amount if any(charges) else None
+        return current != extra_amount
+
 
 ## end of class AttrValueListSerializer
 
@@ -243,6 +256,8 @@ class AttrValueFloatSerializer(AbstractAttrValueSerializer):
 
 
 class BaseIngredientListSerializer(BulkUpdateListSerializer):
+    BATCH_WRITE = True
+
     def validate(self, value, _logger=None, exception_cls=Exception):
         id_required = self.child.fields["id"].required
         if id_required:
@@ -422,5 +437,41 @@ class BaseIngredientSerializer(ExtendedModelSerializer, NestedFieldSetupMixin):
         # raise  IntegrityError
         return instance
 
+    def get_batch_prefetch_lookups(self):
+        out = super().get_batch_prefetch_lookups()
+        for k in self.Meta.nested_fields:
+            out.extend([k, LOOKUP_SEP.join([k, "_extra_charge"])])
+        return out
+
+    def get_changed_nested_fields(self, instance, nested_data):
+        others = {
+            k: v for k, v in nested_data.items() if k not in self.Meta.nested_fields
+        }
+        out = super().get_changed_nested_fields(instance, others)
+        for k in self.Meta.nested_fields:
+            # absent attribute data of a type discards existing attributes
+            subform_data = nested_data.get(k, None) or []
+            subform_objs = getattr(instance, k).all()
+            if self.fields[k].has_changes(subform_objs, subform_data):
+                out.append(k)
+        return out
+
+    def write_nested_data(self, instance, nested_data, created=False):
+        for k in self.Meta.nested_fields:
+            if k not in nested_data:
+                continue
+            subform_data = nested_data.pop(k) or []
+            if created:
+                self.fields[k].create(validated_data=subform_data, ingredient=instance)
+            else:
+                self.fields[k].update(
+                    instance=getattr(instance, k).all(),
+                    validated_data=subform_data,
+                    ingredient=instance,
+                    allow_insert=True,
+                    allow_delete=True,
+                )
+        super().write_nested_data(instance, nested_data, created=created)
+
 
 ## end of class BaseIngredientSerializer
@@ -1,13 +1,16 @@
 import string
 import random
+from datetime import timedelta
 
 from celery import states as CeleryStates
 from django.test import TransactionTestCase
+from django.utils import timezone
 
 from ecommerce_common.models.enums.django import UnitOfMeasurement
 
+from product.models.common import ProductmgtChangeSet
 from product.models.base import ProductSaleableItem, ProductSaleablePackage
-from product.async_tasks import get_product
+from product.async_tasks import get_product, batch_dispatch, purge_softdeleted_data
 from tests.common import _common_instances_setup
 
 
@@ -134,3 +137,81 @@ class GetProductCase(TransactionTestCase):
         excluded_pkgs = set(map(lambda obj: obj.id, chosen_pkgs))
         self.assertFalse(any(fetched_items & excluded_items))
         self.assertFalse(any(fetched_pkgs & excluded_pkgs))
+
+    def test_batch_dispatch(self):
+        chosen_items = self._primitives["ProductSaleableItem"][:3]
+        item_ids = list(map(lambda obj: obj.id, chosen_items))
+        fields_present = ["id", "name"]
+        input_kwargs = {
+            "item_ids": item_ids,
+            "pkg_ids": [],
+            "item_fields": fields_present,
+            "pkg_fields": fields_present,
+            "profile": self.default_profile_id,
+        }
+        calls = [
+            {"method": "get_product", "args": [], "kwargs": input_kwargs},
+            {"method": "get_product", "args": [], "kwargs": {"profile": 1}},
+            {"method": "unknown_task", "args": [], "kwargs": {}},
+        ]
+        eager_result = batch_dispatch.apply_async(kwargs={"calls": calls})
+        self.assertEqual(eager_result.state, CeleryStates.SUCCESS)
+        results = eager_result.result
+        self.assertEqual(len(results), len(calls))
+        self.assertEqual(results[0]["status"], CeleryStates.SUCCESS)
+        fetched_items = set(map(lambda d: d["id"], results[0]["result"]["item"]))
+        self.assertSetEqual(fetched_items, set(item_ids))
+        # missing arguments , failure does not affect other invocations
+        self.assertEqual(results[1]["status"], CeleryStates.FAILURE)
+        self.assertEqual(results[2]["status"], CeleryStates.FAILURE)
+
+
+class PurgeSoftDeletedCase(TransactionTestCase):
+    default_profile_id = 212
+
+    def setUp(self):
+        purge_softdeleted_data.app.conf.task_always_eager = True
+        self._data = {
+            "ProductSaleableItem": [
+                {
+                    "visible": True,
+                    "unit": random.choice(UnitOfMeasurement.choices)[0],
+                    "price": random.randrange(1, 40),
+                    "name": "".join(random.choices(string.ascii_letters, k=14)),
+                    "usrprof": self.default_profile_id,
+                }
+                for _ in range(6)
+            ],
+        }
+        self._primitives = {}
+        models_info = [
+            (ProductSaleableItem, len(self._data["ProductSaleableItem"])),
+        ]
+        _common_instances_setup(
+            out=self._primitives, data=self._data, models_info=models_info
+        )
+
+    def tearDown(self):
+        purge_softdeleted_data.app.conf.task_always_eager = False
+
+    def test_expired_only(self):
+        item_ids = [obj.id for obj in self._primitives["ProductSaleableItem"]]
+        qset = ProductSaleableItem.objects.filter(id__in=item_ids[:4])
+        qset.delete(profile_id=self.default_profile_id)
+        expired_ids = item_ids[:3]
+        cset = ProductmgtChangeSet.objects.filter(
+            **ProductmgtChangeSet.obj_ids_lookup(expired_ids)
+        )
+        cset.update(time_created=timezone.now() - timedelta(days=100))
+        input_kwargs = {"days": 90, "batch_size": 2, "max_batches": 3}
+        eager_result = purge_softdeleted_data.apply_async(kwargs=input_kwargs)
+        self.assertEqual(eager_result.state, CeleryStates.SUCCESS)
+        counts = eager_result.result
+        self.assertEqual(counts["product.ProductSaleableItem"], len(expired_ids))
+        self.assertEqual(counts["product.ProductmgtChangeSet"], len(expired_ids))
+        qset = ProductSaleableItem.objects.filter(id__in=item_ids, with_deleted=True)
+        self.assertSetEqual(set(qset.values_list("id", flat=True)), set(item_ids[3:]))
+        deleted_set = ProductSaleableItem.objects.get_deleted_set()
+        self.assertListEqual(
+            list(deleted_set.values_list("id", flat=True)), [item_ids[3]]
+        )
@@ -11,7 +11,9 @@ from unittest.mock import Mock, patch  # noqa: F401
 
 from django.conf import settings as django_settings
 from django.middleware.csrf import _get_new_csrf_token
+from django.db import connection
 from django.db.models.constants import LOOKUP_SEP
+from django.test.utils import CaptureQueriesContext
 from django.db.utils import IntegrityError, DataError  # noqa: F401
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError as DjangoValidationError
@@ -715,6 +717,35 @@ def assert_view_unclassified_attributes(
     return err_items
 
 
+def assert_view_bulk_update_query_count(
+    testcase, path, body, access_token, model_cls, method="put"
+):
+    """
+    send bulk update request twice, with only the first item and with all the
+    items, number of reads on the table of `model_cls` should not grow with
+    number of edited items
+    """
+    from_clause = "FROM %s" % connection.ops.quote_name(model_cls._meta.db_table)
+    num_reads = []
+    for edit_data in (body[:1], body):
+        with CaptureQueriesContext(connection) as ctx:
+            response = testcase._send_request_to_backend(
+                path=path,
+                method=method,
+                body=edit_data,
+                access_token=access_token,
+            )
+        testcase.assertEqual(int(response.status_code), 200)
+        reads = [
+            q["sql"]
+            for q in ctx.captured_queries
+            if q["sql"].startswith("SELECT") and from_clause in q["sql"]
+        ]
+        num_reads.append(len(reads))
+    testcase.assertGreater(len(body), 1)
+    testcase.assertEqual(num_reads[0], num_reads[1])
+
+
 class SoftDeleteCommonTestMixin:
     def assert_softdelete_items_exist(
         self, testcase, deleted_ids, remain_ids, model_cls_path, id_label="id"
@@ -2,14 +2,19 @@ import random
 from functools import partial
 
 from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 from django.db.utils import DataError
+from django.contrib.contenttypes.models import ContentType
 
 from ecommerce_common.util import sort_nested_object
 from ecommerce_common.models.enums.django import UnitOfMeasurement
+from product.models.common import ProductmgtChangeSet
 from product.models.base import (
     ProductAttributeType,
     _ProductAttrValueDataType,
     ProductSaleableItem,
+    ProductSaleableItemComposite,
 )
 from product.models.development import ProductDevIngredient
 
@@ -21,7 +26,6 @@ from tests.common import (
     _ingredient_attrvals_common_setup,
 )
 
-
 num_uom = len(UnitOfMeasurement.choices)
 
 
@@ -286,5 +290,43 @@ class IngredientDeletionTestCase(TransactionTestCase):
         self.assertFalse(deleted_set.exists())
         self._post_bulk_delete(remain_pks=delete_pks)
 
+    def test_soft_delete_bulk_set_based(self):
+        profile_id = 1234
+        delete_pks, remain_pks, qset = self._pre_bulk_delete()
+        with CaptureQueriesContext(connection) as ctx:
+            qset.delete(profile_id=profile_id)
+        # number of queries depends on number of related models, not number
+        # of the deleted ingredients and their related objects
+        self.assertLess(len(ctx.captured_queries), 30)
+        # still one changeset for each deleted ingredient
+        ingre_ct = ContentType.objects.get_for_model(ProductDevIngredient)
+        compo_ct = ContentType.objects.get_for_model(ProductSaleableItemComposite)
+        cset = ProductmgtChangeSet.objects.filter(
+            content_type=ingre_ct, done_by=profile_id
+        )
+        self.assertSetEqual(
+            set(cset.values_list("object_id", flat=True)), set(map(str, delete_pks))
+        )
+        # lookup via indexed hash of the object IDs
+        qset = cset.filter(**ProductmgtChangeSet.obj_ids_lookup(delete_pks))
+        self.assertEqual(qset.count(), len(delete_pks))
+        for cs in cset:
+            records = cs.soft_delete_records.filter(content_type=compo_ct)
+            actual = [r.deserialized_obj_id["ingredient"] for r in records]
+            expect = [int(cs.object_id)] * self.num_saleitems
+            self.assertListEqual(expect, actual)
+        # recover one of the deleted ingredients
+        recover_pks, delete_pks = delete_pks[:1], delete_pks[1:]
+        deleted_set = ProductDevIngredient.objects.get_deleted_set()
+        deleted_set.filter(pk__in=recover_pks).undelete(profile_id=profile_id)
+        deleted_set = ProductDevIngredient.objects.get_deleted_set()
+        self.assertSetEqual(
+            set(deleted_set.values_list("id", flat=True)), set(delete_pks)
+        )
+        self._post_bulk_delete(remain_pks=[*remain_pks, *recover_pks])
+        self._check_remaining_ingredients_in_saleitem(
+            ingre_ids=delete_pks, is_deleted=True
+        )
+
 
 ## end of class IngredientDeletionTestCase
@@ -1,8 +1,9 @@
 import random
 import copy
 import json
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
+from django.db import connection
 from django.test import TransactionTestCase
 from rest_framework.exceptions import ValidationError as DRFValidationError
 from rest_framework.settings import DEFAULTS as drf_default_settings
@@ -66,6 +67,24 @@ class DevIngredientCreationTestCase(DevIngredientCommonMixin, TransactionTestCas
         expect_data = serializer_kwargs["data"]
         self.verify_objects(actual_instances, expect_data)
 
+    def test_batch_insert_without_returned_ids(self):
+        serializer_kwargs = {"data": copy.deepcopy(self.request_data), "many": True}
+        serializer = self.serializer_class(**serializer_kwargs)
+        serializer.is_valid(raise_exception=True)
+        model_cls = self.serializer_class.Meta.model
+        # e.g. MySQL does not return IDs of the rows inserted by bulk_create()
+        features_cls = type(connection.features)
+        with patch.object(features_cls, "can_return_rows_from_bulk_insert", False):
+            actual_instances = serializer.update(
+                instance=model_cls.objects.none(),
+                validated_data=serializer.validated_data,
+                allow_insert=True,
+            )
+        self.assertEqual(len(actual_instances), len(self.request_data))
+        for obj in actual_instances:
+            self.assertIsNotNone(obj.pk)
+        self.verify_objects(actual_instances, serializer_kwargs["data"])
+
     def test_fields_validate_error(self):
         num_ingredients = len(self.request_data)
         invalid_cases = [
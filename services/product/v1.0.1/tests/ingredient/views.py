@@ -16,6 +16,7 @@ from tests.common import (
     _common_instances_setup,
     assert_view_permission_denied,
     assert_view_bulk_create_with_response,
+    assert_view_bulk_update_query_count,
     assert_view_unclassified_attributes,
     SoftDeleteCommonTestMixin,
     app_code_product,
@@ -255,6 +256,16 @@ class DevIngredientUpdateTestCase(DevIngredientUpdateBaseTestCase):
         actual_edited_data = json.dumps(sorted_edited_data, sort_keys=True)
         self.assertEqual(expect_edited_data, actual_edited_data)
 
+    def test_bulk_validation_query_count(self):
+        # each edit form is mapped to its ingredient without extra query
+        assert_view_bulk_update_query_count(
+            testcase=self,
+            path=self.path,
+            body=self._request_data,
+            access_token=self._access_token,
+            model_cls=self.serializer_class.Meta.model,
+        )
+
     def test_conflict_ingredient_id(self):
         key = drf_default_settings["NON_FIELD_ERRORS_KEY"]
         editing_data = self._request_data
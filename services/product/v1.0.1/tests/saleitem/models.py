@@ -22,6 +22,7 @@ from product.models.base import (
     ProductSaleableItemComposite,
     ProductAppliedAttributePrice,
     ProductSaleableItemMedia,
+    get_id_gap_finder,
 )
 from product.models.development import ProductDevIngredient
 
@@ -89,6 +90,18 @@ class SaleableItemSimpleCreationTestCase(TransactionTestCase):
         ProductSaleableItem.objects.bulk_create(self.instances[:2])
         self.check_instances_id()
 
+    def test_bulk_create_reuse_gap_finder(self):
+        finder = get_id_gap_finder(ProductSaleableItem)
+        finder.reset_stats()
+        # each call goes through a freshly cloned queryset
+        ProductSaleableItem.objects.bulk_create(self.instances[:2])
+        ProductSaleableItem.objects.bulk_create(self.instances[2:])
+        self.assertIs(get_id_gap_finder(ProductSaleableItem), finder)
+        self.assertIs(self.instances[0]._id_gap_finder, finder)
+        self.check_instances_id()
+        stats = finder.stats
+        self.assertLessEqual(stats["gap_cache_miss"], 1)
+
     def check_instances_id(self):
         self.assertNotEqual(self.instances[0].id, None)
         self.assertNotEqual(self.instances[1].id, None)
@@ -3,7 +3,9 @@ import copy
 import json
 from unittest.mock import Mock
 
+from django.db import connection
 from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from rest_framework.exceptions import ValidationError as DRFValidationError
 from rest_framework.settings import DEFAULTS as drf_default_settings
 
@@ -12,11 +14,13 @@ from ecommerce_common.validators import (
     UnprintableCharValidator,
 )
 from product.serializers.base import SaleableItemSerializer
+from product.serializers.common import BaseIngredientListSerializer
 from product.models.base import (
     ProductTag,
     ProductAttributeType,
     _ProductAttrValueDataType,
     ProductSaleableItem,
+    ProductSaleableItemMedia,
 )
 from product.models.development import ProductDevIngredient
 
@@ -404,6 +408,67 @@ class SaleableItemUpdateTestCase(SaleableItemCommonMixin, TransactionTestCase):
             edited_objs, edit_data, usrprof_id=serializer.child.usrprof_id
         )
 
+    def test_skip_unchanged_nested_fields(self):
+        model_cls = type(self._created_items[0])
+        edit_objs = model_cls.objects.filter(
+            pk__in=[obj.pk for obj in self._created_items]
+        )
+        serializer_ro = SaleableItemSerializer(instance=edit_objs, many=True)
+        edit_data = [dict(copy.deepcopy(item)) for item in serializer_ro.data]
+        for item in edit_data:
+            item["name"] = "%s edited" % item["name"]
+        serializer_kwargs = {
+            "data": copy.deepcopy(edit_data),
+            "instance": edit_objs,
+            "many": True,
+            "usrprof_id": self.profile_ids[0],
+        }
+        serializer = SaleableItemSerializer(**serializer_kwargs)
+        serializer.is_valid(raise_exception=True)
+        with CaptureQueriesContext(connection) as ctx:
+            edited_objs = serializer.save()
+        # only the saleable items are written, none of nested fields is changed
+        saleitem_update = "UPDATE %s" % connection.ops.quote_name(
+            model_cls._meta.db_table
+        )
+        writes = [
+            q["sql"]
+            for q in ctx.captured_queries
+            if q["sql"].startswith(("INSERT", "UPDATE", "DELETE"))
+        ]
+        self.assertGreater(len(writes), 0)
+        for sql in writes:
+            self.assertTrue(sql.startswith(saleitem_update))
+        self.verify_objects(
+            edited_objs, edit_data, usrprof_id=serializer.child.usrprof_id
+        )
+
+    def test_clear_media_set(self):
+        edit_obj = self._created_items[0]
+        if not edit_obj.media_set.exists():
+            ProductSaleableItemMedia.objects.create(
+                media="test-media-%d" % edit_obj.pk, sale_item=edit_obj
+            )
+        model_cls = type(edit_obj)
+        edit_objs = model_cls.objects.filter(pk=edit_obj.pk)
+        serializer_ro = SaleableItemSerializer(instance=edit_objs, many=True)
+        edit_data = [dict(copy.deepcopy(item)) for item in serializer_ro.data]
+        self.assertGreater(len(edit_data[0]["media_set"]), 0)
+        edit_data[0]["media_set"] = []
+        serializer_kwargs = {
+            "data": copy.deepcopy(edit_data),
+            "instance": edit_objs,
+            "many": True,
+            "usrprof_id": self.profile_ids[0],
+        }
+        serializer = SaleableItemSerializer(**serializer_kwargs)
+        serializer.is_valid(raise_exception=True)
+        edited_objs = serializer.save()
+        self.assertFalse(edit_obj.media_set.exists())
+        self.verify_objects(
+            edited_objs, edit_data, usrprof_id=serializer.child.usrprof_id
+        )
+
     def test_editdata_instances_not_matched(self):
         non_field_err_key = drf_default_settings["NON_FIELD_ERRORS_KEY"]
         num_all_items = len(self.request_data)
@@ -470,6 +535,62 @@ class SaleableItemUpdateTestCase(SaleableItemCommonMixin, TransactionTestCase):
 ## end of class SaleableItemUpdateTestCase
 
 
+class SaleableItemBatchUpdateTestCase(SaleableItemCommonMixin, TransactionTestCase):
+    def _bulk_edit_plain_fields(self, num_items):
+        fixture = model_fixtures["ProductSaleableItem"]
+        objs = [
+            ProductSaleableItem(
+                name="batch item %d" % idx,
+                unit=fixture[idx % len(fixture)]["unit"],
+                price=1.0 + idx,
+                visible=False,
+                usrprof=self.profile_ids[0],
+            )
+            for idx in range(num_items)
+        ]
+        objs = ProductSaleableItem.objects.bulk_create(objs)
+        obj_ids = [obj.id for obj in objs]
+        edit_data = [
+            {
+                "id": obj.id,
+                "name": "batch item %d edited" % idx,
+                "visible": True,
+                "price": obj.price + 1.0,
+                "unit": obj.unit,
+                "tags": [],
+                "media_set": [],
+                "attributes": [],
+                "ingredients_applied": [],
+            }
+            for idx, obj in enumerate(objs)
+        ]
+        serializer_kwargs = {
+            "data": edit_data,
+            "instance": ProductSaleableItem.objects.filter(id__in=obj_ids),
+            "many": True,
+            "usrprof_id": self.profile_ids[0],
+        }
+        serializer = SaleableItemSerializer(**serializer_kwargs)
+        serializer.is_valid(raise_exception=True)
+        with CaptureQueriesContext(connection) as ctx:
+            serializer.save()
+        qset = ProductSaleableItem.objects.filter(
+            id__in=obj_ids, visible=True, name__endswith="edited"
+        )
+        self.assertEqual(qset.count(), num_items)
+        return len(ctx.captured_queries)
+
+    def test_bounded_num_statements(self):
+        num_small = self._bulk_edit_plain_fields(num_items=10)
+        num_large = self._bulk_edit_plain_fields(num_items=1000)
+        # only number of UPDATE statements grows, one for each batch
+        max_extra = 1000 // BaseIngredientListSerializer.BATCH_SIZE
+        self.assertLessEqual(num_large, num_small + max_extra)
+
+
+## end of class SaleableItemBatchUpdateTestCase
+
+
 class SaleableItemRepresentationTestCase(SaleableItemCommonMixin, TransactionTestCase):
     def setUp(self):
         super().setUp()
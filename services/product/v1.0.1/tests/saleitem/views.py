@@ -17,6 +17,7 @@ from tests.common import (
     listitem_rand_assigner,
     http_request_body_template,
     assert_view_bulk_create_with_response,
+    assert_view_bulk_update_query_count,
     assert_view_unclassified_attributes,
     SoftDeleteCommonTestMixin,
 )
@@ -394,6 +395,21 @@ class SaleableItemUpdateTestCase(
             actual_edited_items = sort_nested_object(obj=actual_edited_items)
             self.assertListEqual(expect_edited_items, actual_edited_items)
 
+    def test_bulk_validation_query_count(self):
+        # each edit form is mapped to its saleable item without extra query
+        edit_data = []
+        for item, req_item in zip(self._created_items, self._request_data):
+            edit_item = copy.deepcopy(req_item)
+            edit_item["id"] = item["id"]
+            edit_data.append(edit_item)
+        assert_view_bulk_update_query_count(
+            testcase=self,
+            path=self.path,
+            body=edit_data,
+            access_token=self._access_token,
+            model_cls=self.serializer_class.Meta.model,
+        )
+
     def test_permission_denied(self):
         another_usrprof = self._access_tok_payld["id"] + 1
         self._access_tok_payld["id"] = another_usrprof
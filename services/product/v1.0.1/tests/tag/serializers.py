@@ -1,13 +1,17 @@
 import random
 import copy
 import json
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
+from django.db import connection, transaction
 from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from rest_framework.exceptions import ValidationError as DRFValidationError
 from rest_framework.settings import DEFAULTS as drf_default_settings
 
 from ecommerce_common.util import ExtendedDict, sort_nested_object
+from ecommerce_common.validators import ClosureCrossTreesLoopValidator
+from product.models.base import ProductTagClosure
 from tests.common import http_request_body_template
 from .common import TreeNodeMixin, HttpRequestDataGenTag, TagVerificationMixin
 
@@ -137,6 +141,45 @@ class TagCreationTestCase(TransactionTestCase, TagCommonMixin):
 
     ## end of test_append_new_trees_to_existing_nodes()
 
+    def test_create_shuffled_forms(self):
+        origin_trees = TreeNodeMixin.rand_gen_trees(
+            num_trees=4,
+            min_num_nodes=80,
+            max_num_nodes=120,
+            min_num_siblings=1,
+            max_num_siblings=5,
+            write_value_fn=self._write_value_fn,
+        )
+        # parent form may come after its child forms in the request
+        req_data = self.trees_to_req_data(trees=origin_trees, shuffle=True)
+        serializer = self.serializer_class(
+            many=True, data=req_data, usrprof_id=self.usrprof_id
+        )
+        serializer.is_valid(raise_exception=True)
+        closure_db_table = ProductTagClosure._meta.db_table
+        with CaptureQueriesContext(connection) as ctx:
+            actual_instances = serializer.save()
+        # ancestors of new parents are not read from closure table for each
+        # inserted node
+        closure_reads = [
+            q["sql"]
+            for q in ctx.captured_queries
+            if q["sql"].startswith("SELECT") and closure_db_table in q["sql"]
+        ]
+        self.assertLessEqual(len(closure_reads), 1)
+        obj_ids = tuple(map(lambda obj: obj.pk, actual_instances))
+        entity_data, closure_data = self.load_closure_data(node_ids=obj_ids)
+        saved_trees = TreeNodeMixin.gen_from_closure_data(
+            entity_data=entity_data, closure_data=closure_data
+        )
+        matched, not_matched = TreeNodeMixin.compare_trees(
+            trees_a=origin_trees,
+            trees_b=saved_trees,
+            value_compare_fn=self._value_compare_fn,
+        )
+        self.assertListEqual(not_matched, [])
+        self.assertEqual(len(matched), len(origin_trees))
+
     def test_loop_detection_simple_tree(self):
         num_nodes = 4
         origin_tree_nodes = [
@@ -271,7 +314,7 @@ class TagUpdateTestCase(TransactionTestCase, TagCommonMixin):
     def tearDown(self):
         pass
 
-    def _update_and_validate_tree(self, moving_nodes):
+    def _moving_nodes_to_req_data(self, moving_nodes):
         req_data = list(
             map(
                 lambda node: {
@@ -284,11 +327,18 @@ class TagUpdateTestCase(TransactionTestCase, TagCommonMixin):
             )
         )
         random.shuffle(req_data)  # `id` field should be unique value in each data item
+        return req_data
+
+    def _init_update_serializer(self, moving_nodes):
+        req_data = self._moving_nodes_to_req_data(moving_nodes)
         tag_ids = list(map(lambda node: node.value["id"], moving_nodes))
         tag_objs = self.serializer_class.Meta.model.objects.filter(id__in=tag_ids)
-        serializer = self.serializer_class(
+        return self.serializer_class(
             many=True, data=req_data, instance=tag_objs, usrprof_id=self.usrprof_id
         )
+
+    def _update_and_validate_tree(self, moving_nodes):
+        serializer = self._init_update_serializer(moving_nodes)
         serializer.is_valid(raise_exception=True)
         actual_instances = serializer.save()  # noqa: F841
         obj_ids = tuple(map(lambda d: d["id"], self.existing_trees.entity_data))
@@ -630,6 +680,123 @@ class TagUpdateTestCase(TransactionTestCase, TagCommonMixin):
             pattern_pos = err_info[0].find(form_label_pattern % loop_node.value["id"])
             self.assertGreaterEqual(pattern_pos, 0)
 
+    def _load_closure_rows(self):
+        qset = ProductTagClosure.objects.values_list("ancestor", "descendant", "depth")
+        return set(qset)
+
+    def _closure_rows_by_engine(self, moving_nodes, set_based):
+        # apply the update with either of the engines which estimate closure
+        # paths, the change is rolled back after the closure rows are loaded
+        bulk_serializer_cls = self.serializer_class.Meta.list_serializer_class
+        with patch.object(bulk_serializer_cls, "EDIT_PATHS_SET_BASED", set_based):
+            with transaction.atomic():
+                serializer = self._init_update_serializer(moving_nodes)
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+                closure_rows = self._load_closure_rows()
+                transaction.set_rollback(True)
+        return closure_rows
+
+    def _compare_engines_and_validate(self, moving_nodes):
+        closure_rows_origin = self._load_closure_rows()
+        closure_rows_legacy = self._closure_rows_by_engine(moving_nodes, False)
+        self.assertSetEqual(self._load_closure_rows(), closure_rows_origin)
+        closure_rows_set_based = self._closure_rows_by_engine(moving_nodes, True)
+        self.assertSetEqual(self._load_closure_rows(), closure_rows_origin)
+        self.assertNotEqual(closure_rows_legacy, closure_rows_origin)
+        self.assertSetEqual(closure_rows_set_based, closure_rows_legacy)
+        self._update_and_validate_tree(moving_nodes)
+        self.assertSetEqual(self._load_closure_rows(), closure_rows_legacy)
+
+    def test_engines_subtree_to_sibling(self):
+        moving_nodes = []
+        for root in self.existing_trees:
+            moving_node = root.children[-1]
+            moving_node.parent = root.children[0]
+            moving_nodes.append(moving_node)
+        self._compare_engines_and_validate(moving_nodes)
+
+    def test_engines_chained_moves(self):
+        self.assertGreaterEqual(
+            self.num_trees, 3
+        )  # this test case requires at least 3 existing trees
+        moving_nodes = []
+        roots = self.existing_trees
+        # the new parent of each moving node is moved in the same request
+        node_a = roots[0].children[0]
+        node_b = roots[1].children[0]
+        curr_node = roots[2]
+        while any(curr_node.children):
+            curr_node = curr_node.children[-1]
+        node_a.parent = node_b
+        node_b.parent = curr_node
+        moving_nodes.extend([node_a, node_b])
+        if any(node_a.children):
+            moving_node = node_a.children[0]
+            moving_node.parent = roots[0]
+            moving_nodes.append(moving_node)
+        self._compare_engines_and_validate(moving_nodes)
+
+    def test_engines_subtrees_to_root(self):
+        moving_nodes = []
+        for root in tuple(self.existing_trees):
+            moving_node = root.children[0]
+            moving_node.parent = None
+            moving_nodes.append(moving_node)
+            self.existing_trees.append(moving_node)
+        self._compare_engines_and_validate(moving_nodes)
+
+    def test_engines_loop_rejected(self):
+        moving_nodes = []
+        root = self.existing_trees[0]
+        curr_node = root
+        while any(curr_node.children):
+            sorted_children = sorted(curr_node.children, key=lambda node: node.depth)
+            curr_node = sorted_children[-1]
+        root.parent = curr_node
+        moving_nodes.append(root)
+        closure_rows_origin = self._load_closure_rows()
+        non_field_err_key = drf_default_settings["NON_FIELD_ERRORS_KEY"]
+        for set_based in (False, True):
+            with self.assertRaises(DRFValidationError) as error_caught:
+                self._closure_rows_by_engine(moving_nodes, set_based)
+            err_info = error_caught.exception.detail[non_field_err_key]
+            pattern_pos = err_info[0].find(self.err_msg_loop_detected)
+            self.assertGreater(pattern_pos, 0)
+            self.assertSetEqual(self._load_closure_rows(), closure_rows_origin)
+        # the set-based engine rejects the loop even without the validator
+        serializer = self._init_update_serializer(moving_nodes)
+        forms = copy.deepcopy(serializer.initial_data)
+        with self.assertRaises(DRFValidationError) as error_caught:
+            serializer.get_sorted_update_forms(
+                forms=forms, instances=serializer.instance
+            )
+        err_info = error_caught.exception.detail[non_field_err_key]
+        pattern_pos = err_info[0].find(self.err_msg_loop_detected)
+        self.assertGreater(pattern_pos, 0)
+        self.assertSetEqual(self._load_closure_rows(), closure_rows_origin)
+
+    def test_loop_validator_num_queries(self):
+        serializer_cls = self.serializer_class.Meta.list_serializer_class
+        node_ids = list(map(lambda d: str(d["id"]), self.existing_trees.entity_data))
+        num_queries = []
+        for num_moving in (1, 4, len(node_ids) // 2):
+            chosen = random.sample(node_ids, k=num_moving * 2)
+            # parents of the edges are existing nodes, their ancestors are
+            # resolved from the closure table
+            tree_edge = list(zip(chosen[:num_moving], chosen[num_moving:]))
+            with CaptureQueriesContext(connection) as ctx:
+                vobj = ClosureCrossTreesLoopValidator(
+                    tree_edge=tree_edge,
+                    closure_model=serializer_cls.CLOSURE_MODEL_CLS,
+                    depth_column_name=serializer_cls.DEPTH_FIELD_NAME,
+                    ancestor_column_name=serializer_cls.ANCESTOR_FIELD_NAME,
+                    descendant_column_name=serializer_cls.DESCENDANT_FIELD_NAME,
+                )
+            num_queries.append(len(ctx.captured_queries))
+            self.assertEqual(len(vobj.graph), num_moving * 2)
+        self.assertListEqual(num_queries, [1, 1, 1])
+
 
 ## end of class TagUpdateTestCase
 
@@ -24,6 +24,16 @@ ORM_BASE_CLASSES = ["store.models.Base"]
 
 DRIVER_LABEL = "mysql+asyncmy"
 
+# connection pool of each worker process, `pool_recycle` has to be less than
+# `wait_timeout` of the database server (default 8 hours in MariaDB)
+DB_POOL = {
+    "pool_size": 10,
+    "max_overflow": 10,
+    "pool_recycle": 3600,
+    "pool_pre_ping": True,
+    "pool_timeout": 10,
+}
+
 APP_HOST = cors_config.ALLOWED_ORIGIN["store"]
 
 AUTH_APP_HOST = cors_config.ALLOWED_ORIGIN["user_management"]
@@ -47,4 +57,17 @@ KEYSTORE = {
     },
 }
 
-NUM_RETRY_RPC_RESPONSE = 5
+RPC_REPLY_TIMEOUT_SECS = 5
+
+# access-control facts of each store (supervisor, staff) cached in each process
+STORE_AUTH_CACHE_TTL_SECS = 30
+STORE_AUTH_CACHE_MAX_ENTRIES = 4096
+
+# relay of the events saved in outbox table to other applications
+EVENT_OUTBOX_RELAY = {
+    "enabled": True,
+    "batch_size": 50,
+    "max_attempts": 10,
+    "retry_backoff_secs": 2,
+    "poll_interval_secs": 2,
+}
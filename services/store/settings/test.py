@@ -23,3 +23,9 @@ KEYSTORE["persist_pubkey_handler_test"] = {
         "flush_threshold": 4,
     },
 }
+
+# test cases modify stores directly through database sessions, disable the cache
+STORE_AUTH_CACHE_TTL_SECS = 0
+
+# test cases verify the events saved in outbox table, without publishing them
+EVENT_OUTBOX_RELAY = {**EVENT_OUTBOX_RELAY, "enabled": False}
@@ -1,16 +1,16 @@
 import logging
-from functools import partial
-from typing import Optional, List
+from datetime import datetime
+from typing import Optional, List, Union
 
-from fastapi import APIRouter, Header, Depends as FastapiDepends
+from fastapi import APIRouter, Header, Depends as FastapiDepends, Query, Response
 from fastapi import HTTPException as FastApiHTTPException, status as FastApiHTTPstatus
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2AuthorizationCodeBearer
 from pydantic import PositiveInt
 from sqlalchemy import (
     delete as SqlAlDelete,
     select as SqlAlSelect,
-    or_ as SqlAlOr,
-    and_ as SqlAlAnd,
+    tuple_ as SqlAlTuple,
 )
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
@@ -28,14 +28,18 @@ from ..models import (
     HourOfOperation,
     SaleableTypeEnum,
     StoreProductAvailable,
+    StoreEventOutbox,
 )
 from ..shared import shared_ctx
+from ..cache import StoreAuthFacts
+from ..outbox import add_outbox_event
 from ..validation import (
     NewStoreProfilesReqBody,
     ExistingStoreProfileReqBody,
     StoreSupervisorReqBody,
     StoreStaffsReqBody,
     BusinessHoursDaysReqBody,
+    EditProductReqBody,
     EditProductsReqBody,
 )
 from ..dto import StoreProfileDto, StoreProfileCreatedDto
@@ -73,6 +77,16 @@ async def common_authentication(encoded_token: str = FastapiDepends(oauth2_schem
     )
 
 
+async def get_db_session():
+    """
+    one database session per request, shared by the endpoint and all its
+    dependencies, the connection is acquired lazily on the first statement
+    and returned to the pool on commit or when the request finishes.
+    """
+    async with AsyncSession(bind=shared_ctx["db_engine"]) as session:
+        yield session
+
+
 class Authorization:
     def __init__(self, app_code, perm_codes):
         self._app_code = app_code
@@ -136,25 +150,37 @@ async def _storefront_existence_validity(
     return saved_obj[0]
 
 
+async def _storefront_auth_facts(
+    session: AsyncSession, store_id: PositiveInt
+) -> StoreAuthFacts:
+    facts = await shared_ctx["store_auth_cache"].get(session, store_id)
+    if not facts:
+        raise FastApiHTTPException(
+            detail={"code": "not_exist"},
+            headers={},
+            status_code=FastApiHTTPstatus.HTTP_404_NOT_FOUND,
+        )
+    return facts
+
+
 async def _storefront_supervisor_validity(
     session: AsyncSession,
     store_id: PositiveInt,
     usr_auth: dict,
     eager_load_columns: Optional[List] = None,
 ) -> StoreProfile:
-    saved_obj = await _storefront_existence_validity(
-        session, store_id, eager_load_columns
-    )  # `supervisor_id` does not need to be added to `eager_load_columns`
+    facts = await _storefront_auth_facts(session, store_id)
     if (
         usr_auth["priv_status"] != ROLE_ID_SUPERUSER
-        and saved_obj.supervisor_id != usr_auth["profile"]
+        and facts.supervisor_id != usr_auth["profile"]
     ):
         raise FastApiHTTPException(
             detail="Not allowed to edit the store profile",
             headers={},
             status_code=FastApiHTTPstatus.HTTP_403_FORBIDDEN,
         )
-    return saved_obj
+    # the caller modifies the store, load the ORM object
+    return await _storefront_existence_validity(session, store_id, eager_load_columns)
 
 
 async def _storefront_staff_validity(
@@ -162,23 +188,26 @@ async def _storefront_staff_validity(
     store_id: PositiveInt,
     usr_auth: dict,
     eager_load_columns: Optional[List] = None,
-) -> StoreProfile:
-    if eager_load_columns:
-        eager_load_columns.append(StoreProfile.staff)
-    else:
-        eager_load_columns = [StoreProfile.staff]
-    saved_obj = await _storefront_existence_validity(
-        session, store_id, eager_load_columns
-    )
-    valid_staff_ids = list(map(lambda o: o.staff_id, saved_obj.staff))
-    valid_staff_ids.append(saved_obj.supervisor_id)
-    if usr_auth["profile"] not in valid_staff_ids:
+) -> Union[StoreProfile, StoreAuthFacts]:
+    """
+    return cached facts of the store if `eager_load_columns` is not given,
+    which is sufficient for the endpoints that only need the store ID or
+    currency, otherwise load the store profile with the given relations.
+    """
+    facts = await _storefront_auth_facts(session, store_id)
+    if not facts.is_staff(usr_auth["profile"]):
         raise FastApiHTTPException(
             detail="Not allowed to edit the store products",
             headers={},
             status_code=FastApiHTTPstatus.HTTP_403_FORBIDDEN,
         )
-    return saved_obj
+    if not eager_load_columns:
+        return facts
+    return await _storefront_existence_validity(session, store_id, eager_load_columns)
+
+
+def _invalidate_auth_facts(*store_ids):
+    shared_ctx["store_auth_cache"].invalidate(*store_ids)
 
 
 @router.post(
@@ -189,17 +218,17 @@ async def _storefront_staff_validity(
 async def add_profiles(
     request: NewStoreProfilesReqBody,
     user: dict = FastapiDepends(add_profile_authorization),
+    session: AsyncSession = FastapiDepends(get_db_session),
 ):
-    async with AsyncSession(bind=shared_ctx["db_engine"]) as session:
-        sa_new_stores = await request.validate_quota(session)
-        await StoreProfile.bulk_insert(objs=sa_new_stores, session=session)
-        for obj in sa_new_stores:
-            await session.refresh(obj, attribute_names=["id", "supervisor_id"])
+    sa_new_stores = await request.validate_quota(session)
+    await StoreProfile.bulk_insert(objs=sa_new_stores, session=session)
+    for obj in sa_new_stores:
+        await session.refresh(obj, attribute_names=["id", "supervisor_id"])
 
-        def _fn(obj):
-            return StoreProfileCreatedDto(id=obj.id, supervisor_id=obj.supervisor_id)
+    def _fn(obj):
+        return StoreProfileCreatedDto(id=obj.id, supervisor_id=obj.supervisor_id)
 
-        resp_data = list(map(_fn, sa_new_stores))
+    resp_data = list(map(_fn, sa_new_stores))
     return resp_data
 
 
@@ -213,6 +242,7 @@ async def edit_profile(
     store_id: PositiveInt,
     request: ExistingStoreProfileReqBody,
     user: dict = FastapiDepends(edit_profile_authorization),
+    session: AsyncSession = FastapiDepends(get_db_session),
 ):
     # part of authorization has to be handled at here because it requires all these arguments
     quota_arrangement = dict(map(lambda d: (d["mat_code"], d["maxnum"]), user["quota"]))
@@ -241,31 +271,31 @@ async def edit_profile(
             status_code=FastApiHTTPstatus.HTTP_403_FORBIDDEN,
         )
     # TODO, figure out better way to authorize with database connection
-    async with AsyncSession(bind=shared_ctx["db_engine"]) as session:
-        related_attributes = [
-            StoreProfile.emails,
-            StoreProfile.phones,
-            StoreProfile.location,
-        ]
-        saved_obj = await _storefront_supervisor_validity(
-            session, store_id, usr_auth=user, eager_load_columns=related_attributes
-        )
-        # perform update
-        saved_obj.label = request.label
-        saved_obj.active = request.active
-        saved_obj.emails.clear()
-        saved_obj.phones.clear()
-        saved_obj.emails.extend(
-            list(map(lambda d: StoreEmail(**d.model_dump()), request.emails))
-        )
-        saved_obj.phones.extend(
-            list(map(lambda d: StorePhone(**d.model_dump()), request.phones))
-        )
-        if request.location:
-            saved_obj.location = OutletLocation(**request.location.model_dump())
-        else:
-            saved_obj.location = None
-        await session.commit()
+    related_attributes = [
+        StoreProfile.emails,
+        StoreProfile.phones,
+        StoreProfile.location,
+    ]
+    saved_obj = await _storefront_supervisor_validity(
+        session, store_id, usr_auth=user, eager_load_columns=related_attributes
+    )
+    # perform update
+    saved_obj.label = request.label
+    saved_obj.active = request.active
+    saved_obj.emails.clear()
+    saved_obj.phones.clear()
+    saved_obj.emails.extend(
+        list(map(lambda d: StoreEmail(**d.model_dump()), request.emails))
+    )
+    saved_obj.phones.extend(
+        list(map(lambda d: StorePhone(**d.model_dump()), request.phones))
+    )
+    if request.location:
+        saved_obj.location = OutletLocation(**request.location.model_dump())
+    else:
+        saved_obj.location = None
+    await session.commit()
+    _invalidate_auth_facts(store_id)
     return None
 
 
@@ -276,20 +306,21 @@ async def switch_supervisor(
     store_id: PositiveInt,
     request: StoreSupervisorReqBody,
     user: dict = FastapiDepends(switch_supervisor_authorization),
+    session: AsyncSession = FastapiDepends(get_db_session),
 ):
-    async with AsyncSession(bind=shared_ctx["db_engine"]) as session:
-        await request.validate_quota(session)
-        saved_obj = await _storefront_supervisor_validity(
-            session, store_id, usr_auth=user
-        )
-        saved_obj.supervisor_id = request.supervisor_id
-        await session.commit()
+    await request.validate_quota(session)
+    saved_obj = await _storefront_supervisor_validity(session, store_id, usr_auth=user)
+    saved_obj.supervisor_id = request.supervisor_id
+    await session.commit()
+    _invalidate_auth_facts(store_id)
     return None
 
 
 @router.delete("/profiles", status_code=FastApiHTTPstatus.HTTP_204_NO_CONTENT)
 async def delete_profile(
-    ids: str, user: dict = FastapiDepends(delete_profile_authorization)
+    ids: str,
+    user: dict = FastapiDepends(delete_profile_authorization),
+    session: AsyncSession = FastapiDepends(get_db_session),
 ):
     try:
         ids = list(map(int, ids.split(",")))
@@ -305,15 +336,14 @@ async def delete_profile(
             headers={},
             status_code=FastApiHTTPstatus.HTTP_400_BAD_REQUEST,
         )
-    async with AsyncSession(bind=shared_ctx["db_engine"]) as _session:
-        # TODO, staff validity check if any staff member of the shop exists
-        stmt = SqlAlDelete(StoreProfile).where(StoreProfile.id.in_(ids))
-        result = await _session.execute(stmt)  # TODO, consider soft-delete
-        for s_id in ids:
-            emit_event_edit_products(
-                s_id, rpc_hdlr=shared_ctx["order_app_rpc"], remove_all=True
-            )
-        await _session.commit()
+    # TODO, staff validity check if any staff member of the shop exists
+    stmt = SqlAlDelete(StoreProfile).where(StoreProfile.id.in_(ids))
+    result = await session.execute(stmt)  # TODO, consider soft-delete
+    for s_id in ids:
+        emit_event_edit_products(session, s_id, remove_all=True)
+    await session.commit()
+    _invalidate_auth_facts(*ids)
+    _notify_event_relay()
     # Note python does not have `scope` concept, I can access the variables
     # `result` and `ids` declared above.
     if result.rowcount == 0:
@@ -330,44 +360,33 @@ async def edit_staff(
     store_id: PositiveInt,
     request: StoreStaffsReqBody,
     user: dict = FastapiDepends(edit_profile_authorization),
+    session: AsyncSession = FastapiDepends(get_db_session),
 ):
-    request.validate_staff(supervisor_id=user["profile"])
-    async with AsyncSession(bind=shared_ctx["db_engine"]) as session:
-        saved_obj = await _storefront_supervisor_validity(
-            session, store_id, usr_auth=user, eager_load_columns=[StoreProfile.staff]
-        )
-        staff_ids = list(map(lambda d: d.staff_id, request.root))
-        stmt = (
-            SqlAlSelect(StoreStaff)
-            .where(StoreStaff.store_id == saved_obj.id)
-            .where(StoreStaff.staff_id.in_(staff_ids))
+    await request.validate_staff(supervisor_id=user["profile"])
+    saved_obj = await _storefront_supervisor_validity(
+        session, store_id, usr_auth=user, eager_load_columns=[StoreProfile.staff]
+    )
+    saved_staff_ids = map(lambda s: s.staff_id, saved_obj.staff)
+    creating, updating, _ = StoreStaff.diff_by_key(
+        saved_staff_ids, request.root, key_fn=lambda d: d.staff_id
+    )
+    values = [
+        {"store_id": saved_obj.id, **d.model_dump()} for d in (creating + updating)
+    ]
+    await StoreStaff.bulk_upsert(session, values)
+    try:
+        await session.commit()
+    except Exception as e:
+        log_args = ["action", "db-commit-error", "detail", ",".join(e.args)]
+        _logger.error(None, *log_args)
+        raise FastApiHTTPException(
+            detail={},
+            headers={},
+            status_code=FastApiHTTPstatus.HTTP_500_INTERNAL_SERVER_ERROR,
         )
-        result = await session.execute(stmt)
-
-        def _do_update(raw):
-            saved_staff = raw[0]
-            newdata = filter(lambda d: d.staff_id == saved_staff.staff_id, request.root)
-            newdata = next(newdata)
-            assert newdata is not None
-            saved_staff.staff_id = newdata.staff_id
-            saved_staff.start_after = newdata.start_after
-            saved_staff.end_before = newdata.end_before
-            return saved_staff.staff_id
-
-        updatelist = tuple(map(_do_update, result))
-        newdata = filter(lambda d: d.staff_id not in updatelist, request.root)
-        new_staffs = map(lambda d: StoreStaff(**d.model_dump()), newdata)
-        saved_obj.staff.extend(new_staffs)
-        try:
-            await session.commit()
-        except Exception as e:
-            log_args = ["action", "db-commit-error", "detail", ",".join(e.args)]
-            _logger.error(None, *log_args)
-            raise FastApiHTTPException(
-                detail={},
-                headers={},
-                status_code=FastApiHTTPstatus.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
+    # the bulk upsert invalidated the entry already, invalidate it again in case
+    # any concurrent request cached the staff loaded before the commit
+    _invalidate_auth_facts(store_id)
     return None
 
 
@@ -378,29 +397,35 @@ async def edit_hours_operation(
     store_id: PositiveInt,
     request: BusinessHoursDaysReqBody,
     user: dict = FastapiDepends(edit_profile_authorization),
+    session: AsyncSession = FastapiDepends(get_db_session),
 ):
-    async with AsyncSession(bind=shared_ctx["db_engine"]) as session:
-        saved_obj = await _storefront_supervisor_validity(
-            session,
-            store_id,
-            usr_auth=user,
-            eager_load_columns=[StoreProfile.open_days],
-        )
-        new_time = list(map(lambda d: HourOfOperation(**d.model_dump()), request.root))
-        saved_obj.open_days.clear()
-        saved_obj.open_days.extend(new_time)
-        await session.commit()
+    saved_obj = await _storefront_supervisor_validity(
+        session,
+        store_id,
+        usr_auth=user,
+        eager_load_columns=[StoreProfile.open_days],
+    )
+    new_time = list(map(lambda d: HourOfOperation(**d.model_dump()), request.root))
+    saved_obj.open_days.clear()
+    saved_obj.open_days.extend(new_time)
+    await session.commit()
 
 
 def emit_event_edit_products(
+    session: AsyncSession,
     _store_id: int,
-    rpc_hdlr,
     remove_all: bool = False,
     s_currency: Optional[str] = None,
     updating: Optional[List[StoreProductAvailable]] = None,
     creating: Optional[List[StoreProductAvailable]] = None,
     deleting: Optional[dict] = None,
-):
+) -> StoreEventOutbox:
+    """
+    save the event to the outbox within the caller's transaction , which will
+    be sent to order-processing application by the outbox relay once the
+    transaction commits, so the event is neither lost nor sent for a change
+    which is rolled back
+    """
     # currently this service uses server-side timezone
     # TODO, switch to the time zones provided from client if required
     convertor = lambda obj: {
@@ -427,33 +452,19 @@ def emit_event_edit_products(
         "updating": [*_updating],
         "creating": [*_creating],
     }
-    remote_fn = rpc_hdlr.update_store_products
-    remote_fn.enable_confirm = True
-    reply_evt = remote_fn(**kwargs)
     # Note this application is NOT responsible to create the RPC
     # queue for order-processing application
-    rpc_response = reply_evt.result
-    # publish-confirm is enable here, this function only cares whether the message is sucessfully
-    # sent to message broker in the middle, the broker is responsible to prevent message loss
-    # currently I use RabbitMQ with durable queue so the data safety should be guaranteed.
-    if rpc_response["status"] != reply_evt.status_opt.INITED:
-        log_args = [
-            "action",
-            "rpc-publish",
-            "status",
-            rpc_response["status"],
-            "detail",
-            str(rpc_response["result"]),
-            "extra_err",
-            rpc_response.get("error", "N/A"),
-        ]
-        _logger.error(None, *log_args)
-        raise FastApiHTTPException(
-            detail={},
-            headers={},
-            status_code=FastApiHTTPstatus.HTTP_500_INTERNAL_SERVER_ERROR,
-        )
-    # TODO, better design option for data consistency between `storefront` and `order` app
+    return add_outbox_event(
+        session,
+        dst_app="order",
+        method="update_store_products",
+        store_id=_store_id,
+        kwargs=kwargs,
+    )
+
+
+def _notify_event_relay():
+    shared_ctx["event_relay"].notify()
 
 
 @router.patch(
@@ -463,67 +474,48 @@ async def edit_products_available(
     store_id: PositiveInt,
     request: EditProductsReqBody,
     user: dict = FastapiDepends(edit_products_authorization),
+    session: AsyncSession = FastapiDepends(get_db_session),
 ):
-    request.validate_products(staff_id=user["profile"])
-    async with AsyncSession(bind=shared_ctx["db_engine"]) as session:
-        saved_obj = await _storefront_staff_validity(session, store_id, usr_auth=user)
-        product_id_cond = map(
-            lambda d: SqlAlAnd(
-                StoreProductAvailable.product_type == d.product_type,
-                StoreProductAvailable.product_id == d.product_id,
-            ),
-            request.root,
-        )
-        find_product_condition = SqlAlOr(*product_id_cond)
-        ## Don't use `saved_obj.products` generated by SQLAlchemy legacy Query API
-        ## , instead I use `select` function to query relation fields
-        stmt = (
-            SqlAlSelect(StoreProductAvailable)
-            .where(StoreProductAvailable.store_id == saved_obj.id)
-            .where(find_product_condition)
-        )
-        resultset = await session.execute(stmt)
-        updating_products = list(map(lambda p: p[0], resultset))  # tuple
-
-        def _do_update(saved_product):
-            newdata = filter(
-                lambda d: d.product_type is saved_product.product_type
-                and d.product_id == saved_product.product_id,
-                request.root,
+    await request.validate_products(staff_id=user["profile"])
+    saved_obj = await _storefront_staff_validity(session, store_id, usr_auth=user)
+    model_cls = StoreProductAvailable
+    key_fn = lambda d: (d.product_type, d.product_id)
+    ## Don't use `saved_obj.products` generated by SQLAlchemy legacy Query API
+    ## , instead I use `select` function to query keys of relation fields
+    stmt = (
+        SqlAlSelect(model_cls.product_type, model_cls.product_id)
+        .where(model_cls.store_id == saved_obj.id)
+        .where(
+            SqlAlTuple(model_cls.product_type, model_cls.product_id).in_(
+                list(map(key_fn, request.root))
             )
-            newdata = next(newdata)
-            assert newdata is not None
-            saved_product.price = newdata.price
-            saved_product.start_after = newdata.start_after
-            saved_product.end_before = newdata.end_before
-            return (newdata.product_type, newdata.product_id)
-
-        updatelist = list(map(_do_update, updating_products))
-        newdata = filter(
-            lambda d: (d.product_type, d.product_id) not in updatelist, request.root
-        )
-        new_model_fn = lambda d: StoreProductAvailable(
-            store_id=saved_obj.id, **d.model_dump()
         )
-        new_products = list(map(new_model_fn, newdata))
-        session.add_all([*new_products])
-        emit_event_edit_products(
-            store_id,
-            s_currency=saved_obj.currency.value,
-            rpc_hdlr=shared_ctx["order_app_rpc"],
-            updating=updating_products,
-            creating=new_products,
+    )
+    resultset = await session.execute(stmt)
+    saved_keys = map(tuple, resultset)
+    new_products, updating_products, _ = model_cls.diff_by_key(
+        saved_keys, request.root, key_fn
+    )
+    values = [{"store_id": saved_obj.id, **d.model_dump()} for d in request.root]
+    await model_cls.bulk_upsert(session, values)
+    emit_event_edit_products(
+        session,
+        store_id,
+        s_currency=saved_obj.currency.value,
+        updating=updating_products,
+        creating=new_products,
+    )
+    try:
+        await session.commit()
+    except Exception as e:
+        log_args = ["action", "db-commit-error", "detail", ",".join(e.args)]
+        _logger.error(None, *log_args)
+        raise FastApiHTTPException(
+            detail={},
+            headers={},
+            status_code=FastApiHTTPstatus.HTTP_500_INTERNAL_SERVER_ERROR,
         )
-        try:
-            await session.commit()
-        except Exception as e:
-            log_args = ["action", "db-commit-error", "detail", ",".join(e.args)]
-            _logger.error(None, *log_args)
-            raise FastApiHTTPException(
-                detail={},
-                headers={},
-                status_code=FastApiHTTPstatus.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
+    _notify_event_relay()
 
 
 @router.delete(
@@ -534,6 +526,7 @@ async def discard_store_products(
     pitems: str,
     ppkgs: str,
     user: dict = FastapiDepends(edit_products_authorization),
+    session: AsyncSession = FastapiDepends(get_db_session),
 ):
     try:
         pitems = list(map(int, pitems.split(",")))
@@ -550,32 +543,20 @@ async def discard_store_products(
             headers={},
             status_code=FastApiHTTPstatus.HTTP_400_BAD_REQUEST,
         )
-    async with AsyncSession(bind=shared_ctx["db_engine"]) as _session:
-        saved_store = await _storefront_staff_validity(
-            _session, store_id, usr_auth=user
-        )
-        _cond_fn = lambda d, t: SqlAlAnd(
-            StoreProductAvailable.product_type == t,
-            StoreProductAvailable.product_id == d,
-        )
-        pitem_cond = map(partial(_cond_fn, t=SaleableTypeEnum.ITEM), pitems)
-        ppkg_cond = map(partial(_cond_fn, t=SaleableTypeEnum.PACKAGE), ppkgs)
-        find_product_condition = SqlAlOr(*pitem_cond, *ppkg_cond)
-        stmt = (
-            SqlAlDelete(StoreProductAvailable)
-            .where(StoreProductAvailable.store_id == saved_store.id)
-            .where(find_product_condition)
-        )
-        result = await _session.execute(stmt)
-        emit_event_edit_products(
-            store_id,
-            s_currency=saved_store.currency.value,
-            rpc_hdlr=shared_ctx["order_app_rpc"],
-            deleting={"items": pitems, "pkgs": ppkgs},
-        )
-        # print generated raw SOL with actual values
-        # str(stmt.compile(compile_kwargs={"literal_binds": True}))
-        await _session.commit()
+    saved_store = await _storefront_staff_validity(session, store_id, usr_auth=user)
+    keys = [(saved_store.id, SaleableTypeEnum.ITEM, i) for i in pitems]
+    keys.extend((saved_store.id, SaleableTypeEnum.PACKAGE, i) for i in ppkgs)
+    result = await StoreProductAvailable.bulk_delete(session, keys)
+    emit_event_edit_products(
+        session,
+        store_id,
+        s_currency=saved_store.currency.value,
+        deleting={"items": pitems, "pkgs": ppkgs},
+    )
+    # print generated raw SOL with actual values
+    # str(stmt.compile(compile_kwargs={"literal_binds": True}))
+    await session.commit()
+    _notify_event_relay()
     if result.rowcount == 0:
         raise FastApiHTTPException(
             detail={}, headers={}, status_code=FastApiHTTPstatus.HTTP_410_GONE
@@ -586,33 +567,155 @@ async def discard_store_products(
 ## end of def discard_store_products
 
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+PRODUCTS_CURSOR_HEADER = "x-next-cursor"
+
+
+def _parse_products_cursor(after: str) -> tuple:
+    # cursor format : `<product-type>-<product-id>` , which is the composite
+    # key of the last product in previous page
+    try:
+        product_type, product_id = after.split("-")
+        product_type = SaleableTypeEnum(int(product_type))
+        product_id = int(product_id)
+    except ValueError as e:
+        raise FastApiHTTPException(
+            detail={"after": "invalid-cursor"},
+            headers={},
+            status_code=FastApiHTTPstatus.HTTP_400_BAD_REQUEST,
+        )
+    return (product_type, product_id)
+
+
+def _products_cursor(product: StoreProductAvailable) -> str:
+    return "%s-%s" % (product.product_type.value, product.product_id)
+
+
+def _products_avail_stmt(
+    store_id: int,
+    after: Optional[str] = None,
+    price_gte: Optional[int] = None,
+    price_lte: Optional[int] = None,
+    avail_after: Optional[datetime] = None,
+    avail_before: Optional[datetime] = None,
+    limit: Optional[int] = None,
+):
+    model_cls = StoreProductAvailable
+    stmt = SqlAlSelect(model_cls).where(model_cls.store_id == store_id)
+    if after:
+        last_key = _parse_products_cursor(after)
+        stmt = stmt.where(
+            SqlAlTuple(model_cls.product_type, model_cls.product_id) > last_key
+        )
+    if price_gte is not None:
+        stmt = stmt.where(model_cls.price >= price_gte)
+    if price_lte is not None:
+        stmt = stmt.where(model_cls.price <= price_lte)
+    # select products whose available period overlaps the given time window,
+    # the time zone is removed as `EditProductReqBody` does on saving
+    if avail_after:
+        stmt = stmt.where(model_cls.end_before >= avail_after.replace(tzinfo=None))
+    if avail_before:
+        stmt = stmt.where(model_cls.start_after <= avail_before.replace(tzinfo=None))
+    stmt = stmt.order_by(model_cls.product_type.asc(), model_cls.product_id.asc())
+    if limit:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+async def _stream_products_ndjson(session: AsyncSession, stmt):
+    # the session is closed only after all rows are sent, server-side cursor
+    # avoids loading entire result set into memory
+    try:
+        resultset = await session.stream_scalars(stmt)
+        async for product in resultset:
+            line = EditProductReqBody.model_validate(product).model_dump_json()
+            yield line + "\n"
+    finally:
+        await session.close()
+
+
 @router.get("/profile/{store_id}/products", response_model=EditProductsReqBody)
 async def read_profile_products(
-    store_id: PositiveInt, user: dict = FastapiDepends(common_authentication)
+    store_id: PositiveInt,
+    response: Response,
+    after: Optional[str] = None,
+    limit: Optional[int] = Query(default=None, gt=0, le=1000),
+    price_gte: Optional[int] = Query(default=None, ge=0),
+    price_lte: Optional[int] = Query(default=None, ge=0),
+    avail_after: Optional[datetime] = None,
+    avail_before: Optional[datetime] = None,
+    accept: Optional[str] = Header(default=None),
+    user: dict = FastapiDepends(common_authentication),
 ):
-    # TODO, figure out how to handle large dataset, pagination or other techniques
-    async with AsyncSession(bind=shared_ctx["db_engine"]) as session:
-        saved_obj = await _storefront_staff_validity(
-            session, store_id, usr_auth=user, eager_load_columns=[StoreProfile.products]
-        )
-        response = EditProductsReqBody.model_validate(saved_obj.products)
-    return response
+    """
+    list products available in a store, ordered by the key (product type, product ID)
+    - with `limit` , the response includes only one page, and the header
+      `x-next-cursor` which can be passed as `after` to fetch next page, the header
+      is absent in the last page.
+    - with the header `Accept: application/x-ndjson` , the products are streamed
+      one JSON object per line.
+    """
+    stmt_kwargs = {
+        "after": after,
+        "price_gte": price_gte,
+        "price_lte": price_lte,
+        "avail_after": avail_after,
+        "avail_before": avail_before,
+    }
+    # the session is closed by the stream generator in NDJSON mode, which
+    # outlives the request-scoped session from `get_db_session()`
+    session, streaming = AsyncSession(bind=shared_ctx["db_engine"]), False
+    try:
+        saved_obj = await _storefront_staff_validity(session, store_id, usr_auth=user)
+        if accept and NDJSON_MEDIA_TYPE in accept:
+            stmt = _products_avail_stmt(saved_obj.id, limit=limit, **stmt_kwargs)
+            stmt = stmt.execution_options(yield_per=100)
+            streaming = True
+            return StreamingResponse(
+                _stream_products_ndjson(session, stmt), media_type=NDJSON_MEDIA_TYPE
+            )
+        # fetch one more row to find out whether next page exists
+        limit_plus = (limit + 1) if limit else None
+        stmt = _products_avail_stmt(saved_obj.id, limit=limit_plus, **stmt_kwargs)
+        resultset = await session.scalars(stmt)
+        products = resultset.all()
+        if limit and len(products) > limit:
+            products = products[:limit]
+            response.headers[PRODUCTS_CURSOR_HEADER] = _products_cursor(products[-1])
+        return EditProductsReqBody.model_validate(products)
+    finally:
+        if not streaming:
+            await session.close()
 
 
 @router.get("/profile/{store_id}", response_model=StoreProfileDto)
 async def read_profile(
-    store_id: PositiveInt, user: dict = FastapiDepends(common_authentication)
+    store_id: PositiveInt,
+    user: dict = FastapiDepends(common_authentication),
+    session: AsyncSession = FastapiDepends(get_db_session),
 ):
-    async with AsyncSession(bind=shared_ctx["db_engine"]) as session:
-        related_attributes = [
-            StoreProfile.phones,
-            StoreProfile.emails,
-            StoreProfile.location,
-            StoreProfile.open_days,
-            StoreProfile.staff,
-        ]
-        saved_obj = await _storefront_staff_validity(
-            session, store_id, usr_auth=user, eager_load_columns=related_attributes
-        )
-        response = StoreProfileDto.model_validate(saved_obj)
+    related_attributes = [
+        StoreProfile.phones,
+        StoreProfile.emails,
+        StoreProfile.location,
+        StoreProfile.open_days,
+        StoreProfile.staff,
+    ]
+    saved_obj = await _storefront_staff_validity(
+        session, store_id, usr_auth=user, eager_load_columns=related_attributes
+    )
+    response = StoreProfileDto.model_validate(saved_obj)
     return response
+
+
+@router.get("/internal/db_pool")
+async def read_db_pool_metrics(user: dict = FastapiDepends(common_authentication)):
+    """usage of database connection pool in current worker process"""
+    if user["priv_status"] != ROLE_ID_SUPERUSER:
+        raise FastApiHTTPException(
+            detail="Permission check failure",
+            headers={},
+            status_code=FastApiHTTPstatus.HTTP_403_FORBIDDEN,
+        )
+    return shared_ctx["db_pool_metrics"].snapshot()
@@ -0,0 +1,120 @@
+import time
+from datetime import datetime
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Dict, Tuple
+
+from sqlalchemy import select as sa_select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import StoreProfile, StoreStaff, StoreCurrency
+
+
+class StoreAuthFacts(NamedTuple):
+    """
+    minimal information of a store for access control in web API endpoints,
+    `staff` maps each staff ID to its valid period `(start_after, end_before)`
+    """
+
+    id: int
+    supervisor_id: int
+    active: bool
+    currency: StoreCurrency
+    staff: Dict[int, Tuple]
+
+    def is_staff(self, prof_id: int, now: Optional[datetime] = None) -> bool:
+        """
+        the supervisor is always valid, other staff are valid only within their
+        own period, which is checked on every read because the period might
+        begin or end while the facts are still cached.
+        """
+        if prof_id == self.supervisor_id:
+            return True
+        period = self.staff.get(prof_id)
+        if period is None:
+            return False
+        start_after, end_before = period
+        # naive datetime in server-side timezone, same as the stored period
+        now = now or datetime.now()
+        return (start_after is None or start_after < now) and (
+            end_before is None or now < end_before
+        )
+
+
+class StoreAuthCache:
+    """
+    per-process cache of `StoreAuthFacts`, each entry expires after `ttl_secs`
+    seconds, the web API endpoints which modify the supervisor, active flag,
+    or staff of a store have to invalidate the entry explicitly, bulk edits of
+    staff invalidate it through `StoreStaff.bulk_edit_hook`.
+    """
+
+    def __init__(self, ttl_secs: float = 30, max_entries: int = 4096):
+        self._ttl_secs = ttl_secs
+        self._max_entries = max_entries
+        # store ID -> (expiry time, facts), the insertion order is also the expiry
+        # order because all entries have the same TTL
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def get(
+        self, session: AsyncSession, store_id: int
+    ) -> Optional[StoreAuthFacts]:
+        now = time.monotonic()
+        entry = self._entries.get(store_id)
+        if entry and now < entry[0]:
+            return entry[1]
+        facts = await self.load(session, store_id)
+        if facts:
+            self._entries.pop(store_id, None)
+            self._entries[store_id] = (now + self._ttl_secs, facts)
+            self._evict(now)
+        return facts
+
+    @staticmethod
+    async def load(session: AsyncSession, store_id: int) -> Optional[StoreAuthFacts]:
+        # single round trip, the store profile is repeated in each row of staff
+        stmt = (
+            sa_select(
+                StoreProfile.supervisor_id,
+                StoreProfile.active,
+                StoreProfile.currency,
+                StoreStaff.staff_id,
+                StoreStaff.start_after,
+                StoreStaff.end_before,
+            )
+            .outerjoin(StoreStaff, StoreStaff.store_id == StoreProfile.id)
+            .where(StoreProfile.id == store_id)
+        )
+        resultset = await session.execute(stmt)
+        rows = resultset.all()
+        if not rows:
+            return None
+        supervisor_id, active, currency = rows[0][:3]
+        staff = {r[3]: (r[4], r[5]) for r in rows if r[3] is not None}
+        return StoreAuthFacts(
+            id=store_id,
+            supervisor_id=supervisor_id,
+            active=active,
+            currency=currency,
+            staff=staff,
+        )
+
+    def _evict(self, now):
+        entries = self._entries
+        while entries:
+            expiry, _ = next(iter(entries.values()))
+            if len(entries) <= self._max_entries and now < expiry:
+                break
+            entries.popitem(last=False)
+
+    def invalidate(self, *store_ids):
+        for store_id in store_ids:
+            self._entries.pop(store_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+## end of class StoreAuthCache
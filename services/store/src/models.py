@@ -1,5 +1,7 @@
 import enum
-from datetime import datetime
+import uuid
+from collections import Counter
+from datetime import datetime, UTC
 
 from sqlalchemy import (
     Column,
@@ -12,8 +14,16 @@ from sqlalchemy import (
     DateTime,
     Time,
     ForeignKey,
+    JSON,
+)
+from sqlalchemy import (
+    func as sa_func,
+    select as sa_select,
+    delete as sa_delete,
+    literal as sa_literal,
+    union_all as sa_union_all,
+    tuple_ as sa_tuple,
 )
-from sqlalchemy import func as sa_func, select as sa_select
 from sqlalchemy.event import listens_for
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import (
@@ -24,7 +34,8 @@ from sqlalchemy.orm import (
 )
 from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.inspection import inspect as sa_inspect
-from sqlalchemy.dialects.mysql import INTEGER as MYSQL_INTEGER
+from sqlalchemy.dialects.mysql import INTEGER as MYSQL_INTEGER, insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from ecommerce_common.models.contact.sqlalchemy import (
     EmailMixin,
@@ -65,28 +76,15 @@ class AppIdGapNumberFinder(IdGapNumberFinder):
 
     async def async_lowlvl_gap_range(self, raw_sql_queries) -> list:
         out = []
-        conn = self._session.bind
-        # TODO, figure out how to retrieve async cursor from async connection
-        # NOTE
-        # - In synchronous connection, you can get low-level cursor without too
-        #   much difficulty, so it is possible to execute multiple different SQL
-        #   statements in one network flight. Also the cursor relies on multi-statement
-        #   flag (in low-level database) to be set in database server, and it is
-        #   essential to ensure all the inputs to the SQL statements are trusted
-        # - currently SQLAlchemy does not seem to support async cursor from async
-        #   connection, it will always report errors like `sqlalchemy.exc.MissingGreenlet`
-        #   or `sqlalchemy.exc.InvalidRequestError` when attempting to invoke `cursor()`
-        #   method
-        resultset = await conn.exec_driver_sql(raw_sql_queries[0])
-        row = resultset.one_or_none()
-        if row:
-            out.append(row)
-        resultset = await conn.exec_driver_sql(raw_sql_queries[1])
-        out.extend(resultset.fetchall())
-        resultset = await conn.exec_driver_sql(raw_sql_queries[2])
-        row = resultset.fetchone()
-        if row:
-            out.append(row)
+        # the connection of current transaction, note `AsyncEngine` does not
+        # provide `exec_driver_sql()`
+        conn = await self._session.connection()
+        # NOTE, SQLAlchemy does not support async cursor from async connection,
+        # multiple statements cannot be sent in one network flight, the gap
+        # ranges are computed by single CTE query by default instead.
+        for query in raw_sql_queries:
+            resultset = await conn.exec_driver_sql(query)
+            out.extend(resultset.fetchall())
         return out
 
     def get_pk_db_column(self, model_cls) -> str:
@@ -105,6 +103,10 @@ class AppIdGapNumberFinder(IdGapNumberFinder):
 
 
 class QuotaStatisticsMixin:
+    # name of the attribute which references the owner of each item, the
+    # quota is arranged to the owner
+    quota_stats_attname = "store_id"
+
     @classmethod
     def get_existing_items_stats(cls, target_ids, attname):
         attr = getattr(cls, attname)
@@ -113,27 +115,134 @@ class QuotaStatisticsMixin:
         return query.filter(attr.in_(target_ids))
 
     @classmethod
-    async def quota_stats(cls, objs, session, target_ids, attname):
+    def _count_new_items(cls, objs, target_ids) -> dict:
+        attname = cls.quota_stats_attname
+        counter = Counter(map(lambda obj: getattr(obj, attname), objs))
+        return {
+            target_id: {
+                "num_new_items": counter.get(target_id, 0),
+                "num_existing_items": 0,
+            }
+            for target_id in target_ids
+        }
+
+    @classmethod
+    async def quota_stats(cls, objs, session, target_ids):
         # class-level validation is used for checking several instances at once
         # Note that quota has to come from trusted source e.g. authenticated JWT payload
-        attr_fd = getattr(cls, attname)
-        base_query = cls.get_existing_items_stats(target_ids, attname)
-        result = {}
-        for target_id in target_ids:
-            new_items = tuple(
-                filter(lambda obj: getattr(obj, attname) == target_id, objs)
-            )
-            num_new_items = len(new_items)
-            query = base_query.filter(attr_fd == target_id)
-            resultset = await session.execute(query)
-            existing_items = resultset.one_or_none()
-            existing_items = existing_items or (target_id, 0)
-            num_existing_items = existing_items[1]
-            result[target_id] = {
-                "num_new_items": num_new_items,
-                "num_existing_items": num_existing_items,
-            }
+        result = await bulk_quota_stats(session, {cls: (objs, target_ids)})
+        return result[cls]
+
+
+async def bulk_quota_stats(session, targets: dict) -> dict:
+    """
+    collect quota usage of several models in one round trip to database, the
+    argument `targets` maps each model class (which derives QuotaStatisticsMixin)
+    to a tuple of (`new objects`, `target IDs`) , the existing items of all the
+    models are counted by single query which combines all `GROUP BY` subqueries.
+
+    return a dict which maps each model class to the usage of its target IDs
+    , in the same format as `QuotaStatisticsMixin.quota_stats()`
+    """
+    result, subqueries = {}, []
+    model_classes = list(targets.keys())
+    for idx, model_cls in enumerate(model_classes):
+        objs, target_ids = targets[model_cls]
+        result[model_cls] = model_cls._count_new_items(objs, target_ids)
+        if not target_ids:
+            continue
+        query = model_cls.get_existing_items_stats(
+            target_ids, model_cls.quota_stats_attname
+        )
+        subqueries.append(query.add_columns(sa_literal(idx)))
+    if not subqueries:
         return result
+    if len(subqueries) == 1:
+        stmt = subqueries[0]
+    else:
+        stmt = sa_union_all(*subqueries)
+    resultset = await session.execute(stmt)
+    for target_id, num_existing_items, idx in resultset:
+        model_cls = model_classes[idx]
+        result[model_cls][target_id]["num_existing_items"] = num_existing_items
+    return result
+
+
+class BulkEditMixin:
+    """
+    set-based editing for models with composite primary key, the incoming
+    items are matched against saved rows through a dict index of the key ,
+    then applied with one upsert statement and one delete statement.
+    """
+
+    _dialect_insert_fns = {
+        "mysql": mysql_insert,
+        "sqlite": sqlite_insert,
+    }
+
+    @staticmethod
+    def diff_by_key(saved_keys, new_items, key_fn) -> tuple:
+        """
+        return tuple of (`creating`, `updating`, `deleting`) in linear time,
+        `creating` and `updating` are lists of the new items , `deleting` is
+        list of saved keys which do not appear in the new items
+        """
+        index = {key_fn(item): item for item in new_items}
+        saved_keys = set(saved_keys)
+        creating, updating = [], []
+        for key, item in index.items():
+            dst = updating if key in saved_keys else creating
+            dst.append(item)
+        deleting = [key for key in saved_keys if key not in index]
+        return creating, updating, deleting
+
+    @classmethod
+    def pk_columns(cls) -> list:
+        return list(sa_inspect(cls).primary_key)
+
+    @classmethod
+    def bulk_upsert_stmt(cls, dialect_name: str, values: list):
+        """
+        single statement which inserts the rows in `values` , or updates
+        non-key columns of rows which already exist , the statement is
+        `INSERT ... ON DUPLICATE KEY UPDATE` in MySQL / MariaDB and
+        `INSERT ... ON CONFLICT DO UPDATE` in SQLite
+        """
+        insert_fn = cls._dialect_insert_fns.get(dialect_name)
+        if not insert_fn:
+            raise NotImplementedError("unsupported dialect: %s" % dialect_name)
+        pk_names = [col.name for col in cls.pk_columns()]
+        update_names = [k for k in values[0].keys() if k not in pk_names]
+        stmt = insert_fn(cls).values(values)
+        if dialect_name == "mysql":
+            set_ = {k: stmt.inserted[k] for k in update_names}
+            stmt = stmt.on_duplicate_key_update(**set_)
+        else:
+            set_ = {k: stmt.excluded[k] for k in update_names}
+            stmt = stmt.on_conflict_do_update(index_elements=pk_names, set_=set_)
+        return stmt
+
+    @classmethod
+    async def bulk_upsert(cls, session, values: list):
+        if not values:
+            return
+        dialect_name = session.bind.dialect.name
+        await session.execute(cls.bulk_upsert_stmt(dialect_name, values))
+
+    @classmethod
+    def composite_key_filter(cls, keys: list):
+        return sa_tuple(*cls.pk_columns()).in_(keys)
+
+    @classmethod
+    async def bulk_delete(cls, session, keys: list):
+        """
+        delete rows by list of composite keys, each key has to follow the
+        order of the primary-key columns
+        """
+        if not keys:
+            return None
+        stmt = sa_delete(cls).where(cls.composite_key_filter(keys))
+        return await session.execute(stmt)
 
 
 class StoreCurrency(enum.Enum):
@@ -147,6 +256,7 @@ class StoreCurrency(enum.Enum):
 # note that an organization (e.g. a company) can have several stores (either outlet or online)
 class StoreProfile(Base, QuotaStatisticsMixin):
     quota_material = _MatCodeOptions.MAX_NUM_STORES
+    quota_stats_attname = "supervisor_id"
     __tablename__ = "store_profile"
 
     id = Column(MYSQL_INTEGER(unsigned=True), primary_key=True, autoincrement=False)
@@ -188,12 +298,6 @@ class StoreProfile(Base, QuotaStatisticsMixin):
         cascade="save-update, merge, delete, delete-orphan",
     )
 
-    @classmethod
-    async def quota_stats(cls, objs, session, target_ids):
-        return await super().quota_stats(
-            objs, session, target_ids, attname="supervisor_id"
-        )
-
     @classmethod
     async def bulk_insert(cls, objs, session):
         async def save_instance_fn():
@@ -206,7 +310,7 @@ class StoreProfile(Base, QuotaStatisticsMixin):
                 raise
 
         _id_gap_finder = AppIdGapNumberFinder(orm_model_class=cls, session=session)
-        await _id_gap_finder.async_save_with_rand_id(save_instance_fn, objs=objs)
+        await _id_gap_finder.async_save_with_reserved_ids(save_instance_fn, objs=objs)
 
 
 ## end of class StoreProfile
@@ -231,7 +335,7 @@ class TimePeriodValidMixin:
     end_before = Column(DateTime, nullable=True)
 
 
-class StoreStaff(Base, TimePeriodValidMixin, QuotaStatisticsMixin):
+class StoreStaff(Base, TimePeriodValidMixin, QuotaStatisticsMixin, BulkEditMixin):
     quota_material = _MatCodeOptions.MAX_NUM_STAFF
     __tablename__ = "store_staff"
     store_id = Column(
@@ -245,9 +349,25 @@ class StoreStaff(Base, TimePeriodValidMixin, QuotaStatisticsMixin):
     )
     store_applied = relationship("StoreProfile", back_populates="staff")
 
+    # invoked with IDs of the stores whose staff are modified by bulk edits,
+    # the application sets it to invalidate the cached authorization facts
+    bulk_edit_hook = None
+
     @classmethod
-    async def quota_stats(cls, objs, session, target_ids):
-        return await super().quota_stats(objs, session, target_ids, attname="store_id")
+    def _notify_bulk_edit(cls, store_ids):
+        if cls.bulk_edit_hook:
+            cls.bulk_edit_hook(*set(store_ids))
+
+    @classmethod
+    async def bulk_upsert(cls, session, values: list):
+        await super().bulk_upsert(session, values)
+        cls._notify_bulk_edit(v["store_id"] for v in values)
+
+    @classmethod
+    async def bulk_delete(cls, session, keys: list):
+        result = await super().bulk_delete(session, keys)
+        cls._notify_bulk_edit(k[0] for k in keys)
+        return result
 
 
 class StoreEmail(Base, EmailMixin, QuotaStatisticsMixin):
@@ -261,10 +381,6 @@ class StoreEmail(Base, EmailMixin, QuotaStatisticsMixin):
     seq = Column(SmallInteger, primary_key=True, default=0, autoincrement=False)
     store_applied = relationship("StoreProfile", back_populates="emails")
 
-    @classmethod
-    async def quota_stats(cls, objs, session, target_ids):
-        return await super().quota_stats(objs, session, target_ids, attname="store_id")
-
 
 class StorePhone(Base, PhoneMixin, QuotaStatisticsMixin):
     quota_material = _MatCodeOptions.MAX_NUM_PHONES
@@ -277,10 +393,6 @@ class StorePhone(Base, PhoneMixin, QuotaStatisticsMixin):
     seq = Column(SmallInteger, primary_key=True, default=0, autoincrement=False)
     store_applied = relationship("StoreProfile", back_populates="phones")
 
-    @classmethod
-    async def quota_stats(cls, objs, session, target_ids):
-        return await super().quota_stats(objs, session, target_ids, attname="store_id")
-
 
 class OutletLocation(Base, LocationMixin):
     __tablename__ = "outlet_location"
@@ -298,7 +410,9 @@ class SaleableTypeEnum(enum.Enum):
     PACKAGE = 2
 
 
-class StoreProductAvailable(Base, TimePeriodValidMixin, QuotaStatisticsMixin):
+class StoreProductAvailable(
+    Base, TimePeriodValidMixin, QuotaStatisticsMixin, BulkEditMixin
+):
     quota_material = _MatCodeOptions.MAX_NUM_PRODUCTS
     __tablename__ = "store_product_available"
     store_id = Column(
@@ -313,9 +427,6 @@ class StoreProductAvailable(Base, TimePeriodValidMixin, QuotaStatisticsMixin):
     store_applied = relationship("StoreProfile", back_populates="products")
 
     # NOTE, don't record inventory data at this app, do it in inventory app
-    @classmethod
-    async def quota_stats(cls, objs, session, target_ids):
-        return await super().quota_stats(objs, session, target_ids, attname="store_id")
 
 
 class HourOfOperation(Base):
@@ -331,3 +442,33 @@ class HourOfOperation(Base):
     time_open = Column(Time, nullable=False)
     time_close = Column(Time, nullable=False)
     store_applied = relationship("StoreProfile", back_populates="open_days")
+
+
+def _outbox_time_now():
+    # naive UTC time, independent from time zone of database server
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+class StoreEventOutbox(Base):
+    """
+    events to other applications, written in the same transaction as the
+    change which produces them, then published by `outbox.OutboxRelay` .
+    Each row is deleted once published, the rows which run out of attempts
+    are kept for investigation.
+    """
+
+    __tablename__ = "store_event_outbox"
+    id = Column(MYSQL_INTEGER(unsigned=True), primary_key=True, autoincrement=True)
+    # sent as message ID, the receiver can discard duplicate deliveries by it
+    idem_key = Column(
+        String(36), nullable=False, unique=True, default=lambda: str(uuid.uuid4())
+    )
+    dst_app = Column(String(32), nullable=False)
+    method = Column(String(64), nullable=False)
+    # events of the same store are published in order, no foreign key because
+    # the events of deleted stores still have to be sent
+    store_id = Column(MYSQL_INTEGER(unsigned=True), nullable=False)
+    payload = Column(JSON, nullable=False)
+    num_attempts = Column(SmallInteger, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=_outbox_time_now)
+    created_time = Column(DateTime, nullable=False, default=_outbox_time_now)
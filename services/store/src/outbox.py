@@ -0,0 +1,267 @@
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Optional, List
+
+from kombu.exceptions import OperationalError as KombuOperationalError
+from sqlalchemy import (
+    select as sa_select,
+    delete as sa_delete,
+    exists as sa_exists,
+    text as sa_text,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from ecommerce_common.util.messaging.amqp import (
+    AMQPPublisher,
+    get_producer_pool,
+    UndeliverableMessage,
+)
+from ecommerce_common.util.messaging.constants import (
+    MSG_PAYLOAD_DEFAULT_CONTENT_TYPE,
+    RPC_ROUTE_KEY_PATTERN_SEND,
+)
+from ecommerce_common.util.messaging.rpc import (
+    RPC_DEFAULT_TASK_PATH_PATTERN,
+    get_rpc_exchange,
+)
+
+from .models import StoreEventOutbox, _outbox_time_now
+
+_logger = logging.getLogger(__name__)
+
+# the event is not published because earlier event of the same store failed
+_SKIPPED = object()
+
+
+def add_outbox_event(
+    session, dst_app: str, method: str, store_id: int, kwargs: dict
+) -> StoreEventOutbox:
+    """
+    add an event to the session, it is saved only if the caller commits
+    the session, there is no remote call in this function
+    """
+    event = StoreEventOutbox(
+        dst_app=dst_app, method=method, store_id=store_id, payload=kwargs
+    )
+    session.add(event)
+    return event
+
+
+class OutboxRelay:
+    """
+    background task which drains `StoreEventOutbox` in batches, then publishes
+    each event as RPC message without waiting for the reply.
+    - the failed events are retried with exponential backoff, until
+      `max_attempts` is reached
+    - events of the same store are published in the order they were saved,
+      only one relay among all the application processes publishes at a time,
+      by holding a named lock of the database server
+    - a message may be published more than once (e.g. the process crashes
+      before the published rows are deleted), the receiver deduplicates the
+      messages by its ID, which is the idempotency key of the event.
+    """
+
+    LOCK_NAME = "store.event_outbox.relay"
+
+    def __init__(
+        self,
+        db_engine,
+        publisher: AMQPPublisher,
+        src_app_name: str = "store",
+        exchange=None,
+        batch_size: int = 50,
+        max_attempts: int = 10,
+        retry_backoff_secs: float = 2.0,
+        poll_interval_secs: float = 2.0,
+    ):
+        self._db_engine = db_engine
+        self._publisher = publisher
+        self._src_app_name = src_app_name
+        self._exchange = exchange or get_rpc_exchange({})
+        self._batch_size = batch_size
+        self._max_attempts = max_attempts
+        self._retry_backoff_secs = retry_backoff_secs
+        self._poll_interval_secs = poll_interval_secs
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    def notify(self):
+        """wake up the relay, after new events are committed"""
+        self._wakeup.set()
+
+    async def run(self):
+        while True:
+            try:
+                num_sent = await self.relay_once()
+            except Exception as e:
+                log_args = ["action", "outbox-relay-error", "detail", str(e.args)]
+                _logger.error(None, *log_args)
+                num_sent = 0
+            if num_sent >= self._batch_size:
+                continue  # more events may be pending
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), timeout=self._poll_interval_secs
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def relay_once(self) -> int:
+        """publish one batch of pending events, return number of events sent"""
+        now = _outbox_time_now()
+        async with self._db_engine.connect() as conn:
+            if not await self._acquire_lock(conn):
+                return 0  # another process is relaying the events
+            try:
+                async with AsyncSession(bind=conn) as session:
+                    num_sent = await self._relay_batch(session, now)
+            finally:
+                await self._release_lock(conn)
+        return num_sent
+
+    async def _acquire_lock(self, conn) -> bool:
+        # the named lock is released when the connection is closed, other
+        # database backends (e.g. SQLite for test) are not shared by processes
+        if conn.dialect.name != "mysql":
+            return True
+        stmt = sa_text("SELECT GET_LOCK(:name, 0)")
+        acquired = await conn.scalar(stmt, {"name": self.LOCK_NAME})
+        await conn.commit()
+        return acquired == 1
+
+    async def _release_lock(self, conn):
+        if conn.dialect.name != "mysql":
+            return
+        stmt = sa_text("SELECT RELEASE_LOCK(:name)")
+        await conn.execute(stmt, {"name": self.LOCK_NAME})
+        await conn.commit()
+
+    async def _relay_batch(self, session, now) -> int:
+        model_cls = StoreEventOutbox
+        prior_cls = aliased(model_cls)
+        # the events behind an earlier event of the same store in backoff
+        # period are not loaded, so they do not fill the batch
+        prior_waiting = sa_exists().where(
+            prior_cls.dst_app == model_cls.dst_app,
+            prior_cls.store_id == model_cls.store_id,
+            prior_cls.id < model_cls.id,
+            prior_cls.num_attempts < self._max_attempts,
+            prior_cls.next_attempt_at > now,
+        )
+        stmt = (
+            sa_select(model_cls)
+            .where(model_cls.num_attempts < self._max_attempts)
+            .where(model_cls.next_attempt_at <= now)
+            .where(~prior_waiting)
+            .order_by(model_cls.id.asc())
+            .limit(self._batch_size)
+        )
+        resultset = await session.scalars(stmt)
+        events = resultset.all()
+        if not events:
+            return 0
+        results = await asyncio.to_thread(self._publish_batch, events)
+        sent_ids = []
+        for event, result in zip(events, results):
+            if result is None:
+                sent_ids.append(event.id)
+            elif result is not _SKIPPED:
+                self._on_failure(event, result, now)
+        if sent_ids:
+            stmt = sa_delete(model_cls).where(model_cls.id.in_(sent_ids))
+            await session.execute(stmt)
+        await session.commit()
+        return len(sent_ids)
+
+    def _publish_batch(self, events: List[StoreEventOutbox]) -> list:
+        # run in worker thread, kombu publishes messages synchronously
+        blocked, results = set(), []
+        for event in events:
+            order_key = (event.dst_app, event.store_id)
+            if order_key in blocked:
+                results.append(_SKIPPED)
+                continue
+            try:
+                self.publish(event)
+                results.append(None)
+            except (UndeliverableMessage, KombuOperationalError, OSError) as e:
+                blocked.add(order_key)
+                results.append(e)
+        return results
+
+    def publish(self, event: StoreEventOutbox):
+        payld_metadata = {
+            "callbacks": None,
+            "errbacks": None,
+            "chain": None,
+            "chord": None,
+        }
+        payload = [[], event.payload, payld_metadata]
+        routing_key = RPC_ROUTE_KEY_PATTERN_SEND % (event.dst_app, event.method)
+        context = {
+            "id": event.idem_key,
+            "content_type": MSG_PAYLOAD_DEFAULT_CONTENT_TYPE,
+            "task": RPC_DEFAULT_TASK_PATH_PATTERN % (event.dst_app, event.method),
+            "headers": {"src_app": self._src_app_name},
+        }
+        producer_pool = get_producer_pool(
+            amqp_uri=self._publisher.amqp_uri,
+            ssl=self._publisher.ssl,
+            transport_options={"confirm_publish": True},
+        )
+        with producer_pool.acquire() as producer:
+            result = self._publisher.publish(
+                payload=payload,
+                exchange=self._exchange,
+                routing_key=routing_key,
+                mandatory=True,
+                correlation_id=event.idem_key,
+                extra_headers=context,
+                producer=producer,
+            )
+        if result is not None and getattr(result, "ready", True) is False:
+            raise UndeliverableMessage(exchange=self._exchange, routing_key=routing_key)
+
+    def _on_failure(self, event: StoreEventOutbox, error, now):
+        event.num_attempts += 1
+        backoff = self._retry_backoff_secs * pow(2, event.num_attempts - 1)
+        event.next_attempt_at = now + timedelta(seconds=backoff)
+        log_args = [
+            "action",
+            "outbox-publish-error",
+            "event_id",
+            str(event.id),
+            "store_id",
+            str(event.store_id),
+            "num_attempts",
+            str(event.num_attempts),
+            "detail",
+            str(error),
+        ]
+        if event.num_attempts >= self._max_attempts:
+            log_args.extend(["gave_up", "true"])
+        _logger.error(None, *log_args)
+
+
+## end of class OutboxRelay
@@ -6,10 +6,15 @@ from typing import Optional, Dict
 from asyncmy.constants.CLIENT import MULTI_STATEMENTS
 from fastapi import FastAPI
 
-from ecommerce_common.models.db import sqlalchemy_init_engine
+from ecommerce_common.models.db import sqlalchemy_init_engine, SqlAlchemyPoolMetrics
 from ecommerce_common.auth.keystore import create_keystore_helper
-from ecommerce_common.util import import_module_string
-from ecommerce_common.util.messaging.rpc import RPCproxy
+from ecommerce_common.util import import_module_string, _get_amqp_url
+from ecommerce_common.util.messaging.amqp import AMQPPublisher
+from ecommerce_common.util.messaging.rpc import AsyncRPCproxy
+
+from .cache import StoreAuthCache
+from .models import StoreStaff
+from .outbox import OutboxRelay
 
 _logger = logging.getLogger(__name__)
 
@@ -42,28 +47,46 @@ def _init_db_engine(conn_args: Optional[dict] = None):
         ),
         "driver_label": _settings.DRIVER_LABEL,
         "db_name": _settings.DB_NAME,
+        "pool_options": _settings.DB_POOL,
     }
     if conn_args:
         kwargs["conn_args"] = conn_args
     return sqlalchemy_init_engine(**kwargs)
 
 
+def _init_event_relay(db_engine) -> OutboxRelay:
+    cfg = _settings.EVENT_OUTBOX_RELAY
+    amqp_uri = _get_amqp_url(
+        secrets_path=os.path.join(
+            str(_settings.SYS_BASE_PATH), "common/data/secrets.json"
+        )
+    )
+    return OutboxRelay(
+        db_engine=db_engine,
+        publisher=AMQPPublisher(amqp_uri=amqp_uri),
+        src_app_name="store",
+        batch_size=cfg["batch_size"],
+        max_attempts=cfg["max_attempts"],
+        retry_backoff_secs=cfg["retry_backoff_secs"],
+        poll_interval_secs=cfg["poll_interval_secs"],
+    )
+
+
 def init_shared_context() -> Dict:
     data = {
-        "auth_app_rpc": RPCproxy(
+        # replies of the RPC proxies awaited in web API endpoints are resolved
+        # in background, without blocking the event loop
+        "auth_app_rpc": AsyncRPCproxy(
             dst_app_name="user_management",
             src_app_name="store",
             srv_basepath=str(_settings.SYS_BASE_PATH),
+            reply_timeout_sec=_settings.RPC_REPLY_TIMEOUT_SECS,
         ),
-        "product_app_rpc": RPCproxy(
+        "product_app_rpc": AsyncRPCproxy(
             dst_app_name="product",
             src_app_name="store",
             srv_basepath=str(_settings.SYS_BASE_PATH),
-        ),
-        "order_app_rpc": RPCproxy(
-            dst_app_name="order",
-            src_app_name="store",
-            srv_basepath=str(_settings.SYS_BASE_PATH),
+            reply_timeout_sec=_settings.RPC_REPLY_TIMEOUT_SECS,
         ),
         "auth_keystore": create_keystore_helper(
             cfg=_settings.KEYSTORE, import_fn=import_module_string
@@ -71,26 +94,36 @@ def init_shared_context() -> Dict:
         # the engine is the most efficient when created at module-level of application
         # , not per function or per request, modify the implementation in this app.
         "db_engine": _init_db_engine(conn_args={"client_flag": MULTI_STATEMENTS}),
+        "store_auth_cache": StoreAuthCache(
+            ttl_secs=_settings.STORE_AUTH_CACHE_TTL_SECS,
+            max_entries=_settings.STORE_AUTH_CACHE_MAX_ENTRIES,
+        ),
     }
+    StoreStaff.bulk_edit_hook = data["store_auth_cache"].invalidate
+    data["db_pool_metrics"] = SqlAlchemyPoolMetrics(data["db_engine"])
+    data["event_relay"] = _init_event_relay(db_engine=data["db_engine"])
     shared_ctx.update(data)
     return shared_ctx
 
 
 async def app_shared_context_start(_app: FastAPI):
     shr_ctx = init_shared_context()
+    if _settings.EVENT_OUTBOX_RELAY["enabled"]:
+        shr_ctx["event_relay"].start()
     _logger.debug(None, "action", "init-shared-ctx-done")
     return shr_ctx
 
 
 async def app_shared_context_destroy(_app: FastAPI):
+    # stop the relay before the database engine is disposed
+    await shared_ctx.pop("event_relay").stop()
     try:
         _db_engine = shared_ctx.pop("db_engine")
+        shared_ctx.pop("db_pool_metrics", None)
         await _db_engine.dispose()
     except Exception as e:
         log_args = ["action", "deinit-db-error-caught", "detail", ",".join(e.args)]
         _logger.error(None, *log_args)
-    rpcobj = shared_ctx.pop("order_app_rpc")
-    del rpcobj
     rpcobj = shared_ctx.pop("auth_app_rpc")
     del rpcobj
     rpcobj = shared_ctx.pop("product_app_rpc")
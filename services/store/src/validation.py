@@ -91,19 +91,10 @@ class NewStoreProfileReqBody(PydanticBaseModel):
         return obj
 
 
-def _get_supervisor_auth(prof_ids):  # TODO, async operation
-    reply_evt = shared_ctx["auth_app_rpc"].get_profile(
+async def _get_supervisor_auth(prof_ids):
+    reply_evt = await shared_ctx["auth_app_rpc"].get_profile(
         ids=prof_ids, fields=["id", "auth", "quota"]
     )
-    if not reply_evt.finished:
-        for _ in range(
-            shared_ctx["settings"].NUM_RETRY_RPC_RESPONSE
-        ):  # TODO, async task
-            reply_evt.refresh(retry=False, timeout=0.5, num_of_msgs_fetch=1)
-            if reply_evt.finished:
-                break
-            else:
-                pass
     rpc_response = reply_evt.result
     if rpc_response["status"] != reply_evt.status_opt.SUCCESS:
         raise FastApiHTTPException(
@@ -118,17 +109,20 @@ class NewStoreProfilesReqBody(PydanticRootModel[List[NewStoreProfileReqBody]]):
     @field_validator("root")  # map to default field name in the root-model
     def validate_list_items(cls, values):
         assert values and any(values), "Empty request body Not Allowed"
-        req_prof_ids = list(set(map(lambda obj: obj.supervisor_id, values)))
-        supervisor_verified = _get_supervisor_auth(req_prof_ids)
-        quota_arrangement = cls._estimate_quota(values, supervisor_verified)
-        cls._contact_common_quota_check(
-            values, quota_arrangement, label="emails", mat_model_cls=StoreEmail
+        return values
+
+    async def validate_supervisor(self):
+        req_prof_ids = list(set(map(lambda obj: obj.supervisor_id, self.root)))
+        supervisor_verified = await _get_supervisor_auth(req_prof_ids)
+        quota_arrangement = self._estimate_quota(self.root, supervisor_verified)
+        self._contact_common_quota_check(
+            self.root, quota_arrangement, label="emails", mat_model_cls=StoreEmail
         )
-        cls._contact_common_quota_check(
-            values, quota_arrangement, label="phones", mat_model_cls=StorePhone
+        self._contact_common_quota_check(
+            self.root, quota_arrangement, label="phones", mat_model_cls=StorePhone
         )
-        return values
 
+    @staticmethod
     def _estimate_quota(values, supervisor_verified):
         supervisor_verified = {item["id"]: item for item in supervisor_verified}
         out = {}
@@ -180,6 +174,7 @@ class NewStoreProfilesReqBody(PydanticRootModel[List[NewStoreProfileReqBody]]):
             )
 
     async def validate_quota(self, session):
+        await self.validate_supervisor()
         # quota check, for current user who adds these new items
         new_stores = list(
             map(NewStoreProfileReqBody._pydantic_to_sqlalchemy, self.root)
@@ -233,20 +228,6 @@ class ExistingStoreProfileReqBody(PydanticBaseModel):
 class StoreSupervisorReqBody(PydanticBaseModel):
     supervisor_id: PositiveInt  # for new supervisor
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        req_prof_id = self.supervisor_id
-        supervisor_verified = _get_supervisor_auth([req_prof_id])
-        quota_arrangement = self._estimate_quota(supervisor_verified, req_prof_id)
-        self.metadata = {"quota_arrangement": quota_arrangement}
-
-    def __setattr__(self, name, value):
-        if name == "metadata":
-            # the attribute is for internal use, skip type checking
-            self.__dict__[name] = value
-        else:
-            super().__setattr__(name, value)
-
     def _estimate_quota(self, supervisor_verified, req_prof_id):
         supervisor_verified = {item["id"]: item for item in supervisor_verified}
         out = {}
@@ -263,7 +244,8 @@ class StoreSupervisorReqBody(PydanticBaseModel):
 
     async def validate_quota(self, session):
         prof_id = self.supervisor_id
-        quota_arrangement = self.metadata["quota_arrangement"]
+        supervisor_verified = await _get_supervisor_auth([prof_id])
+        quota_arrangement = self._estimate_quota(supervisor_verified, prof_id)
         quota_chk_result = await StoreProfile.quota_stats(
             [], session=session, target_ids=[prof_id]
         )
@@ -299,20 +281,11 @@ class StoreStaffsReqBody(PydanticRootModel[List[StoreStaffReqBody]]):
             )
         return values
 
-    def validate_staff(self, supervisor_id: int):
+    async def validate_staff(self, supervisor_id: int):
         staff_ids = list(map(lambda obj: obj.staff_id, self.root))
-        reply_evt = shared_ctx["auth_app_rpc"].profile_descendant_validity(
+        reply_evt = await shared_ctx["auth_app_rpc"].profile_descendant_validity(
             asc=supervisor_id, descs=staff_ids
         )
-        if not reply_evt.finished:
-            for _ in range(
-                shared_ctx["settings"].NUM_RETRY_RPC_RESPONSE
-            ):  # TODO, async task
-                reply_evt.refresh(retry=False, timeout=0.4, num_of_msgs_fetch=1)
-                if reply_evt.finished:
-                    break
-                else:
-                    pass
         rpc_response = reply_evt.result
         if rpc_response["status"] != reply_evt.status_opt.SUCCESS:
             raise FastApiHTTPException(
@@ -394,7 +367,7 @@ class EditProductsReqBody(PydanticRootModel[List[EditProductReqBody]]):
             )
         return values
 
-    def validate_products(self, staff_id: int):
+    async def validate_products(self, staff_id: int):
         filtered = filter(
             lambda obj: obj.product_type == SaleableTypeEnum.ITEM, self.root
         )
@@ -406,22 +379,13 @@ class EditProductsReqBody(PydanticRootModel[List[EditProductReqBody]]):
         fields_present = [
             "id",
         ]
-        reply_evt = shared_ctx["product_app_rpc"].get_product(
+        reply_evt = await shared_ctx["product_app_rpc"].get_product(
             item_ids=item_ids,
             pkg_ids=pkg_ids,
             profile=staff_id,
             item_fields=fields_present,
             pkg_fields=fields_present,
         )
-        if not reply_evt.finished:
-            for _ in range(
-                shared_ctx["settings"].NUM_RETRY_RPC_RESPONSE
-            ):  # TODO, async task
-                reply_evt.refresh(retry=False, timeout=0.4, num_of_msgs_fetch=1)
-                if reply_evt.finished:
-                    break
-                else:
-                    pass
         rpc_response = reply_evt.result
         if rpc_response["status"] != reply_evt.status_opt.SUCCESS:
             raise FastApiHTTPException(
@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+
+from tests.common_sqlite import sqlite_session
+from store.cache import StoreAuthCache
+from store.models import StoreProfile, StoreStaff, StoreCurrency
+
+
+async def _setup_store(session):
+    t0 = datetime(2024, 5, 1)
+    store = StoreProfile(
+        id=31, label="auth", supervisor_id=7, active=True, currency=StoreCurrency.IDR
+    )
+    session.add(store)
+    await session.flush()
+    staff = [
+        StoreStaff(store_id=store.id, staff_id=sid, start_after=t0, end_before=t1)
+        for sid, t1 in ((701, t0 + timedelta(days=3)), (702, None))
+    ]
+    session.add_all(staff)
+    await session.commit()
+    return store
+
+
+@pytest.mark.asyncio
+async def test_load_and_hit(sqlite_session):
+    await _setup_store(sqlite_session)
+    cache = StoreAuthCache(ttl_secs=60)
+    sqlite_session.info["stmts_sent"].clear()
+    facts = await cache.get(sqlite_session, 31)
+    assert len(sqlite_session.info["stmts_sent"]) == 1
+    assert facts.supervisor_id == 7
+    assert facts.active is True
+    assert facts.currency is StoreCurrency.IDR
+    assert set(facts.staff.keys()) == {701, 702}
+    assert facts.staff[701][1] == datetime(2024, 5, 4)
+    assert facts.is_staff(7) and facts.is_staff(702)
+    assert not facts.is_staff(703)
+    assert not facts.is_staff(701)  # the period ended long ago
+    facts2 = await cache.get(sqlite_session, 31)
+    assert facts2 is facts
+    assert len(sqlite_session.info["stmts_sent"]) == 1
+
+
+@pytest.mark.asyncio
+async def test_expiry_and_invalidate(sqlite_session):
+    await _setup_store(sqlite_session)
+    cache = StoreAuthCache(ttl_secs=10)
+    with patch("store.cache.time.monotonic", return_value=100.0):
+        await cache.get(sqlite_session, 31)
+    sqlite_session.info["stmts_sent"].clear()
+    with patch("store.cache.time.monotonic", return_value=109.0):
+        await cache.get(sqlite_session, 31)
+    assert len(sqlite_session.info["stmts_sent"]) == 0
+    with patch("store.cache.time.monotonic", return_value=111.0):
+        await cache.get(sqlite_session, 31)
+    assert len(sqlite_session.info["stmts_sent"]) == 1
+    # modified by write endpoints, then invalidated
+    sqlite_session.add(StoreStaff(store_id=31, staff_id=703))
+    await sqlite_session.commit()
+    cache.invalidate(31, 32)
+    assert len(cache) == 0
+    facts = await cache.get(sqlite_session, 31)
+    assert facts.is_staff(703)
+
+
+@pytest.mark.asyncio
+async def test_missing_store_and_eviction(sqlite_session):
+    await _setup_store(sqlite_session)
+    sqlite_session.add_all(
+        [
+            StoreProfile(id=sid, label="s", supervisor_id=8, currency="TWD")
+            for sid in (32, 33)
+        ]
+    )
+    await sqlite_session.commit()
+    cache = StoreAuthCache(ttl_secs=60, max_entries=2)
+    facts = await cache.get(sqlite_session, 9999)
+    assert facts is None
+    assert len(cache) == 0
+    for sid in (31, 32, 33):
+        facts = await cache.get(sqlite_session, sid)
+        assert facts.id == sid
+        assert facts.staff == {} or sid == 31
+    assert len(cache) == 2
+    sqlite_session.info["stmts_sent"].clear()
+    await cache.get(sqlite_session, 31)
+    assert len(sqlite_session.info["stmts_sent"]) == 1
+
+
+@pytest.mark.asyncio
+async def test_staff_valid_period(sqlite_session):
+    await _setup_store(sqlite_session)
+    cache = StoreAuthCache(ttl_secs=60)
+    facts = await cache.get(sqlite_session, 31)
+    t0 = datetime(2024, 5, 1)
+    # same cached facts, checked against the time of each read
+    assert not facts.is_staff(701, now=t0 - timedelta(seconds=1))
+    assert facts.is_staff(701, now=t0 + timedelta(days=1))
+    assert not facts.is_staff(701, now=t0 + timedelta(days=3))
+    assert facts.is_staff(702, now=t0 + timedelta(days=3650))
+    assert not facts.is_staff(702, now=t0 - timedelta(days=1))
+    # supervisor does not have valid period
+    assert facts.is_staff(7, now=t0 - timedelta(days=1))
+
+
+@pytest.mark.asyncio
+async def test_staff_bulk_edit_invalidate(sqlite_session):
+    await _setup_store(sqlite_session)
+    cache = StoreAuthCache(ttl_secs=60)
+    await cache.get(sqlite_session, 31)
+    assert len(cache) == 1
+    with patch.object(StoreStaff, "bulk_edit_hook", cache.invalidate):
+        values = [{"store_id": 31, "staff_id": 703, "start_after": None}]
+        await StoreStaff.bulk_upsert(sqlite_session, values)
+        assert len(cache) == 0
+        await sqlite_session.commit()
+        facts = await cache.get(sqlite_session, 31)
+        assert facts.is_staff(703)
+        await StoreStaff.bulk_delete(sqlite_session, [(31, 703)])
+        assert len(cache) == 0
+        await sqlite_session.commit()
+        facts = await cache.get(sqlite_session, 31)
+        assert not facts.is_staff(703)
@@ -0,0 +1,162 @@
+"""
+micro-benchmark of editing products available in a store, against SQLite
+in-memory database through `aiosqlite`
+
+run the script by the command :
+    python -m tests.benchmark.bulk_edit [--num-items 5000] [--rounds 3]
+
+Half of the edited items already exist in the store, the rest are new.
+- `nested-scan` : the approach used before, which matches each saved row
+  with the incoming items by scanning the list, then updates ORM objects
+  one by one. (saved rows are loaded by store ID only, because the condition
+  of thousands of OR-ed composite keys exceeds expression depth of SQLite)
+- `dict-upsert` : dict-indexed diff, then one bulk upsert statement
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select as sa_select, tuple_ as sa_tuple
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from store.models import (
+    Base,
+    StoreProfile,
+    StoreCurrency,
+    StoreProductAvailable,
+    SaleableTypeEnum,
+)
+
+STORE_ID = 123
+
+
+class _EditItem:
+    # stand-in for `EditProductReqBody` , which requires the service context
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+    def model_dump(self):
+        return dict(self.__dict__)
+
+
+def _gen_items(num_items):
+    t0 = datetime(2024, 1, 1)
+    sale_types = list(SaleableTypeEnum)
+    keys = random.sample(
+        [(t, i) for t in sale_types for i in range(1, num_items * 2)], k=num_items
+    )
+    return [
+        _EditItem(
+            product_type=t,
+            product_id=i,
+            price=random.randrange(1, 9999),
+            start_after=t0,
+            end_before=t0 + timedelta(days=random.randrange(1, 30)),
+        )
+        for t, i in keys
+    ]
+
+
+async def _setup(engine, items):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSession(bind=engine) as session:
+        session.add(
+            StoreProfile(
+                id=STORE_ID,
+                label="bench",
+                supervisor_id=1,
+                active=True,
+                currency=StoreCurrency.TWD,
+            )
+        )
+        await session.flush()
+        saved = [
+            StoreProductAvailable(store_id=STORE_ID, **d.model_dump())
+            for d in items[::2]
+        ]
+        session.add_all(saved)
+        await session.commit()
+
+
+async def _nested_scan(engine, items):
+    async with AsyncSession(bind=engine) as session:
+        stmt = sa_select(StoreProductAvailable).where(
+            StoreProductAvailable.store_id == STORE_ID
+        )
+        resultset = await session.execute(stmt)
+        saved_products = list(map(lambda p: p[0], resultset))
+
+        def _do_update(saved_product):
+            newdata = filter(
+                lambda d: d.product_type is saved_product.product_type
+                and d.product_id == saved_product.product_id,
+                items,
+            )
+            newdata = next(newdata)
+            saved_product.price = newdata.price
+            saved_product.start_after = newdata.start_after
+            saved_product.end_before = newdata.end_before
+            return (newdata.product_type, newdata.product_id)
+
+        updatelist = list(map(_do_update, saved_products))
+        newdata = filter(
+            lambda d: (d.product_type, d.product_id) not in updatelist, items
+        )
+        new_products = [
+            StoreProductAvailable(store_id=STORE_ID, **d.model_dump()) for d in newdata
+        ]
+        session.add_all(new_products)
+        await session.commit()
+
+
+async def _dict_upsert(engine, items):
+    model_cls = StoreProductAvailable
+    key_fn = lambda d: (d.product_type, d.product_id)
+    async with AsyncSession(bind=engine) as session:
+        stmt = (
+            sa_select(model_cls.product_type, model_cls.product_id)
+            .where(model_cls.store_id == STORE_ID)
+            .where(
+                sa_tuple(model_cls.product_type, model_cls.product_id).in_(
+                    list(map(key_fn, items))
+                )
+            )
+        )
+        resultset = await session.execute(stmt)
+        model_cls.diff_by_key(map(tuple, resultset), items, key_fn)
+        values = [{"store_id": STORE_ID, **d.model_dump()} for d in items]
+        await model_cls.bulk_upsert(session, values)
+        await session.commit()
+
+
+async def run(num_items, rounds):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    items = _gen_items(num_items)
+    for label, edit_fn in (
+        ("nested-scan", _nested_scan),
+        ("dict-upsert", _dict_upsert),
+    ):
+        elapsed = []
+        for _ in range(rounds):
+            await _setup(engine, items)
+            t0 = time.perf_counter()
+            await edit_fn(engine, items)
+            elapsed.append(time.perf_counter() - t0)
+        print(
+            "%-12s: %9.2f ms , best of %d rounds, %d items per edit"
+            % (label, min(elapsed) * 1000, rounds, num_items)
+        )
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-items", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(run(num_items=args.num_items, rounds=args.rounds))
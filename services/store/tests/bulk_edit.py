@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select as sa_select
+from sqlalchemy.dialects import mysql as mysql_dialect
+
+from tests.common_sqlite import sqlite_session
+from store.models import (
+    StoreProfile,
+    StoreStaff,
+    StoreCurrency,
+    StoreProductAvailable,
+    SaleableTypeEnum,
+)
+
+
+async def _setup_store(session, num_products):
+    t0 = datetime(2024, 1, 1)
+    store = StoreProfile(
+        id=71, label="bulk", supervisor_id=3, active=True, currency=StoreCurrency.THB
+    )
+    session.add(store)
+    await session.flush()
+    products = [
+        StoreProductAvailable(
+            store_id=store.id,
+            product_type=SaleableTypeEnum.ITEM,
+            product_id=idx,
+            price=100,
+            start_after=t0,
+            end_before=t0 + timedelta(days=1),
+        )
+        for idx in range(1, num_products + 1)
+    ]
+    session.add_all(products)
+    await session.commit()
+    return store
+
+
+def _product_values(store_id, product_id, price, product_type=SaleableTypeEnum.ITEM):
+    t0 = datetime(2024, 2, 1)
+    return {
+        "store_id": store_id,
+        "product_type": product_type,
+        "product_id": product_id,
+        "price": price,
+        "start_after": t0,
+        "end_before": t0 + timedelta(days=3),
+    }
+
+
+def test_diff_by_key():
+    key_fn = lambda d: (d["t"], d["id"])
+    saved_keys = [(1, 10), (1, 11), (2, 10)]
+    new_items = [{"t": 1, "id": 11}, {"t": 2, "id": 12}, {"t": 2, "id": 10}]
+    creating, updating, deleting = StoreProductAvailable.diff_by_key(
+        saved_keys, new_items, key_fn
+    )
+    assert creating == [{"t": 2, "id": 12}]
+    assert updating == [{"t": 1, "id": 11}, {"t": 2, "id": 10}]
+    assert deleting == [(1, 10)]
+
+
+def test_upsert_stmt_mysql():
+    values = [_product_values(71, 1, 99)]
+    stmt = StoreProductAvailable.bulk_upsert_stmt("mysql", values)
+    raw_sql = str(stmt.compile(dialect=mysql_dialect.dialect()))
+    assert "ON DUPLICATE KEY UPDATE" in raw_sql
+    assert "price = VALUES(price)" in raw_sql
+    assert "product_id = VALUES(product_id)" not in raw_sql
+    with pytest.raises(NotImplementedError):
+        StoreProductAvailable.bulk_upsert_stmt("oracle", values)
+
+
+@pytest.mark.asyncio
+async def test_products_upsert_delete(sqlite_session):
+    store = await _setup_store(sqlite_session, num_products=5)
+    values = [
+        _product_values(store.id, 2, price=250),
+        _product_values(store.id, 3, price=350),
+        _product_values(store.id, 9, price=900),
+        _product_values(store.id, 2, price=20, product_type=SaleableTypeEnum.PACKAGE),
+    ]
+    sqlite_session.info["stmts_sent"].clear()
+    await StoreProductAvailable.bulk_upsert(sqlite_session, values)
+    assert len(sqlite_session.info["stmts_sent"]) == 1
+    keys = [
+        (store.id, SaleableTypeEnum.ITEM, 1),
+        (store.id, SaleableTypeEnum.ITEM, 9),
+        (store.id, SaleableTypeEnum.PACKAGE, 7),
+    ]
+    result = await StoreProductAvailable.bulk_delete(sqlite_session, keys)
+    assert result.rowcount == 2
+    await sqlite_session.commit()
+    assert len(sqlite_session.info["stmts_sent"]) == 2
+
+    stmt = sa_select(
+        StoreProductAvailable.product_type,
+        StoreProductAvailable.product_id,
+        StoreProductAvailable.price,
+    ).where(StoreProductAvailable.store_id == store.id)
+    resultset = await sqlite_session.execute(stmt)
+    actual = {(r[0], r[1]): r[2] for r in resultset}
+    assert actual == {
+        (SaleableTypeEnum.ITEM, 2): 250,
+        (SaleableTypeEnum.ITEM, 3): 350,
+        (SaleableTypeEnum.ITEM, 4): 100,
+        (SaleableTypeEnum.ITEM, 5): 100,
+        (SaleableTypeEnum.PACKAGE, 2): 20,
+    }
+
+
+@pytest.mark.asyncio
+async def test_staff_upsert(sqlite_session):
+    store = await _setup_store(sqlite_session, num_products=0)
+    t0 = datetime(2024, 3, 1)
+    sqlite_session.add(StoreStaff(store_id=store.id, staff_id=501, start_after=t0))
+    await sqlite_session.commit()
+    values = [
+        {"store_id": store.id, "staff_id": sid, "start_after": t0, "end_before": t1}
+        for sid, t1 in ((501, t0 + timedelta(days=5)), (502, t0 + timedelta(days=6)))
+    ]
+    await StoreStaff.bulk_upsert(sqlite_session, values)
+    await sqlite_session.commit()
+    stmt = sa_select(StoreStaff.staff_id, StoreStaff.end_before).order_by(
+        StoreStaff.staff_id
+    )
+    resultset = await sqlite_session.execute(stmt)
+    assert [tuple(r) for r in resultset] == [
+        (501, t0 + timedelta(days=5)),
+        (502, t0 + timedelta(days=6)),
+    ]
@@ -240,9 +240,10 @@ def opendays_data():
     return _opendays_data_gen()
 
 
-def _gen_time_period():
-    start_minute = random.randrange(2, 100)
-    day_length = random.randrange(365)
+def _gen_time_period(start_minute=None):
+    if start_minute is None:
+        start_minute = random.randrange(2, 100)
+    day_length = random.randrange(1, 365)
     start_after = datetime.now(UTC).replace(microsecond=0)
     start_after += timedelta(minutes=start_minute)
     end_before = start_after + timedelta(days=day_length)
@@ -252,7 +253,10 @@ def _gen_time_period():
 def _staff_data_gen():
     staff_id = 3
     while True:
-        start_after, end_before = _gen_time_period()
+        # staff has to be valid at the time the tests log in with its ID
+        start_after, end_before = _gen_time_period(
+            start_minute=-random.randrange(2, 100)
+        )
         new_data = {
             "staff_id": staff_id,
             "start_after": start_after,
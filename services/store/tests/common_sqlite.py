@@ -0,0 +1,27 @@
+"""
+fixtures backed by in-memory SQLite database (through `aiosqlite`), for the
+tests which verify shape and number of SQL statements without MariaDB server
+"""
+
+import pytest_asyncio
+from sqlalchemy import event as sa_event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from store.models import Base
+
+
+@pytest_asyncio.fixture(scope="function")
+async def sqlite_session():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    stmts_sent = []
+
+    def _record_stmt(conn, cursor, statement, parameters, context, executemany):
+        stmts_sent.append(statement)
+
+    sa_event.listen(engine.sync_engine, "before_cursor_execute", _record_stmt)
+    async with AsyncSession(bind=engine, expire_on_commit=False) as session:
+        session.info["stmts_sent"] = stmts_sent
+        yield session
+    await engine.dispose()
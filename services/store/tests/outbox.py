@@ -0,0 +1,184 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from kombu import Connection, Queue
+from sqlalchemy import select as sa_select
+
+from ecommerce_common.util.messaging.amqp import (
+    AMQPPublisher,
+    UndeliverableMessage,
+    clear_producer_pools,
+)
+from ecommerce_common.util.messaging.rpc import get_rpc_exchange
+
+from tests.common_sqlite import sqlite_session
+from store.models import StoreEventOutbox, _outbox_time_now
+from store.outbox import OutboxRelay, add_outbox_event
+
+MEMORY_BROKER_URL = "memory://"
+
+
+@pytest.fixture
+def order_app_queue():
+    exchange = get_rpc_exchange({})
+    queue = Queue(
+        "rpc.order.update_store_products",
+        exchange=exchange,
+        routing_key="rpc.order.update_store_products",
+    )
+    with Connection(MEMORY_BROKER_URL) as conn:
+        bound_q = queue(conn.default_channel)
+        bound_q.declare()
+        yield bound_q
+        bound_q.purge()
+    clear_producer_pools()
+
+
+def _drain(bound_q) -> list:
+    out = []
+    while True:
+        message = bound_q.get(no_ack=True)
+        if message is None:
+            break
+        out.append(message)
+    return out
+
+
+def _new_relay(session, **kwargs):
+    publisher = AMQPPublisher(amqp_uri=MEMORY_BROKER_URL)
+    return OutboxRelay(db_engine=session.bind, publisher=publisher, **kwargs)
+
+
+def _add_events(session, store_ids):
+    return [
+        add_outbox_event(
+            session,
+            dst_app="order",
+            method="update_store_products",
+            store_id=sid,
+            kwargs={"s_id": sid, "seq": idx},
+        )
+        for idx, sid in enumerate(store_ids)
+    ]
+
+
+async def _saved_events(session):
+    stmt = sa_select(StoreEventOutbox).order_by(StoreEventOutbox.id)
+    session.expire_all()
+    resultset = await session.scalars(stmt)
+    return resultset.all()
+
+
+@pytest.mark.asyncio
+async def test_written_in_transaction(sqlite_session):
+    _add_events(sqlite_session, [51])
+    await sqlite_session.rollback()
+    assert await _saved_events(sqlite_session) == []
+    _add_events(sqlite_session, [51, 52])
+    await sqlite_session.commit()
+    saved = await _saved_events(sqlite_session)
+    assert [e.store_id for e in saved] == [51, 52]
+    assert saved[0].idem_key != saved[1].idem_key
+    assert all(e.num_attempts == 0 for e in saved)
+
+
+@pytest.mark.asyncio
+async def test_relay_batch(sqlite_session, order_app_queue):
+    events = _add_events(sqlite_session, [51, 52, 51, 53])
+    await sqlite_session.commit()
+    expect_keys = [e.idem_key for e in events]
+    relay = _new_relay(sqlite_session, batch_size=3)
+    num_sent = await relay.relay_once()
+    assert num_sent == 3
+    num_sent = await relay.relay_once()
+    assert num_sent == 1
+    assert await relay.relay_once() == 0
+    assert await _saved_events(sqlite_session) == []
+    messages = _drain(order_app_queue)
+    assert [m.headers["id"] for m in messages] == expect_keys
+    assert [m.properties["correlation_id"] for m in messages] == expect_keys
+    args, kwargs, _ = messages[2].decode()
+    assert args == []
+    assert kwargs == {"s_id": 51, "seq": 2}
+    assert messages[0].headers["task"] == "order.async_tasks.update_store_products"
+
+
+# the log records are structured by the formatter of this project
+@patch("store.outbox._logger")
+@pytest.mark.asyncio
+async def test_relay_retry_in_order(mocked_logger, sqlite_session, order_app_queue):
+    _add_events(sqlite_session, [51, 52, 51])
+    await sqlite_session.commit()
+    relay = _new_relay(sqlite_session, max_attempts=2, retry_backoff_secs=30)
+    origin_publish = relay.publish
+
+    def mocked_publish(event):
+        if event.store_id == 51:
+            raise UndeliverableMessage(exchange="unit-test", routing_key="x")
+        origin_publish(event)
+
+    with patch.object(relay, "publish", side_effect=mocked_publish):
+        num_sent = await relay.relay_once()
+    assert num_sent == 1
+    saved = await _saved_events(sqlite_session)
+    # the later event of the same store is not attempted
+    assert [(e.store_id, e.num_attempts) for e in saved] == [(51, 1), (51, 0)]
+    assert saved[0].next_attempt_at > _outbox_time_now() + timedelta(seconds=20)
+    # still in backoff period, the events of store 51 wait
+    assert await relay.relay_once() == 0
+    assert len(_drain(order_app_queue)) == 1
+
+    saved[0].next_attempt_at = _outbox_time_now() - timedelta(seconds=1)
+    await sqlite_session.commit()
+    with patch.object(relay, "publish", side_effect=mocked_publish):
+        assert await relay.relay_once() == 0
+    saved = await _saved_events(sqlite_session)
+    assert [e.num_attempts for e in saved] == [2, 0]
+    # the first event runs out of attempts, it is kept but no longer blocks
+    # subsequent events of the same store
+    assert await relay.relay_once() == 1
+    saved = await _saved_events(sqlite_session)
+    assert [(e.store_id, e.num_attempts) for e in saved] == [(51, 2)]
+    messages = _drain(order_app_queue)
+    assert messages[0].decode()[1] == {"s_id": 51, "seq": 2}
+    assert mocked_logger.error.call_count == 2
+
+
+@patch("store.outbox._logger")
+@pytest.mark.asyncio
+async def test_relay_backoff_not_fill_batch(
+    mocked_logger, sqlite_session, order_app_queue
+):
+    _add_events(sqlite_session, [51, 51, 52, 53])
+    await sqlite_session.commit()
+    relay = _new_relay(sqlite_session, batch_size=2, retry_backoff_secs=30)
+    origin_publish = relay.publish
+
+    def mocked_publish(event):
+        if event.store_id == 51:
+            raise UndeliverableMessage(exchange="unit-test", routing_key="x")
+        origin_publish(event)
+
+    with patch.object(relay, "publish", side_effect=mocked_publish):
+        assert await relay.relay_once() == 0
+    # the events of store 51 wait, the other stores are served
+    assert await relay.relay_once() == 2
+    assert await relay.relay_once() == 0
+    saved = await _saved_events(sqlite_session)
+    assert [(e.store_id, e.num_attempts) for e in saved] == [(51, 1), (51, 0)]
+    messages = _drain(order_app_queue)
+    assert [m.decode()[1]["s_id"] for m in messages] == [52, 53]
+
+
+@pytest.mark.asyncio
+async def test_relay_lock_held_elsewhere(sqlite_session, order_app_queue):
+    _add_events(sqlite_session, [51, 52])
+    await sqlite_session.commit()
+    relay = _new_relay(sqlite_session)
+    with patch.object(relay, "_acquire_lock", return_value=False) as mocked_lock:
+        assert await relay.relay_once() == 0
+    assert mocked_lock.call_count == 1
+    assert len(await _saved_events(sqlite_session)) == 2
+    assert _drain(order_app_queue) == []
+    assert await relay.relay_once() == 2
@@ -1,5 +1,6 @@
+import json
 import random
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import List, Dict, Iterable
 from unittest.mock import MagicMock
 from unittest.mock import patch
@@ -30,7 +31,7 @@ from ecommerce_common.models.constants import ROLE_ID_STAFF
 from ecommerce_common.models.enums.base import AppCodeOptions, ActivationStatus
 from ecommerce_common.util.messaging.rpc import RpcReplyEvent
 
-from store.models import SaleableTypeEnum, StoreProductAvailable
+from store.models import SaleableTypeEnum, StoreProductAvailable, StoreEventOutbox
 
 app_code = AppCodeOptions.store.value[0]
 
@@ -129,15 +130,20 @@ class TestUpdate:
         url = self.url.format(store_id=obj.id)
         with patch("jwt.PyJWKClient.fetch_data", keystore._mocked_get_jwks):
             reply_evt_product = self._setup_mock_rpc_reply(body)
-            reply_evt_order = RpcReplyEvent(listener=self, timeout_s=1)
             with patch(
                 "ecommerce_common.util.messaging.rpc.MethodProxy._call"
             ) as mocked_rpc_proxy_call:
-                # this endpoint will interact with 2 different services, send the
-                # reply events in the order which is acceptable to the backend
-                mocked_rpc_proxy_call.side_effect = [reply_evt_product, reply_evt_order]
+                # the event to order-processing service is saved in outbox
+                # table, only product service is called in this endpoint
+                mocked_rpc_proxy_call.return_value = reply_evt_product
                 response = test_client.patch(url, headers=headers, json=body)
         assert response.status_code == 200
+        stmt = sa_select(StoreEventOutbox.payload).where(
+            StoreEventOutbox.store_id == obj.id
+        )
+        resultset = await session_for_verify.execute(stmt)
+        evt_payload = resultset.scalars().all()[-1]
+        assert len(evt_payload["creating"]) == num_new
         stmt = (
             sa_select(StoreProductAvailable)
             .filter(StoreProductAvailable.store_id == obj.id)
@@ -236,42 +242,40 @@ class TestUpdate:
         expect_updating = self._setup_base_req_body(
             objs=arg_updating, product_avail_gen=None, num_new_items=num_unmodified
         )
-        mocked_rpc = MagicMock()
-        mocked_rpc_fn = mocked_rpc.update_store_products
-        mocked_evt = mocked_rpc_fn.return_value
-        mocked_evt.status_opt.INITED = RpcReplyEvent.status_opt.INITED
-        mocked_evt.result = {
-            "status": RpcReplyEvent.status_opt.INITED,
-            "result": "unit-test",
-        }
-        emit_event_edit_products(
+        mocked_session = MagicMock()
+        event = emit_event_edit_products(
+            mocked_session,
             expect_store_id,
-            rpc_hdlr=mocked_rpc,
             updating=arg_updating,
             creating=arg_creating,
         )
-        mocked_rpc_fn.assert_called_once()
-        assert expect_store_id == mocked_rpc_fn.call_args.kwargs["s_id"]
-        assert mocked_rpc_fn.call_args.kwargs["rm_all"] == False
-        assert expect_updating == mocked_rpc_fn.call_args.kwargs["updating"]
-        assert expect_creating == mocked_rpc_fn.call_args.kwargs["creating"]
-        assert mocked_rpc_fn.call_args.kwargs["deleting"].get("items") is None
-        assert mocked_rpc_fn.call_args.kwargs["deleting"].get("pkgs") is None
+        mocked_session.add.assert_called_once_with(event)
+        assert event.dst_app == "order"
+        assert event.method == "update_store_products"
+        assert event.store_id == expect_store_id
+        actual_kwargs = event.payload
+        assert expect_store_id == actual_kwargs["s_id"]
+        assert actual_kwargs["rm_all"] == False
+        assert expect_updating == actual_kwargs["updating"]
+        assert expect_creating == actual_kwargs["creating"]
+        assert actual_kwargs["deleting"].get("items") is None
+        assert actual_kwargs["deleting"].get("pkgs") is None
         # subcase 2
         expect_deleting = {"items": [2, 3, 4, 5], "pkgs": [16, 79, 203]}
-        emit_event_edit_products(
-            expect_store_id, rpc_hdlr=mocked_rpc, deleting=expect_deleting
+        event = emit_event_edit_products(
+            mocked_session, expect_store_id, deleting=expect_deleting
         )
-        assert expect_store_id == mocked_rpc_fn.call_args.kwargs["s_id"]
-        assert [] == mocked_rpc_fn.call_args.kwargs["updating"]
-        assert [] == mocked_rpc_fn.call_args.kwargs["creating"]
+        actual_kwargs = event.payload
+        assert expect_store_id == actual_kwargs["s_id"]
+        assert [] == actual_kwargs["updating"]
+        assert [] == actual_kwargs["creating"]
         expect_deleting.update(
             {
                 "item_type": SaleableTypeEnum.ITEM.value,
                 "pkg_type": SaleableTypeEnum.PACKAGE.value,
             }
         )
-        assert expect_deleting == mocked_rpc_fn.call_args.kwargs["deleting"]
+        assert expect_deleting == actual_kwargs["deleting"]
 
 
 ## end of class TestUpdate
@@ -377,7 +381,7 @@ class TestDiscard:
         assert set(actual_remain) == set(expect_remain)
 
     @pytest.mark.asyncio(loop_scope="session")
-    async def test_error_emit_event(
+    async def test_event_outbox_saved(
         self,
         session_for_test,
         session_for_verify,
@@ -410,26 +414,22 @@ class TestDiscard:
             ids2=",".join(map(str, deleting_ppkgs)),
         )
         with patch("jwt.PyJWKClient.fetch_data", keystore._mocked_get_jwks):
-            reply_evt_order = RpcReplyEvent(listener=self, timeout_s=1)
-            reply_evt_order.send(
-                body={
-                    "status": RpcReplyEvent.status_opt.FAIL_PUBLISH,
-                    "error": "test-mock",
-                }
-            )
             with patch(
                 "ecommerce_common.util.messaging.rpc.MethodProxy._call"
             ) as mocked_rpc_proxy_call:
-                mocked_rpc_proxy_call.return_value = reply_evt_order
                 response = test_client.delete(renderred_url, headers=headers)
-                assert response.status_code == 500
+                assert response.status_code == 204
+                # no RPC is invoked in the request, the relay sends the event later
+                mocked_rpc_proxy_call.assert_not_called()
 
-        stmt = sa_select(
-            StoreProductAvailable.product_type, StoreProductAvailable.product_id
-        ).where(StoreProductAvailable.store_id == obj.id)
+        stmt = sa_select(StoreEventOutbox).where(StoreEventOutbox.store_id == obj.id)
         resultset = await session_for_verify.execute(stmt)
-        actual_remain = resultset.all()
-        assert len(actual_remain) == num_total
+        event = resultset.scalars().one()
+        assert event.num_attempts == 0
+        assert event.method == "update_store_products"
+        assert sorted(event.payload["deleting"]["items"]) == sorted(deleting_pitems)
+        assert sorted(event.payload["deleting"]["pkgs"]) == sorted(deleting_ppkgs)
+        assert len(event.idem_key) == 36
 
 
 ## end of class TestDiscard:
@@ -486,3 +486,130 @@ class TestRead:
             start_after = datetime.fromisoformat(result[-1]["start_after"])
             end_before = datetime.fromisoformat(result[-1]["end_before"])
             assert start_after < end_before
+
+    async def _setup_products(
+        self, session, keystore, saved_store_objs, product_avail_data, num_products
+    ):
+        obj = await anext(saved_store_objs)
+        new_products_avail = [
+            StoreProductAvailable(**next(product_avail_data))
+            for _ in range(num_products)
+        ]
+        obj.products.extend(new_products_avail)
+        await session.commit()
+        await session.refresh(obj, attribute_names=["staff", "products"])
+        auth_data = self._auth_data_pattern
+        auth_data["id"] = random.choice(obj.staff).staff_id
+        encoded_token = keystore.gen_access_token(profile=auth_data, audience=["store"])
+        headers = {"Authorization": "Bearer %s" % encoded_token}
+        return obj, headers
+
+    @staticmethod
+    def _sorted_keys(products) -> List:
+        keys = map(lambda p: (p.product_type.value, p.product_id), products)
+        return sorted(keys)
+
+    @pytest.mark.asyncio(loop_scope="session")
+    async def test_keyset_pagination(
+        self,
+        session_for_test,
+        keystore,
+        test_client,
+        saved_store_objs,
+        product_avail_data,
+    ):
+        obj, headers = await self._setup_products(
+            session_for_test, keystore, saved_store_objs, product_avail_data, 23
+        )
+        expect_keys = self._sorted_keys(obj.products)
+        actual_keys, cursor, num_pages = [], None, 0
+        with patch("jwt.PyJWKClient.fetch_data", keystore._mocked_get_jwks):
+            while True:
+                url = self.url.format(store_id=obj.id) + "?limit=10"
+                if cursor:
+                    url += "&after=%s" % cursor
+                response = test_client.get(url, headers=headers)
+                assert response.status_code == 200
+                page = response.json()
+                assert len(page) <= 10
+                actual_keys.extend((d["product_type"], d["product_id"]) for d in page)
+                num_pages += 1
+                cursor = response.headers.get("x-next-cursor")
+                if not cursor:
+                    break
+        assert num_pages == (len(expect_keys) + 9) // 10
+        assert actual_keys == expect_keys
+        # malformed cursor
+        url = self.url.format(store_id=obj.id) + "?limit=10&after=xyz"
+        with patch("jwt.PyJWKClient.fetch_data", keystore._mocked_get_jwks):
+            response = test_client.get(url, headers=headers)
+        assert response.status_code == 400
+
+    @pytest.mark.asyncio(loop_scope="session")
+    async def test_filter_price_time(
+        self,
+        session_for_test,
+        keystore,
+        test_client,
+        saved_store_objs,
+        product_avail_data,
+    ):
+        obj, headers = await self._setup_products(
+            session_for_test, keystore, saved_store_objs, product_avail_data, 20
+        )
+        prices = sorted(p.price for p in obj.products)
+        price_gte, price_lte = prices[3], prices[-4]
+        chosen = obj.products[0]
+        window_start = chosen.start_after + timedelta(seconds=1)
+        window_end = window_start + timedelta(seconds=1)
+        expect_keys = self._sorted_keys(
+            filter(
+                lambda p: price_gte <= p.price <= price_lte
+                and p.end_before >= window_start
+                and p.start_after <= window_end,
+                obj.products,
+            )
+        )
+        url = self.url.format(store_id=obj.id)
+        query_params = {
+            "price_gte": price_gte,
+            "price_lte": price_lte,
+            "avail_after": window_start.isoformat(),
+            "avail_before": window_end.isoformat(),
+        }
+        with patch("jwt.PyJWKClient.fetch_data", keystore._mocked_get_jwks):
+            response = test_client.get(url, headers=headers, params=query_params)
+        assert response.status_code == 200
+        actual_keys = [(d["product_type"], d["product_id"]) for d in response.json()]
+        assert actual_keys == expect_keys
+        assert response.headers.get("x-next-cursor") is None
+
+    @pytest.mark.asyncio(loop_scope="session")
+    async def test_stream_ndjson(
+        self,
+        session_for_test,
+        keystore,
+        test_client,
+        saved_store_objs,
+        product_avail_data,
+    ):
+        obj, headers = await self._setup_products(
+            session_for_test, keystore, saved_store_objs, product_avail_data, 15
+        )
+        headers["Accept"] = "application/x-ndjson"
+        url = self.url.format(store_id=obj.id)
+        with patch("jwt.PyJWKClient.fetch_data", keystore._mocked_get_jwks):
+            response = test_client.get(url, headers=headers)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [line for line in response.text.split("\n") if line]
+        items = list(map(json.loads, lines))
+        actual_keys = [(d["product_type"], d["product_id"]) for d in items]
+        assert actual_keys == self._sorted_keys(obj.products)
+        for item in items:
+            start_after = datetime.fromisoformat(item["start_after"])
+            end_before = datetime.fromisoformat(item["end_before"])
+            assert start_after < end_before
+
+
+## end of class TestRead
@@ -0,0 +1,85 @@
+import pytest
+
+from tests.common_sqlite import sqlite_session
+from store.models import (
+    StoreProfile,
+    StoreEmail,
+    StorePhone,
+    StoreStaff,
+    StoreCurrency,
+    bulk_quota_stats,
+)
+
+
+async def _setup_stores(session):
+    # supervisor 1001 owns store 11 and 12, supervisor 1002 owns store 13
+    stores = [
+        StoreProfile(
+            id=store_id,
+            label="store-%s" % store_id,
+            supervisor_id=supervisor_id,
+            active=True,
+            currency=StoreCurrency.TWD,
+        )
+        for store_id, supervisor_id in ((11, 1001), (12, 1001), (13, 1002))
+    ]
+    session.add_all(stores)
+    await session.flush()
+    emails = [StoreEmail(store_id=11, seq=i, addr="a%s@x.io" % i) for i in range(3)]
+    phones = [
+        StorePhone(store_id=sid, seq=0, country_code="886", line_number="2345678")
+        for sid in (11, 13)
+    ]
+    staff = [StoreStaff(store_id=12, staff_id=i) for i in (501, 502)]
+    session.add_all(emails + phones + staff)
+    await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_quota_stats_single_model(sqlite_session):
+    await _setup_stores(sqlite_session)
+    new_objs = [StoreProfile(supervisor_id=1001), StoreProfile(supervisor_id=1003)]
+    sqlite_session.info["stmts_sent"].clear()
+    result = await StoreProfile.quota_stats(
+        new_objs, session=sqlite_session, target_ids=[1001, 1002, 1003]
+    )
+    assert len(sqlite_session.info["stmts_sent"]) == 1
+    assert result == {
+        1001: {"num_new_items": 1, "num_existing_items": 2},
+        1002: {"num_new_items": 0, "num_existing_items": 1},
+        1003: {"num_new_items": 1, "num_existing_items": 0},
+    }
+
+
+@pytest.mark.asyncio
+async def test_bulk_quota_stats_many_models(sqlite_session):
+    await _setup_stores(sqlite_session)
+    store_ids = [11, 12, 13]
+    targets = {
+        StoreEmail: ([StoreEmail(store_id=12)], store_ids),
+        StorePhone: ([], store_ids),
+        StoreStaff: ([StoreStaff(store_id=12), StoreStaff(store_id=13)], store_ids),
+        StoreProfile: ([], []),
+    }
+    sqlite_session.info["stmts_sent"].clear()
+    result = await bulk_quota_stats(sqlite_session, targets)
+    assert len(sqlite_session.info["stmts_sent"]) == 1
+    existing = {
+        model_cls: {k: v["num_existing_items"] for k, v in usage.items()}
+        for model_cls, usage in result.items()
+    }
+    assert existing[StoreEmail] == {11: 3, 12: 0, 13: 0}
+    assert existing[StorePhone] == {11: 1, 12: 0, 13: 1}
+    assert existing[StoreStaff] == {11: 0, 12: 2, 13: 0}
+    assert existing[StoreProfile] == {}
+    assert result[StoreEmail][12]["num_new_items"] == 1
+    assert result[StoreStaff][13]["num_new_items"] == 1
+    assert result[StoreStaff][11]["num_new_items"] == 0
+
+
+@pytest.mark.asyncio
+async def test_bulk_quota_stats_no_target(sqlite_session):
+    sqlite_session.info["stmts_sent"].clear()
+    result = await bulk_quota_stats(sqlite_session, {StorePhone: ([], [])})
+    assert result == {StorePhone: {}}
+    assert len(sqlite_session.info["stmts_sent"]) == 0
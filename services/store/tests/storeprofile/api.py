@@ -23,7 +23,7 @@ from tests.common import (
     saved_store_objs,
 )
 
-from ecommerce_common.models.constants import ROLE_ID_STAFF
+from ecommerce_common.models.constants import ROLE_ID_STAFF, ROLE_ID_SUPERUSER
 from ecommerce_common.models.enums.base import AppCodeOptions, ActivationStatus
 from ecommerce_common.util.messaging.rpc import RpcReplyEvent
 
@@ -925,6 +925,32 @@ class TestReadWeb:
             assert result["location"][field] == getattr(obj.location, field)
 
 
+class TestDbPoolMetrics:
+    url = "/internal/db_pool"
+
+    @pytest.mark.asyncio(loop_scope="session")
+    async def test_ok(self, keystore, test_client, saved_store_objs):
+        obj = await anext(saved_store_objs)
+        auth_data = {"id": obj.supervisor_id, "quotas": [], "roles": []}
+        with patch("jwt.PyJWKClient.fetch_data", keystore._mocked_get_jwks):
+            for priv_status, expect_status in (
+                (ROLE_ID_STAFF, 403),
+                (ROLE_ID_SUPERUSER, 200),
+            ):
+                auth_data["privilege_status"] = priv_status
+                encoded_token = keystore.gen_access_token(
+                    profile=auth_data, audience=["store"]
+                )
+                headers = {"Authorization": "Bearer %s" % encoded_token}
+                response = test_client.get(self.url, headers=headers)
+                assert response.status_code == expect_status
+        result = response.json()
+        for field in ("checked_out", "overflow", "num_checkouts", "num_drained"):
+            assert result[field] >= 0
+        for field in ("connect", "hold"):
+            assert result[field]["max_secs"] >= result[field]["avg_secs"]
+
+
 class TestReadRpc:
     @pytest.mark.asyncio(loop_scope="session")
     async def test_ok(self, db_engine_resource, saved_store_objs):
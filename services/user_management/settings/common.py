@@ -134,14 +134,14 @@ CACHES = {
 AUTH_KEYSTORE = {
     "keystore": "ecommerce_common.auth.keystore.BaseAuthKeyStore",
     "persist_secret_handler": {
-        "module_path": "ecommerce_common.auth.keystore.JWKSFilePersistHandler",
+        "module_path": "ecommerce_common.auth.keystore.IndexedJWKSFilePersistHandler",
         "init_kwargs": {
             "name": "secret",
             "expired_after_days": 7,
         },
     },
     "persist_pubkey_handler": {
-        "module_path": "ecommerce_common.auth.keystore.JWKSFilePersistHandler",
+        "module_path": "ecommerce_common.auth.keystore.IndexedJWKSFilePersistHandler",
         "init_kwargs": {
             "name": "pubkey",
             "expired_after_days": 21,
@@ -1,7 +1,7 @@
 import os
 import logging
 from datetime import datetime, timedelta, date
-from typing import List
+from typing import Dict, List
 from pathlib import Path
 
 from django.utils import timezone as django_timezone
@@ -9,10 +9,16 @@ from django.utils.module_loading import import_string
 from celery.backends.rpc import RPCBackend as CeleryRpcBackend
 
 from ecommerce_common.auth.keystore import create_keystore_helper
-from ecommerce_common.util.messaging.constants import RPC_EXCHANGE_DEFAULT_NAME
+from ecommerce_common.util.messaging.constants import (
+    RPC_EXCHANGE_DEFAULT_NAME,
+    RPC_BATCH_METHOD_NAME,
+)
+from ecommerce_common.util.messaging.rpc import dispatch_rpc_batch
 from ecommerce_common.util.celery import app as celery_app
 from ecommerce_common.logging.util import log_fn_wrapper
+from softdelete.retention import purge_expired_softdeleted
 
+from .models.common import UsermgtChangeSet, DB_ALIAS_APPLIED
 from .models.base import GenericUserGroup, GenericUserProfile, QuotaMaterial
 from .models.auth import UnauthResetAccountRequest
 
@@ -47,6 +53,22 @@ def clean_expired_reset_requests(days, hours=0, minutes=0):
     return result
 
 
+@celery_app.task(queue="usermgt_default")
+@log_fn_wrapper(logger=_logger, loglevel=logging.INFO)
+def purge_softdeleted_data(days, batch_size=100, max_batches=10, archive=False):
+    archive_location = None
+    if archive:
+        archive_location = srv_basepath.joinpath("tmp/archive/user_management")
+    return purge_expired_softdeleted(
+        changeset_cls=UsermgtChangeSet,
+        days=days,
+        batch_size=batch_size,
+        max_batches=max_batches,
+        using=DB_ALIAS_APPLIED,
+        archive_location=archive_location,
+    )
+
+
 def _rotate_keystores_setup(module_setup):
     hdlr_args = module_setup["persist_secret_handler"]["init_kwargs"]
     if hdlr_args.get("filepath"):  # TODO, better design approach
@@ -146,3 +168,20 @@ def profile_descendant_validity(asc: int, descs: List[int]) -> List[int]:
     )
     valid_desc_ids = valid_desc_profs.filter(id__in=descs).values_list("id", flat=True)
     return list(valid_desc_ids)
+
+
+@celery_app.task(
+    backend=CeleryRpcBackend(app=celery_app),
+    queue="rpc_usermgt_batch_dispatch",
+    bind=True,
+    exchange=RPC_EXCHANGE_DEFAULT_NAME,
+    routing_key="rpc.user_management.%s" % RPC_BATCH_METHOD_NAME,
+)
+@log_fn_wrapper(logger=_logger, loglevel=logging.WARNING, log_if_succeed=False)
+def batch_dispatch(self, calls: List[Dict]) -> List[Dict]:
+    """run several RPC invocations packed by `RpcBatch` in one go"""
+    registry = {
+        "get_profile": get_profile,
+        "profile_descendant_validity": profile_descendant_validity,
+    }
+    return dispatch_rpc_batch(self, calls=calls, registry=registry)
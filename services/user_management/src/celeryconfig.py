@@ -65,6 +65,7 @@ def init_rpc(app):
     from ecommerce_common.util.messaging.constants import (
         RPC_EXCHANGE_DEFAULT_NAME,
         RPC_EXCHANGE_DEFAULT_TYPE,
+        RPC_BATCH_METHOD_NAME,
     )
 
     exchange = kombu.Exchange(
@@ -90,5 +91,10 @@ def init_rpc(app):
             exchange=exchange,
             routing_key="rpc.user_management.profile_descendant_validity",
         ),
+        kombu.Queue(
+            "rpc_usermgt_batch_dispatch",
+            exchange=exchange,
+            routing_key="rpc.user_management.%s" % RPC_BATCH_METHOD_NAME,
+        ),
     ]
     kombu_pool_set_limit(limit=2)
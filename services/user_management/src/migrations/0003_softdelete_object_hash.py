@@ -0,0 +1,57 @@
+from django.db import migrations, models
+import softdelete.models
+
+
+def _backfill_object_hash(apps, schema_editor):
+    for model_name in ("UsermgtChangeSet", "UsermgtSoftDeleteRecord"):
+        model_cls = apps.get_model("user_management", model_name)
+        softdelete.models.backfill_object_hash(
+            model_cls, using=schema_editor.connection.alias
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("user_management", "0002_rawsqls"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="usermgtchangeset",
+            name="object_hash",
+            field=softdelete.models.ObjectIdHashField(
+                db_column="object_hash", db_index=True, editable=False, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="usermgtsoftdeleterecord",
+            name="object_hash",
+            field=softdelete.models.ObjectIdHashField(
+                db_column="object_hash", db_index=True, editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(
+            _backfill_object_hash, reverse_code=migrations.RunPython.noop
+        ),
+        migrations.AlterField(
+            model_name="usermgtchangeset",
+            name="object_hash",
+            field=softdelete.models.ObjectIdHashField(
+                db_column="object_hash", db_index=True, editable=False
+            ),
+        ),
+        migrations.AlterField(
+            model_name="usermgtsoftdeleterecord",
+            name="object_hash",
+            field=softdelete.models.ObjectIdHashField(
+                db_column="object_hash", db_index=True, editable=False
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="usermgtchangeset",
+            index=models.Index(
+                fields=["content_type", "done_by", "time_created"],
+                name="usermgt_cset_newest_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,14 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("user_management", "0003_softdelete_object_hash"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="usermgtchangeset",
+            index=models.Index(fields=["time_created"], name="usermgt_cset_time_idx"),
+        ),
+    ]
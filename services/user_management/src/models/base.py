@@ -581,8 +581,9 @@ class GenericUserProfile(GenericUserCommonFieldsMixin, MinimumInfoMixin):
             ):
                 raise
             prof_cls_ct = ContentType.objects.get_for_model(self)
-            qset = self.SOFTDELETE_CHANGESET_MODEL.objects.filter(
-                content_type=prof_cls_ct, object_id=self.pk
+            cs_cls = self.SOFTDELETE_CHANGESET_MODEL
+            qset = cs_cls.objects.filter(
+                content_type=prof_cls_ct, **cs_cls.obj_ids_lookup([self.pk])
             )
             if not qset.exists():
                 raise
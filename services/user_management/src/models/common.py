@@ -14,6 +14,15 @@ _atomicity_fn = partial(transaction.atomic, using=DB_ALIAS_APPLIED)
 class UsermgtChangeSet(ChangeSet):
     class Meta:
         db_table = "usermgt_soft_delete_changeset"
+        # index seek for recovery of the newest deletion done by a user
+        indexes = [
+            models.Index(
+                fields=["content_type", "done_by", "time_created"],
+                name="usermgt_cset_newest_idx",
+            ),
+            # for retention task which scans expired changesets
+            models.Index(fields=["time_created"], name="usermgt_cset_time_idx"),
+        ]
 
 
 class UsermgtSoftDeleteRecord(SoftDeleteRecord):
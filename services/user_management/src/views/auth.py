@@ -22,7 +22,7 @@ from rest_framework.exceptions import PermissionDenied
 from rest_framework.settings import api_settings as drf_settings
 
 from ecommerce_common.auth.jwt import JWT, stream_jwks_file
-from ecommerce_common.auth.keystore import create_keystore_helper
+from ecommerce_common.auth.keystore import get_shared_keystore
 from ecommerce_common.auth.django.login import jwt_based_login
 from ecommerce_common.auth.django.authentication import (
     RefreshJWTauthentication,
@@ -392,7 +392,7 @@ class LoginView(APIView):
         )
         err_msg = "all of the parameters have to be set when applying JWTbaseMiddleware , but some of them are unconfigured, JWT_NAME_REFRESH_TOKEN = %s"
         assert jwt_name_refresh_token, err_msg % (jwt_name_refresh_token)
-        _keystore = create_keystore_helper(
+        _keystore = get_shared_keystore(
             cfg=django_settings.AUTH_KEYSTORE, import_fn=import_string
         )
         encoded = jwt.encode(keystore=_keystore)
@@ -508,7 +508,7 @@ class RefreshAccessTokenView(APIView):
         account = request.user
         profile = account.profile
         profile_serial = self._serialize_auth_info(audience=audience, profile=profile)
-        keystore = create_keystore_helper(
+        keystore = get_shared_keystore(
             cfg=django_settings.AUTH_KEYSTORE, import_fn=import_string
         )
         now_time = datetime.utcnow()
@@ -6,6 +6,7 @@ from functools import partial
 from datetime import timedelta
 from unittest.mock import Mock, patch
 
+from django.db import transaction
 from django.test import TransactionTestCase
 from django.utils import timezone as django_timezone
 from rest_framework.exceptions import ValidationError as DRFValidationError
@@ -14,7 +15,11 @@ from rest_framework.settings import DEFAULTS as drf_default_settings
 from ecommerce_common.util import sort_nested_object
 from ecommerce_common.tests.common import TreeNodeMixin
 from user_management.models.common import AppCodeOptions
-from user_management.models.base import GenericUserProfile, QuotaMaterial
+from user_management.models.base import (
+    GenericUserProfile,
+    GenericUserGroupClosure,
+    QuotaMaterial,
+)
 from user_management.models.auth import LoginAccount, Role
 from user_management.async_tasks import update_accounts_privilege
 
@@ -562,13 +567,16 @@ class GroupUpdateTestCase(GroupCommonTestCase):
     def tearDown(self):
         super().tearDown()
 
-    def _perform_update(self, moving_nodes, account):
+    def _init_update_serializer(self, moving_nodes, account):
         req_data = self._moving_nodes_to_req_data(moving_nodes)
         grp_ids = list(map(lambda node: node.value["id"], moving_nodes))
         grp_objs = self.serializer_class.Meta.model.objects.filter(id__in=grp_ids)
-        serializer = self.serializer_class(
+        return self.serializer_class(
             many=True, data=req_data, instance=grp_objs, account=account
         )
+
+    def _perform_update(self, moving_nodes, account):
+        serializer = self._init_update_serializer(moving_nodes, account)
         serializer.is_valid(raise_exception=True)
         # Note: temporarily force the async function synchronous, only for testing purpose
         with patch(
@@ -859,6 +867,111 @@ class GroupUpdateTestCase(GroupCommonTestCase):
         pos = err_info[non_field_err_key][0].find(expect_errmsg_pattern)
         self.assertGreater(pos, 0)
 
+    def _load_closure_rows(self):
+        qset = GenericUserGroupClosure.objects.values_list(
+            "ancestor", "descendant", "depth"
+        )
+        return set(qset)
+
+    def _closure_rows_by_engine(self, moving_nodes, set_based):
+        # apply the update with either of the engines which estimate closure
+        # paths, the change is rolled back after the closure rows are loaded
+        bulk_serializer_cls = self.serializer_class.Meta.list_serializer_class
+        account = self._login_user_profile.account
+        with patch.object(bulk_serializer_cls, "EDIT_PATHS_SET_BASED", set_based):
+            with transaction.atomic():
+                serializer = self._init_update_serializer(moving_nodes, account)
+                serializer.is_valid(raise_exception=True)
+                with patch(
+                    "user_management.async_tasks.update_accounts_privilege.apply_async"
+                ):
+                    serializer.save()
+                closure_rows = self._load_closure_rows()
+                transaction.set_rollback(True)
+        return closure_rows
+
+    def _compare_engines_and_validate(self, moving_nodes):
+        closure_rows_origin = self._load_closure_rows()
+        closure_rows_legacy = self._closure_rows_by_engine(moving_nodes, False)
+        self.assertSetEqual(self._load_closure_rows(), closure_rows_origin)
+        closure_rows_set_based = self._closure_rows_by_engine(moving_nodes, True)
+        self.assertSetEqual(self._load_closure_rows(), closure_rows_origin)
+        self.assertNotEqual(closure_rows_legacy, closure_rows_origin)
+        self.assertSetEqual(closure_rows_set_based, closure_rows_legacy)
+        edited_tree = self._perform_update(
+            moving_nodes, account=self._login_user_profile.account
+        )
+        self.assertSetEqual(self._load_closure_rows(), closure_rows_legacy)
+        matched, not_matched = TreeNodeMixin.compare_trees(
+            trees_a=self.existing_trees,
+            trees_b=edited_tree,
+            value_compare_fn=self._value_compare_fn,
+        )
+        self.assertListEqual(not_matched, [])
+
+    def test_engines_subtree_to_sibling(self):
+        moving_nodes = []
+        for root in self.existing_trees:
+            moving_node = root.children[-1]
+            moving_node.parent = root.children[0]
+            moving_nodes.append(moving_node)
+        self._compare_engines_and_validate(moving_nodes)
+
+    def test_engines_chained_moves(self):
+        roots = self.existing_trees
+        # the new parent of each moving node is moved in the same request
+        node_a = roots[0].children[0]
+        node_b = roots[1].children[0]
+        curr_node = roots[2]
+        while any(curr_node.children):
+            curr_node = curr_node.children[-1]
+        node_a.parent = node_b
+        node_b.parent = curr_node
+        moving_nodes = [node_a, node_b]
+        if any(node_a.children):
+            moving_node = node_a.children[0]
+            moving_node.parent = roots[0]
+            moving_nodes.append(moving_node)
+        self._compare_engines_and_validate(moving_nodes)
+
+    def test_engines_subtrees_to_root(self):
+        moving_nodes = []
+        for root in tuple(self.existing_trees):
+            moving_node = root.children[0]
+            moving_node.parent = None
+            moving_nodes.append(moving_node)
+            self.existing_trees.append(moving_node)
+        self._compare_engines_and_validate(moving_nodes)
+
+    def test_engines_loop_rejected(self):
+        root = self.existing_trees[0]
+        curr_node = root
+        while any(curr_node.children):
+            curr_node = curr_node.children[0]
+        root.parent = curr_node
+        moving_nodes = [root]
+        closure_rows_origin = self._load_closure_rows()
+        for set_based in (False, True):
+            with self.assertRaises(DRFValidationError) as error_caught:
+                self._closure_rows_by_engine(moving_nodes, set_based)
+            err_info = error_caught.exception.detail[non_field_err_key]
+            pos = err_info[0].find(self.err_msg_loop_detected)
+            self.assertGreater(pos, 0)
+            self.assertSetEqual(self._load_closure_rows(), closure_rows_origin)
+        # the set-based engine rejects the loop even without the validator
+        serializer = self._init_update_serializer(
+            moving_nodes, account=self._login_user_profile.account
+        )
+        forms = copy.deepcopy(serializer.initial_data)
+        with self.assertRaises(DRFValidationError) as error_caught:
+            serializer.get_sorted_update_forms(
+                forms=forms, instances=serializer.instance
+            )
+        err_info = error_caught.exception.detail[non_field_err_key]
+        pos = err_info[0].find(self.err_msg_loop_detected)
+        self.assertGreater(pos, 0)
+        self.assertSetEqual(self._load_closure_rows(), closure_rows_origin)
+
 
 ## end of class GroupUpdateTestCase
 
@@ -8,7 +8,10 @@ from pathlib import Path
 import jwt
 from jwt.api_jwk import PyJWK
 
-from ecommerce_common.auth.keystore import create_keystore_helper
+from ecommerce_common.auth.keystore import (
+    create_keystore_helper,
+    SharedKeystoreRegistry,
+)
 from ecommerce_common.auth.jwt import JwkRsaKeygenHandler
 from ecommerce_common.util import import_module_string
 from ecommerce_common.tests.common import capture_error
@@ -22,7 +25,7 @@ from .persistence import (
 srv_basepath = Path(os.environ["SYS_BASE_PATH"]).resolve(strict=True)
 
 
-class JwkKeystoreTestCase(unittest.TestCase):
+class BaseKeystoreTestCase(unittest.TestCase):
     _init_config = {
         "keystore": "ecommerce_common.auth.keystore.BaseAuthKeyStore",
         "persist_secret_handler": {
@@ -81,6 +84,20 @@ class JwkKeystoreTestCase(unittest.TestCase):
                 del_file=item["del_file"],
             )
 
+    def _validate_chosen_keypair(self, rawdata_privkey, rawdata_pubkey):
+        jwk_priv = PyJWK(jwk_data=rawdata_privkey)
+        jwk_pub = PyJWK(jwk_data=rawdata_pubkey)
+        expect_payld = {"some": "payload", "avoid": "sensitive", "info": "leak"}
+        encoded_token = jwt.encode(
+            expect_payld, jwk_priv.key, algorithm=rawdata_privkey["alg"], headers={}
+        )
+        decoded_payld = jwt.decode(
+            encoded_token, jwk_pub.key, algorithms=rawdata_pubkey["alg"]
+        )
+        self.assertDictEqual(expect_payld, decoded_payld)
+
+
+class JwkKeystoreTestCase(BaseKeystoreTestCase):
     def _common_validate_after_rotate(
         self, filter_key_fn, expect_num_privkeys, expect_num_pubkeys
     ):
@@ -206,14 +223,62 @@ class JwkKeystoreTestCase(unittest.TestCase):
             rawdata_pubkey = self._keystore.choose_pubkey(kid=key_id)
             self._validate_chosen_keypair(rawdata_privkey, rawdata_pubkey)
 
-    def _validate_chosen_keypair(self, rawdata_privkey, rawdata_pubkey):
-        jwk_priv = PyJWK(jwk_data=rawdata_privkey)
-        jwk_pub = PyJWK(jwk_data=rawdata_pubkey)
-        expect_payld = {"some": "payload", "avoid": "sensitive", "info": "leak"}
-        encoded_token = jwt.encode(
-            expect_payld, jwk_priv.key, algorithm=rawdata_privkey["alg"], headers={}
-        )
-        decoded_payld = jwt.decode(
-            encoded_token, jwk_pub.key, algorithms=rawdata_pubkey["alg"]
+
+class SharedKeystoreRegistryTestCase(BaseKeystoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self._registry = SharedKeystoreRegistry()
+
+    def test_reuse_keystore(self):
+        ks0 = self._registry.get(cfg=self._init_config, import_fn=import_module_string)
+        ks1 = self._registry.get(cfg=self._init_config, import_fn=import_module_string)
+        self.assertIs(ks0, ks1)
+        rawdata_privkey = ks1.choose_secret(randonly=True)
+        rawdata_pubkey = ks1.choose_pubkey(kid=rawdata_privkey["kid"])
+        self._validate_chosen_keypair(rawdata_privkey, rawdata_pubkey)
+
+    def test_reload_on_rotation(self):
+        ks0 = self._registry.get(cfg=self._init_config, import_fn=import_module_string)
+        # key rotation in another keystore instance (e.g. in a cron job) replaces
+        # the JWKS files, the registry should rebuild the keystore
+        result = self._keystore.rotate(
+            keygen_handler=self._keygen_handler,
+            key_size_in_bits=2048,
+            num_keys=self._init_num_keypairs + 1,
+            date_limit=None,
         )
-        self.assertDictEqual(expect_payld, decoded_payld)
+        new_kid = next(filter(lambda item: item.get("kid"), result["new"]))["kid"]
+        ks1 = self._registry.get(cfg=self._init_config, import_fn=import_module_string)
+        self.assertIsNot(ks0, ks1)
+        rawdata_privkey = ks1.choose_secret(kid=new_kid)
+        rawdata_pubkey = ks1.choose_pubkey(kid=new_kid)
+        self._validate_chosen_keypair(rawdata_privkey, rawdata_pubkey)
+        # explicit rotation signal
+        self._registry.invalidate(cfg=self._init_config)
+        ks2 = self._registry.get(cfg=self._init_config, import_fn=import_module_string)
+        self.assertIsNot(ks1, ks2)
+
+    def test_reset_after_fork(self):
+        ks0 = self._registry.get(cfg=self._init_config, import_fn=import_module_string)
+        self._registry._pid = -1  # pretend the registry was inherited from parent
+        ks1 = self._registry.get(cfg=self._init_config, import_fn=import_module_string)
+        self.assertIsNot(ks0, ks1)
+        self.assertEqual(self._registry._pid, os.getpid())
+
+    def test_concurrent_lookup(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        kids = [item["kid"] for item in self._keys_metadata if item.get("kid")]
+
+        def _lookup(key_id):
+            ks = self._registry.get(
+                cfg=self._init_config, import_fn=import_module_string
+            )
+            return ks, ks.choose_pubkey(kid=key_id)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(_lookup, kids * 20))
+        keystores = set(map(lambda r: id(r[0]), results))
+        self.assertEqual(len(keystores), 1)
+        for key_id, (_, keyitem) in zip(kids * 20, results):
+            self.assertIn("alg", keyitem)
@@ -5,7 +5,10 @@ import unittest
 from datetime import date, timedelta
 from pathlib import Path
 
-from ecommerce_common.auth.keystore import JWKSFilePersistHandler
+from ecommerce_common.auth.keystore import (
+    JWKSFilePersistHandler,
+    IndexedJWKSFilePersistHandler,
+)
 from ecommerce_common.tests.common import (
     capture_error,
     _setup_keyfile,
@@ -28,6 +31,7 @@ srv_basepath = Path(os.environ["SYS_BASE_PATH"]).resolve(strict=True)
 
 
 class FilePersistHandlerTestCase(unittest.TestCase):
+    persist_handler_cls = JWKSFilePersistHandler
     _init_kwargs = {
         "filepath": os.path.join(
             srv_basepath, "./tmp/cache/test/jwks/privkey/current.json"
@@ -55,7 +59,7 @@ class FilePersistHandlerTestCase(unittest.TestCase):
         )
 
     def test_save_key_items(self):
-        persist_handler = JWKSFilePersistHandler(**self._init_kwargs)
+        persist_handler = self.persist_handler_cls(**self._init_kwargs)
         max_expired_after_days = persist_handler.max_expired_after_days
         today = date.today()
         # -------- subcase #1, add 4 items and manually flush
@@ -126,7 +130,7 @@ class FilePersistHandlerTestCase(unittest.TestCase):
     ## end of  test_save_key_items
 
     def test_set_invalid_items(self):
-        persist_handler = JWKSFilePersistHandler(**self._init_kwargs)
+        persist_handler = self.persist_handler_cls(**self._init_kwargs)
         today = date.today()
         keydata = {
             "crypto-key-id-0001": {
@@ -174,7 +178,7 @@ class FilePersistHandlerTestCase(unittest.TestCase):
     def test_mix_add_remove_items(self):
         init_kwargs = self._init_kwargs.copy()
         init_kwargs.update({"flush_threshold": 5, "auto_flush": True})
-        persist_handler = JWKSFilePersistHandler(**init_kwargs)
+        persist_handler = self.persist_handler_cls(**init_kwargs)
         max_expired_after_days = persist_handler.max_expired_after_days
         today = date.today()
         keydata = {
@@ -225,7 +229,7 @@ class FilePersistHandlerTestCase(unittest.TestCase):
     def test_random_choose(self):
         init_kwargs = self._init_kwargs.copy()
         init_kwargs.update({"flush_threshold": 5, "auto_flush": True})
-        persist_handler = JWKSFilePersistHandler(**init_kwargs)
+        persist_handler = self.persist_handler_cls(**init_kwargs)
         max_expired_after_days = persist_handler.max_expired_after_days
         today = date.today()
         keydata = {
@@ -253,7 +257,7 @@ class FilePersistHandlerTestCase(unittest.TestCase):
         today = date.today()
         init_kwargs = self._init_kwargs.copy()
         init_kwargs.update({"flush_threshold": 10, "auto_flush": True})
-        persist_handler = JWKSFilePersistHandler(**init_kwargs)
+        persist_handler = self.persist_handler_cls(**init_kwargs)
         max_expired_after_days = persist_handler.max_expired_after_days
         keydata = {
             "crypto-key-id-%s"
@@ -289,3 +293,68 @@ class FilePersistHandlerTestCase(unittest.TestCase):
 
 
 ## end of class FilePersistHandlerTestCase
+
+
+class IndexedFilePersistHandlerTestCase(FilePersistHandlerTestCase):
+    persist_handler_cls = IndexedJWKSFilePersistHandler
+
+    def _gen_keydata(self, num, max_expired_after_days):
+        today = date.today()
+        return {
+            "crypto-key-id-%s"
+            % idx: {
+                "exp": (
+                    today + timedelta(days=random.randrange(2, max_expired_after_days))
+                ).isoformat(),
+                "alg": "ALGORITHM_OPTION_%s" % random.randrange(0x1000, 0xFFFF),
+                "kty": "CRYPTO_KEY_TYPE_%s" % random.randrange(0x1000, 0xFFFF),
+                "use": "Signature",
+            }
+            for idx in range(num)
+        }
+
+    def test_refresh_on_file_change(self):
+        init_kwargs = self._init_kwargs.copy()
+        init_kwargs.update({"flush_threshold": 5, "auto_flush": True})
+        reader = self.persist_handler_cls(**init_kwargs)
+        writer = JWKSFilePersistHandler(**init_kwargs)
+        self.assertEqual(0, len(reader))
+        keydata = self._gen_keydata(
+            num=5, max_expired_after_days=reader.max_expired_after_days
+        )
+        for key, item in keydata.items():
+            writer[key] = item
+        # the file is replaced by another handler, reader should reload the index
+        self.assertEqual(len(keydata.keys()), len(reader))
+        for key, item in keydata.items():
+            self.assertDictEqual(item, reader[key])
+        with self.assertRaises(KeyError):
+            reader["crypto-key-id-nonexist"]
+        # subsequent flush from the reader should be based on latest file
+        reader.remove(key_ids=["crypto-key-id-0", "crypto-key-id-1"])
+        reader.flush()
+        self.assertEqual(len(keydata.keys()) - 2, len(reader))
+        another_reader = JWKSFilePersistHandler(**init_kwargs)
+        self.assertEqual(len(keydata.keys()) - 2, len(another_reader))
+
+    def test_evict_expired_keys_order(self):
+        today = date.today()
+        init_kwargs = self._init_kwargs.copy()
+        init_kwargs.update({"flush_threshold": 9, "auto_flush": True})
+        persist_handler = self.persist_handler_cls(**init_kwargs)
+        keydata = self._gen_keydata(num=9, max_expired_after_days=20)
+        for key, item in keydata.items():
+            persist_handler[key] = item
+        date_limit = today + timedelta(days=10)
+        result = persist_handler.evict_expired_keys(date_limit=date_limit)
+        expect_evicted = filter(
+            lambda kv: date.fromisoformat(kv[1]["exp"]) < date_limit, keydata.items()
+        )
+        expect_evicted = set(map(lambda kv: kv[0], expect_evicted))
+        actual_evicted = set(map(lambda item: item["kid"], result))
+        self.assertSetEqual(expect_evicted, actual_evicted)
+        persist_handler.flush()
+        self.assertEqual(len(keydata) - len(expect_evicted), len(persist_handler))
+        for kid in expect_evicted:
+            with self.assertRaises(KeyError):
+                persist_handler[kid]